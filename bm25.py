@@ -0,0 +1,77 @@
+"""
+bm25.py
+───────
+Minimal Okapi BM25 over pre-counted term frequencies.
+
+Documents are given as {term: count} dicts, so callers decide what a "term"
+is — plain word tokens, or keyword/regex hits as the contract scanner uses.
+``top_k`` walks an inverted (term → postings) index, so only documents that
+share a term with the query are scored.
+"""
+
+import math
+import re
+from collections import Counter
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased word tokens; hyphenated terms like 'non-solicitation' stay whole."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25:
+    def __init__(
+        self,
+        term_freqs: list[dict[str, int]],
+        lengths: list[int] | None = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.term_freqs = term_freqs
+        self.lengths = lengths or [sum(tf.values()) for tf in term_freqs]
+        self.avg_len = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.k1 = k1
+        self.b = b
+        self.doc_freq: Counter = Counter()
+        self.postings: dict[str, list[int]] = {}
+        for doc, tf in enumerate(term_freqs):
+            for term, count in tf.items():
+                if count > 0:
+                    self.doc_freq[term] += 1
+                    self.postings.setdefault(term, []).append(doc)
+
+    @classmethod
+    def from_texts(cls, texts: list[str], **kwargs) -> "BM25":
+        return cls([Counter(tokenize(text)) for text in texts], **kwargs)
+
+    def idf(self, term: str) -> float:
+        df = self.doc_freq.get(term, 0)
+        n = len(self.term_freqs)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def score(self, query_terms: list[str], doc: int) -> float:
+        tf = self.term_freqs[doc]
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / (self.avg_len or 1.0))
+        total = 0.0
+        for term in query_terms:
+            count = tf.get(term, 0)
+            if count:
+                total += self.idf(term) * count * (self.k1 + 1) / (count + norm)
+        return total
+
+    def scores(self, query_terms: list[str]) -> list[float]:
+        return [self.score(query_terms, doc) for doc in range(len(self.term_freqs))]
+
+    def top_k(self, query_terms: list[str], k: int, allowed=None) -> list[tuple[int, float]]:
+        """
+        Best ``k`` (doc, score) pairs with a positive score, best first.
+        ``allowed`` optionally restricts the candidates (a predicate on doc).
+        """
+        candidates = {doc for term in set(query_terms) for doc in self.postings.get(term, ())}
+        if allowed is not None:
+            candidates = {doc for doc in candidates if allowed(doc)}
+        scored = [(doc, self.score(query_terms, doc)) for doc in candidates]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return [(doc, score) for doc, score in scored[:k] if score > 0]
@@ -3,30 +3,218 @@ contract_scanner.py
 ───────────────────
 Uses the CUAD-fine-tuned RoBERTa model (Rakib/roberta-base-on-cuad) to
 extract key legal clauses from contract text via extractive QA.
+
+The contract is tokenized once and cut into token-exact, strided windows
+that fill the model's 512-token input; each CUAD question is tokenized once
+and paired with every window, and all (question, window) features are run
+through the model in padded batches.  Answer spans are mapped back to
+character offsets in the original text.
+
+With SCANNER_PREFILTER_TOP_K > 0, a cheap lexical stage (per-category keyword
+patterns scored with BM25) first picks the top-K candidate windows for each
+category, and the model only reads those; categories whose keywords appear
+nowhere fall back to a full sweep.  It is off by default: results change
+with it, so enable it only with a K whose recall ``prefilter_recall.py`` has
+measured on your contracts.
+
+The inference engine is chosen with SCANNER_ENGINE:
+  torch      – PyTorch on CPU (default)
+  onnx       – model exported once to ONNX, run through onnxruntime
+  onnx-int8  – the ONNX export with dynamic int8 weight quantization
 """
 
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
 import textwrap
-from transformers import pipeline
+import time
+from functools import lru_cache
+from typing import Iterator
+
+import numpy as np
+
+from bm25 import BM25
 
 # ── Model (lazy-loaded on first call) ──────────────────────────────────────────
-_qa_pipeline = None
+_tokenizer = None
+_runners: dict = {}
 MODEL_NAME = "Rakib/roberta-base-on-cuad"
 
+ENGINES = ("torch", "onnx", "onnx-int8")
+ENGINE = os.getenv("SCANNER_ENGINE", "torch")
+ONNX_DIR = os.getenv("SCANNER_ONNX_DIR", "./onnx_models")
+
+# Number of (question, window) features per forward pass
+BATCH_SIZE = int(os.getenv("SCANNER_BATCH_SIZE", "16"))
+
+# Windowing: RoBERTa takes 512 positions; consecutive windows share
+# DOC_STRIDE context tokens so clauses on a window edge are seen whole once.
+MAX_SEQ_LEN = 512
+DOC_STRIDE = 128
+
+# Candidate windows per category read by the model (0 = read every window,
+# the default until recall is measured with prefilter_recall.py)
+PREFILTER_TOP_K = int(os.getenv("SCANNER_PREFILTER_TOP_K", "0"))
+
+# Span decoding defaults of the HF question-answering pipeline
+MAX_ANSWER_TOKENS = 15
+SPAN_CANDIDATES = 12
+
+
+def _get_tokenizer():
+    """Lazy-load the tokenizer (shared by every engine)."""
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+
+        _tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    return _tokenizer
+
+
+def _load_torch_model():
+    from transformers import AutoModelForQuestionAnswering
+
+    model = AutoModelForQuestionAnswering.from_pretrained(MODEL_NAME)
+    model.eval()                 # CPU inference only
+    return model
+
+
+def _torch_runner():
+    import torch
+
+    model = _load_torch_model()
+
+    def run(input_ids: np.ndarray, attention_mask: np.ndarray):
+        with torch.inference_mode():
+            out = model(
+                input_ids=torch.from_numpy(input_ids),
+                attention_mask=torch.from_numpy(attention_mask),
+            )
+        return out.start_logits.numpy(), out.end_logits.numpy()
+
+    return run
+
+
+def _write_atomically(path: str, write) -> None:
+    """
+    Run ``write(scratch_path)`` in a scratch directory beside ``path``, then
+    move the output into place, ``path`` itself last: the exporter may put
+    the weights in an external-data file that the model references by name.
+    """
+    directory, name = os.path.split(path)
+    scratch = tempfile.mkdtemp(dir=directory, prefix=".export-")
+    try:
+        write(os.path.join(scratch, name))
+        for extra in os.listdir(scratch):
+            if extra != name:
+                os.replace(os.path.join(scratch, extra), os.path.join(directory, extra))
+        os.replace(os.path.join(scratch, name), path)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _export_onnx(path: str) -> None:
+    import torch
 
-def _get_pipeline():
-    """Lazy-load the QA pipeline so the model is only downloaded once."""
-    global _qa_pipeline
-    if _qa_pipeline is None:
-        print(f"[contract_scanner] Loading CUAD model ({MODEL_NAME}) …")
-        _qa_pipeline = pipeline(
-            "question-answering",
-            model=MODEL_NAME,
-            tokenizer=MODEL_NAME,
-            device=-1,           # CPU  (set to 0 for GPU)
-            handle_long_inputs="stride",
+    print(f"[contract_scanner] Exporting {MODEL_NAME} to ONNX …")
+    dummy = _get_tokenizer()("question", "context", return_tensors="pt")
+    torch.onnx.export(
+        _load_torch_model(),
+        (dummy["input_ids"], dummy["attention_mask"]),
+        path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["start_logits", "end_logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "start_logits": {0: "batch", 1: "sequence"},
+            "end_logits": {0: "batch", 1: "sequence"},
+        },
+        opset_version=18,
+    )
+
+
+def _onnx_path(quantized: bool) -> str:
+    """
+    Export (and optionally quantize) the model once; return the .onnx path.
+
+    Pool workers warm up at the same time, so the export runs under a file
+    lock and each file is written to a scratch directory and renamed into
+    place: a worker either finds the finished file or waits for it.
+    """
+    model_dir = os.path.join(ONNX_DIR, MODEL_NAME.replace("/", "__"))
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model-int8.onnx")
+    path = int8_path if quantized else fp32_path
+    if os.path.exists(path):
+        return path
+
+    from filelock import FileLock  # installed with transformers (huggingface_hub)
+
+    os.makedirs(model_dir, exist_ok=True)
+    with FileLock(os.path.join(model_dir, ".export.lock")):
+        if not os.path.exists(fp32_path):
+            _write_atomically(fp32_path, _export_onnx)
+
+        if quantized and not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            print("[contract_scanner] Quantizing ONNX model to int8 …")
+            _write_atomically(
+                int8_path,
+                lambda scratch_path: quantize_dynamic(fp32_path, scratch_path, weight_type=QuantType.QInt8),
+            )
+
+    return path
+
+
+def _onnx_runner(quantized: bool):
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(
+        _onnx_path(quantized), providers=["CPUExecutionProvider"]
+    )
+
+    def run(input_ids: np.ndarray, attention_mask: np.ndarray):
+        start, end = session.run(
+            ["start_logits", "end_logits"],
+            {"input_ids": input_ids, "attention_mask": attention_mask},
         )
+        return start, end
+
+    return run
+
+
+def _get_runner(engine: str = ENGINE):
+    """
+    Lazy-load the model for ``engine`` so it is only downloaded/exported once.
+
+    Returns a callable mapping (input_ids, attention_mask) int64 arrays to
+    (start_logits, end_logits) float arrays.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown SCANNER_ENGINE {engine!r}; expected one of {ENGINES}")
+    if engine not in _runners:
+        print(f"[contract_scanner] Loading CUAD model ({MODEL_NAME}, engine={engine}) …")
+        if engine == "torch":
+            _runners[engine] = _torch_runner()
+        else:
+            _runners[engine] = _onnx_runner(quantized=engine == "onnx-int8")
         print("[contract_scanner] Model loaded ✓")
-    return _qa_pipeline
+    return _runners[engine]
+
+
+def warm_up(engine: str = ENGINE) -> None:
+    """Load the model and run one dummy inference so the first real scan is not slow."""
+    _get_runner(engine)
+    scan_contract(
+        "This Agreement is entered into between Alpha Inc. and Beta LLC and is "
+        "governed by the laws of the State of New York.",
+        engine=engine,
+    )
 
 
 # ── 15 high-risk CUAD clause categories ───────────────────────────────────────
@@ -136,19 +324,334 @@ CUAD_QUESTIONS: list[tuple[str, str]] = [
 CONFIDENCE_THRESHOLD = 0.05
 
 
-# ── Chunking helper (RoBERTa max ≈ 512 tokens ≈ ~2 000 chars) ─────────────────
-def _chunk_text(text: str, chunk_size: int = 1800, overlap: int = 200) -> list[str]:
-    """Split text into overlapping character windows."""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
+# ── Lexical prefilter: keyword stems / phrases that signal each category ──────
+CATEGORY_KEYWORDS: dict[str, list[str]] = {
+    "Document Name": ["agreement", "contract", "terms and conditions"],
+    "Parties": ["between", "parties", "party", "inc", "llc", "ltd", "corporation", "company"],
+    "Agreement Date": ["dated", "effective date", "as of", "entered into", "day of"],
+    "Termination For Convenience": ["terminat", "convenience", "without cause", "for any reason", "prior written notice"],
+    "Renewal Term": ["renew", "successive", "automatically", "initial term", "extend"],
+    "Non-Compete": ["compet", "non-compete", "noncompet", "restrictive covenant"],
+    "Exclusivity": ["exclusiv", "sole", "solely", "only from"],
+    "Governing Law": ["governing law", "governed by", "laws of", "jurisdiction", "venue", "courts of"],
+    "Limitation Of Liability": ["limitation of liability", "liabilit", "consequential", "indirect", "aggregate", "exceed"],
+    "Indemnification": ["indemnif", "hold harmless", "defend", "third-party claim", "third party claim"],
+    "Confidentiality": ["confidential", "non-disclosure", "nondisclosure", "disclos", "proprietary"],
+    "IP Ownership Assignment": ["intellectual property", "assign", "ownership", "owns", "work product", "deliverable", "work made for hire"],
+    "Non-Solicitation": ["solicit", "hire", "employ", "induce"],
+    "Uncapped Liability": ["unlimited", "uncapped", "not limit", "exclusion", "gross negligence", "wilful", "willful"],
+    "Liquidated Damages": ["liquidated damages", "penalt", "damages", "late fee", "service credit", "remed"],
+}
+
+# Categories that usually sit in the preamble: always read the first window too
+LEAD_CATEGORIES = {"Document Name", "Parties", "Agreement Date"}
+
+
+def scanner_fingerprint() -> str:
+    """Identity of everything besides the text that shapes scan results (for caching)."""
+    questions = hashlib.sha256(json.dumps(CUAD_QUESTIONS).encode("utf-8")).hexdigest()
+    return f"{MODEL_NAME}|{ENGINE}|k={PREFILTER_TOP_K}|{questions}"
+
+
+# ── Token windows ─────────────────────────────────────────────────────────────
+@lru_cache(maxsize=None)
+def _question_ids(question: str) -> tuple[int, ...]:
+    """Token ids of a CUAD question (tokenized once per process)."""
+    return tuple(_get_tokenizer()(question, add_special_tokens=False)["input_ids"])
+
+
+def _window_starts(n_tokens: int, window: int, stride: int = DOC_STRIDE) -> list[int]:
+    """
+    Start offsets of ``window``-token slices covering ``n_tokens`` tokens with
+    ``stride`` tokens of overlap.  The last window is pulled back so that it
+    ends on the final token instead of running short.
+    """
+    if n_tokens <= window:
+        return [0]
+    starts = list(range(0, n_tokens - window, window - stride))
+    starts.append(n_tokens - window)
+    return starts
+
+
+def _top_spans(start_logits, end_logits, allowed) -> list[tuple[int, int, float]]:
+    """
+    Score the best candidate answer spans of one feature.
+
+    Mirrors the HF pipeline decoding: non-context tokens are masked out (CLS
+    stays in the softmax but scores zero), spans are limited to
+    MAX_ANSWER_TOKENS tokens and the top SPAN_CANDIDATES spans are returned.
+    """
+    allowed = allowed.copy()
+    allowed[0] = True
+    start = np.where(allowed, start_logits, -10000.0)
+    end = np.where(allowed, end_logits, -10000.0)
+
+    start = np.exp(start - start.max())
+    start = start / start.sum()
+    end = np.exp(end - end.max())
+    end = end / end.sum()
+    start[0] = end[0] = 0.0
+
+    candidates = np.tril(np.triu(np.outer(start, end)), MAX_ANSWER_TOKENS - 1)
+    flat = candidates.ravel()
+    if len(flat) <= SPAN_CANDIDATES:
+        order = np.argsort(-flat)
+    else:
+        order = np.argpartition(-flat, SPAN_CANDIDATES)[:SPAN_CANDIDATES]
+        order = order[np.argsort(-flat[order])]
+    starts, ends = np.unravel_index(order, candidates.shape)
+    keep = allowed[starts] & allowed[ends]
+    return [(int(s), int(e), float(candidates[s, e])) for s, e in zip(starts[keep], ends[keep])]
+
+
+@lru_cache(maxsize=None)
+def _keyword_re(keyword: str) -> re.Pattern:
+    """Word-initial, case-insensitive match of a stem or (whitespace-tolerant) phrase."""
+    return re.compile(r"\b" + re.escape(keyword).replace(r"\ ", r"\s+"), re.IGNORECASE)
+
+
+def _prefilter_windows(
+    text: str,
+    doc,
+    starts: list[int],
+    window: int,
+    prefilter: list[tuple[list[str], bool]],
+    top_k: int,
+) -> list[list[int]]:
+    """
+    Pick the candidate windows each question should be run on.
+
+    ``prefilter`` holds (keywords, lead) per question.  Each window's keyword
+    hit counts are scored with BM25 and the top ``top_k`` windows with a
+    non-zero score are kept (plus window 0 when ``lead`` is set).  A question
+    whose keywords match no window gets every window.
+    """
+    if top_k <= 0 or len(starts) <= top_k:
+        return [list(starts) for _ in prefilter]
+
+    offsets = doc["offset_mapping"]
+    n_tokens = len(offsets)
+    window_texts = [
+        text[offsets[w][0]:offsets[min(w + window, n_tokens) - 1][1]] for w in starts
+    ]
+    keywords = {kw for kws, _ in prefilter for kw in kws}
+    hits = [
+        {kw: len(_keyword_re(kw).findall(wt)) for kw in keywords} for wt in window_texts
+    ]
+    bm25 = BM25(hits, lengths=[min(window, n_tokens - w) for w in starts])
+
+    selected = []
+    for kws, lead in prefilter:
+        scores = bm25.scores(kws)
+        ranked = sorted((i for i in range(len(starts)) if scores[i] > 0), key=lambda i: -scores[i])
+        if not ranked:
+            selected.append(list(starts))       # nothing matched: full sweep
+            continue
+        chosen = set(ranked[:top_k])
+        if lead:
+            chosen.add(0)
+        selected.append([starts[i] for i in sorted(chosen)])
+    return selected
+
+
+def _span_chars(doc, s: int, e: int) -> tuple[int, int]:
+    """Map document token positions to character offsets, widened to whole words."""
+    try:
+        return (
+            doc.word_to_chars(doc.token_to_word(s))[0],
+            doc.word_to_chars(doc.token_to_word(e))[1],
+        )
+    except Exception:
+        offsets = doc["offset_mapping"]
+        return offsets[s][0], offsets[e][1]
+
+
+def _answer_questions(
+    texts: list[str],
+    questions: list[str],
+    batch_size: int,
+    engine: str = ENGINE,
+    prefilter: list[tuple[list[str], bool]] | None = None,
+    top_k: int = 0,
+    timings: dict | None = None,
+) -> Iterator[tuple[int, int, tuple[str, float, int, int]]]:
+    """
+    Run extractive QA for every question over the whole of each text.
+
+    Each text is tokenized once; each question is paired with every token
+    window (or, with ``prefilter``/``top_k``, its candidate windows) as
+    ``<s> question </s></s> window </s>``.  Features from all texts share the
+    same padded batches of ``batch_size``.  They are ordered text by text,
+    then question by question, so each question's best (answer, score,
+    start_char, end_char) is yielded as ``(text_index, question_index, best)``
+    as soon as its last window has been scored.  If ``timings`` is a dict,
+    seconds spent tokenizing/prefiltering, in the model and decoding spans
+    are added to its "prepare", "model" and "decode" entries.
+    """
+    clock = timings if timings is not None else {}
+    for phase in ("prepare", "model", "decode"):
+        clock.setdefault(phase, 0.0)
+    mark = time.perf_counter()
+    tokenizer = _get_tokenizer()
+    run = _get_runner(engine)
+    q_ids = [_question_ids(q) for q in questions]
+    window = MAX_SEQ_LEN - max(len(ids) for ids in q_ids) - tokenizer.num_special_tokens_to_add(pair=True)
+
+    docs, features, remaining = [], [], []
+    for d, text in enumerate(texts):
+        doc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        starts = _window_starts(len(doc["input_ids"]), window)
+        if prefilter is not None:
+            selected = _prefilter_windows(text, doc, starts, window, prefilter, top_k)
+        else:
+            selected = [starts] * len(questions)
+        docs.append(doc)
+        features.extend((d, qi, w) for qi in range(len(questions)) for w in selected[qi])
+        remaining.append([len(windows) for windows in selected])
+    clock["prepare"] += time.perf_counter() - mark
+
+    best = [[("", 0.0, 0, 0)] * len(questions) for _ in texts]
+    slots = [(d, qi) for d in range(len(texts)) for qi in range(len(questions))]
+    next_slot = 0
+    for lo in range(0, len(features), batch_size):
+        mark = time.perf_counter()
+        batch = features[lo:lo + batch_size]
+        rows = [
+            [tokenizer.cls_token_id, *q_ids[qi], tokenizer.sep_token_id, tokenizer.sep_token_id,
+             *docs[d]["input_ids"][w:w + window], tokenizer.sep_token_id]
+            for d, qi, w in batch
+        ]
+        width = max(len(ids) for ids in rows)
+        input_ids = np.full((len(rows), width), tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        for row, ids in enumerate(rows):
+            input_ids[row, : len(ids)] = ids
+            attention_mask[row, : len(ids)] = 1
+
+        clock["prepare"] += time.perf_counter() - mark
+        mark = time.perf_counter()
+        start_logits, end_logits = run(input_ids, attention_mask)
+        clock["model"] += time.perf_counter() - mark
+        mark = time.perf_counter()
+
+        for row, (d, qi, w) in enumerate(batch):
+            doc = docs[d]
+            context_start = len(q_ids[qi]) + 3
+            context_len = min(window, len(doc["input_ids"]) - w)
+            context_mask = np.zeros(width, dtype=bool)
+            context_mask[context_start:context_start + context_len] = True
+
+            # Identical answer texts within one window add up, as in the pipeline
+            found: dict[tuple[int, int], float] = {}
+            for s, e, score in _top_spans(start_logits[row], end_logits[row], context_mask):
+                span = _span_chars(doc, w + s - context_start, w + e - context_start)
+                found[span] = found.get(span, 0.0) + score
+            if found:
+                (start_char, end_char), score = max(found.items(), key=lambda kv: kv[1])
+                if score > best[d][qi][1]:
+                    best[d][qi] = (texts[d][start_char:end_char], score, start_char, end_char)
+            remaining[d][qi] -= 1
+        clock["decode"] += time.perf_counter() - mark
+
+        # Every question whose windows have all been scored is final
+        while next_slot < len(slots) and remaining[slots[next_slot][0]][slots[next_slot][1]] == 0:
+            d, qi = slots[next_slot]
+            yield d, qi, best[d][qi]
+            next_slot += 1
+
+
+def _clause_result(text: str, answer: str, score: float, start: int, end: int) -> dict:
+    found = score >= CONFIDENCE_THRESHOLD and len(answer.strip()) > 0
+    if found:
+        # Trim surrounding whitespace without losing the offsets
+        start += len(answer) - len(answer.lstrip())
+        end -= len(answer) - len(answer.rstrip())
+    return {
+        "answer": text[start:end] if found else "",
+        "score": round(score, 4),
+        "found": found,
+        "start": start if found else None,
+        "end": end if found else None,
+    }
+
+
+def iter_scan_many(
+    texts: list[str],
+    batch_size: int = BATCH_SIZE,
+    engine: str = ENGINE,
+    top_k: int = PREFILTER_TOP_K,
+    timings: dict | None = None,
+) -> Iterator[tuple[int, str, dict]]:
+    """
+    Scan several documents with shared inference batches.
+
+    Yields ``(text_index, category, result)`` as soon as each category of each
+    document is resolved.  Results are keyed by ``text_index`` and may arrive
+    out of order: blank documents are answered first, then the others in
+    order.  ``result`` has the shape documented in ``scan_contract``.
+    ``timings`` collects per-phase seconds as in ``_answer_questions``.
+    """
+    # Blank documents have no windows: answer them up front
+    live = []
+    for d, text in enumerate(texts):
+        if text.strip():
+            live.append(d)
+            continue
+        for category, _ in CUAD_QUESTIONS:
+            yield d, category, _clause_result(text, "", 0.0, 0, 0)
+    if not live:
+        return
+
+    questions = [q for _, q in CUAD_QUESTIONS]
+    prefilter = [
+        (CATEGORY_KEYWORDS.get(category, []), category in LEAD_CATEGORIES)
+        for category, _ in CUAD_QUESTIONS
+    ]
+    live_texts = [texts[d] for d in live]
+    answers = _answer_questions(live_texts, questions, batch_size, engine, prefilter, top_k, timings)
+    for i, qi, (answer, score, start, end) in answers:
+        yield live[i], CUAD_QUESTIONS[qi][0], _clause_result(live_texts[i], answer, score, start, end)
+
+
+def iter_scan(
+    text: str,
+    batch_size: int = BATCH_SIZE,
+    engine: str = ENGINE,
+    top_k: int = PREFILTER_TOP_K,
+    timings: dict | None = None,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Yield ``(category, result)`` for each CUAD category as soon as it is
+    resolved, in CUAD_QUESTIONS order.  ``result`` has the shape documented
+    in ``scan_contract``.
+    """
+    for _, category, result in iter_scan_many([text], batch_size, engine, top_k, timings):
+        yield category, result
+
+
+def scan_many(
+    texts: list[str],
+    batch_size: int = BATCH_SIZE,
+    engine: str = ENGINE,
+    top_k: int = PREFILTER_TOP_K,
+    timings: dict | None = None,
+) -> Iterator[tuple[int, dict]]:
+    """Yield ``(text_index, clauses)`` for each document as soon as all its categories are done."""
+    pending: dict[int, dict] = {}
+    for d, category, result in iter_scan_many(texts, batch_size, engine, top_k, timings):
+        clauses = pending.setdefault(d, {})
+        clauses[category] = result
+        if len(clauses) == len(CUAD_QUESTIONS):
+            yield d, pending.pop(d)
 
 
-def scan_contract(text: str) -> dict:
+def scan_contract(
+    text: str,
+    batch_size: int = BATCH_SIZE,
+    engine: str = ENGINE,
+    top_k: int = PREFILTER_TOP_K,
+    timings: dict | None = None,
+) -> dict:
     """
     Run the CUAD extractive-QA model across all clause categories.
 
@@ -158,33 +661,11 @@ def scan_contract(text: str) -> dict:
         "category_name": {
             "answer": str,     # extracted text span (or empty string)
             "score": float,    # model confidence 0-1
-            "found": bool      # whether answer exceeded threshold
+            "found": bool,     # whether answer exceeded threshold
+            "start": int,      # character offsets of the answer in ``text``
+            "end": int,        #   (None when not found)
         },
         ...
     }
     """
-    qa = _get_pipeline()
-    chunks = _chunk_text(text)
-    results: dict = {}
-
-    for category, question in CUAD_QUESTIONS:
-        best_answer = ""
-        best_score = 0.0
-
-        for chunk in chunks:
-            try:
-                out = qa(question=question, context=chunk)
-                if out["score"] > best_score:
-                    best_score = out["score"]
-                    best_answer = out["answer"]
-            except Exception:
-                continue  # skip problematic chunks
-
-        found = best_score >= CONFIDENCE_THRESHOLD and len(best_answer.strip()) > 0
-        results[category] = {
-            "answer": best_answer.strip() if found else "",
-            "score": round(best_score, 4),
-            "found": found,
-        }
-
-    return results
+    return dict(iter_scan(text, batch_size, engine, top_k, timings))
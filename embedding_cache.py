@@ -0,0 +1,179 @@
+"""
+embedding_cache.py
+──────────────────
+Two-tier cache for text embeddings, keyed by (model, sha256(text)).
+
+Vectors are kept as float32: an in-memory LRU answers repeated texts within a
+process, and a SQLite file of raw float32 blobs answers them across restarts
+(``sqlite_lru.SQLiteLRU``, the LRU-evicted, byte-budgeted tier the result
+cache uses too, with the model as namespace).  ``CachedEmbeddingFunction``
+wraps any Chroma-style embedding function so only cache misses reach the
+API, in one batched call; its async path runs the SQLite work in a worker
+thread.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from sqlite_lru import SQLiteLRU
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./cache/embeddings.sqlite3")
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "4096"))
+
+# Vectors are small and looked up many at a time: batch their disk upkeep wider
+TOUCH_BATCH = 256
+EVICT_BATCH = 256
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """float32 vectors keyed by (model, text hash)."""
+
+    def __init__(self, path: str, max_bytes: int, memory_items: int = 4096):
+        self.path = path
+        self.memory_items = memory_items
+        # "vectors" is the table of the file layout before the shared store
+        self.disk = SQLiteLRU(
+            path, max_bytes, touch_batch=TOUCH_BATCH, evict_batch=EVICT_BATCH, legacy_tables=("vectors",)
+        )
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _remember(self, key: tuple[str, str], vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, digests: list[str]) -> dict[str, np.ndarray]:
+        """Cached vectors for the given text hashes; misses are simply absent."""
+        found = {}
+        with self._lock:
+            for digest in digests:
+                if (model, digest) in self._memory:
+                    self._memory.move_to_end((model, digest))
+                    found[digest] = self._memory[(model, digest)]
+                    self._stats["memory_hits"] += 1
+                    continue
+                row = self.disk.get(model, digest)
+                if row is None:
+                    self._stats["misses"] += 1
+                    continue
+                vector = np.frombuffer(row[0], dtype=np.float32)
+                self._remember((model, digest), vector)
+                found[digest] = vector
+                self._stats["disk_hits"] += 1
+        return found
+
+    def put_many(self, model: str, vectors: dict[str, np.ndarray]) -> None:
+        with self._lock:
+            # A (model, text) pair always embeds to the same vector: keep the stored row
+            self.disk.put_many(model, {digest: vector.tobytes() for digest, vector in vectors.items()},
+                               replace=False)
+            for digest, vector in vectors.items():
+                self._remember((model, digest), vector)
+
+    async def aget_many(self, model: str, digests: list[str]) -> dict[str, np.ndarray]:
+        """Async ``get_many``; the disk lookups run in a worker thread."""
+        return await asyncio.to_thread(self.get_many, model, digests)
+
+    async def aput_many(self, model: str, vectors: dict[str, np.ndarray]) -> None:
+        """Async ``put_many``; the disk write runs in a worker thread."""
+        await asyncio.to_thread(self.put_many, model, vectors)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = sum(self._stats.values())
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            return {
+                **self._stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                **self.disk.stats(),
+                "memory_entries": len(self._memory),
+            }
+
+
+class CachedEmbeddingFunction:
+    """
+    Chroma embedding function that consults ``cache`` before calling ``inner``.
+
+    Texts that miss are embedded together in one call to ``inner`` and
+    written back; duplicate texts in one call are embedded once.  ``acall``
+    is the same for async callers: misses go to ``async_inner`` when given
+    (e.g. the shared AsyncOpenAI client), else to ``inner`` in a thread.  Any
+    other attribute (``name``, ``get_config``, …) is delegated to ``inner``.
+    """
+
+    def __init__(self, inner, model: str, cache: EmbeddingCache, async_inner=None):
+        self.inner = inner
+        self.model = model
+        self.cache = cache
+        self.async_inner = async_inner
+
+    @staticmethod
+    def _missing(input: list[str], digests: list[str], found: dict) -> dict:
+        missing = {}
+        for digest, text in zip(digests, input):
+            if digest not in found:
+                missing.setdefault(digest, text)
+        return missing
+
+    @staticmethod
+    def _computed(missing: dict, fresh) -> dict:
+        return {
+            digest: np.asarray(vector, dtype=np.float32)
+            for digest, vector in zip(missing, fresh)
+        }
+
+    def __call__(self, input: list[str]) -> list[np.ndarray]:
+        digests = [text_hash(text) for text in input]
+        found = self.cache.get_many(self.model, digests)
+        missing = self._missing(input, digests, found)
+        if missing:
+            computed = self._computed(missing, self.inner(list(missing.values())))
+            self.cache.put_many(self.model, computed)
+            found.update(computed)
+        return [found[digest] for digest in digests]
+
+    async def acall(self, input: list[str]) -> list[np.ndarray]:
+        digests = [text_hash(text) for text in input]
+        found = await self.cache.aget_many(self.model, digests)
+        missing = self._missing(input, digests, found)
+        if missing:
+            texts = list(missing.values())
+            if self.async_inner is not None:
+                fresh = await self.async_inner(texts)
+            else:
+                fresh = await asyncio.to_thread(self.inner, texts)
+            computed = self._computed(missing, fresh)
+            await self.cache.aput_many(self.model, computed)
+            found.update(computed)
+        return [found[digest] for digest in digests]
+
+    def embed_documents(self, input: list[str]) -> list[np.ndarray]:
+        return self(input)
+
+    def embed_query(self, input: list[str]) -> list[np.ndarray]:
+        return self(input)
+
+    def __getattr__(self, name):
+        if name == "inner":  # not yet set (e.g. during copy/unpickling)
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+
+embedding_cache = EmbeddingCache(
+    EMBED_CACHE_PATH,
+    max_bytes=int(EMBED_CACHE_MAX_MB * 1024 * 1024),
+    memory_items=EMBED_CACHE_MEMORY_ITEMS,
+)
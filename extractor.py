@@ -1,15 +1,18 @@
 import json
-from openai import OpenAI
+import logging
+from metrics import record_usage, timed
+from openai_client import get_client
 
-client = OpenAI()
+log = logging.getLogger(__name__)
 
 
-def extract_entities(user_input: str) -> dict:
+@timed("extract_entities")
+async def extract_entities(user_input: str) -> dict:
     """
     Dynamically extract ALL relevant contract details from natural language.
     Returns a flat dict of whatever fields the LLM finds — no hardcoded schema.
     """
-    response = client.chat.completions.create(
+    response = await get_client().chat.completions.create(
         model="gpt-4o-mini",
         messages=[
             {
@@ -30,6 +33,10 @@ def extract_entities(user_input: str) -> dict:
         temperature=0.0,
     )
 
+    record_usage("extract", "gpt-4o-mini", response.usage)
+
     entities = json.loads(response.choices[0].message.content)
-    print(f"[extractor] Extracted entities: {json.dumps(entities, indent=2)}")
+    # Values can be personal data: only the field names at INFO
+    log.info("extracted entities", extra={"entity_fields": sorted(entities)})
+    log.debug("extracted entity values", extra={"entities": entities})
     return entities
@@ -1,20 +1,92 @@
+import asyncio
+import functools
+import hashlib
+import inspect
 import os
-import openai
+import time
 from datetime import date
-from openai import OpenAI
-from retrieval import retrieve
-from prompts import build_prompt
+from openai_client import get_client
+from retrieval import aretrieve
+from result_cache import generation_cache, content_key
+from metrics import observe, record_usage
+import prompts
+import templates
+from prompts import build_prompt, build_clause_prompt
 from extractor import extract_entities
+from templates import template_registry, fill_template, signature_block_line
+from stage_dag import StageDAG
 
-client = OpenAI()
+# "llm": the model reproduces the whole template with placeholders filled.
+# "hybrid": placeholders are filled locally and streamed at once; the model
+# only writes the "(Added per applicable law)" clauses, spliced in before the
+# signature blocks (the part of the template after them follows the clauses).
+GENERATION_MODE = os.getenv("GENERATION_MODE", "llm")
+GENERATION_MODEL = "gpt-4o-mini"
+CLAUSE_MAX_TOKENS = int(os.getenv("CLAUSE_MAX_TOKENS", "2000"))
 
+# Completed contracts are cached (result_cache.generation_cache) and replayed
+# in GENERATION_REPLAY_CHUNK-character chunks, at most GENERATION_REPLAY_RATE
+# characters per second (0 = as fast as the client reads).
+GENERATION_CACHE = os.getenv("GENERATION_CACHE", "1") == "1"
+GENERATION_REPLAY_CHUNK = int(os.getenv("GENERATION_REPLAY_CHUNK", "256"))
+GENERATION_REPLAY_RATE = float(os.getenv("GENERATION_REPLAY_RATE", "0"))
 
+CONTRACT_SYSTEM_PROMPT = (
+    "You are completing a legal contract template. "
+    "You MUST replace ALL placeholders with the extracted details provided. "
+    "This includes section headings — 'PARTY 1' must be replaced with the actual Party 1 name, "
+    "'PARTY 2' with the actual Party 2 name. "
+    "Reproduce the entire template verbatim otherwise. Do not skip any section."
+)
+CLAUSE_SYSTEM_PROMPT = (
+    "You are adding legally required clauses to a completed contract. "
+    "Output only the new clauses, never text already in the contract."
+)
+# Templates _select_template falls back to when retrieval names no file
+FALLBACK_TEMPLATES = ("nda.txt", "PartnershipAgreement.txt", "ProfessionalServicesAgreement.txt")
 
-def _load_full_template(template_path):
-    if not os.path.exists(template_path):
-        return None
-    with open(template_path, "r", encoding="utf-8") as f:
-        return f.read()
+
+@functools.lru_cache(maxsize=1)
+def _code_version():
+    """Hash of the prompt builder, the template filler and the system prompts."""
+    source = inspect.getsource(prompts) + inspect.getsource(templates)
+    return hashlib.sha256(
+        (source + CONTRACT_SYSTEM_PROMPT + CLAUSE_SYSTEM_PROMPT).encode("utf-8")
+    ).hexdigest()
+
+def generation_fingerprint(mode, template_files=()):
+    """
+    Identity of everything besides the description and corpus that shapes a
+    contract, including the current text of the candidate template files
+    (from the registry, so an edited template changes the fingerprint).
+    """
+    template_versions = []
+    for filename in template_files:
+        template = template_registry.get(filename)
+        template_versions.append(f"{filename}:{template.digest if template else '-'}")
+    return "|".join([
+        GENERATION_MODEL, mode, f"clauses={CLAUSE_MAX_TOKENS}", _code_version(), *template_versions
+    ])
+
+def _template_candidates(metas):
+    """Template files _select_template can pick for these retrieved chunks."""
+    template_file = _first_template_file(metas) or _first_file_any(metas)
+    return (template_file,) if template_file else FALLBACK_TEMPLATES
+
+def _chunk_ids(metas):
+    return sorted(f"{m.get('source')}_{m.get('file')}_{m.get('chunk_index')}" for m in metas)
+
+def _contract_key(user_input, mode, today, metas):
+    fingerprint = generation_fingerprint(mode, _template_candidates(metas))
+    return content_key(user_input, fingerprint, today, *_chunk_ids(metas))
+
+async def _replay(text):
+    """Stream a cached contract back in chunks at the configured rate."""
+    delay = GENERATION_REPLAY_CHUNK / GENERATION_REPLAY_RATE if GENERATION_REPLAY_RATE > 0 else 0
+    for start in range(0, len(text), GENERATION_REPLAY_CHUNK):
+        if start and delay:
+            await asyncio.sleep(delay)
+        yield text[start:start + GENERATION_REPLAY_CHUNK]
 
 def _first_template_file(metas):
     for meta in metas:
@@ -41,64 +113,220 @@ def _maybe_log_prompt(prompt, template_file, template_len, law_len):
     print(f"TOTAL PROMPT:   {len(prompt)} chars")
     print("--- LLM INPUT DEBUG END ---\n")
 
-def generate_contract(user_input):
-    # Step 1: Extract structured entities from the user's natural language
-    entities = extract_entities(user_input)
-
-    # Step 2: Retrieve relevant chunks (more results = more law context)
-    docs, metas, distances = retrieve(user_input, n_results=10)
-
-    # Separate templates and laws
+def _select_template(user_input, entities, docs, metas):
+    """
+    Registered template (None if not found), template chunks (its full text
+    when found, else the retrieved template chunks), law chunks.
+    """
     template_chunks = [d for d, m in zip(docs, metas) if m['source'] == 'template']
     law_chunks = [d for d, m in zip(docs, metas) if m['source'] == 'law']
 
-    # Step 3: Load the full template file based on retrieval or contract_type
+    # Load the full template file based on retrieval or contract_type
     template_file = _first_template_file(metas) or _first_file_any(metas)
     contract_type = entities.get("contract_type", "")
     q_lower = user_input.lower()
+    nda_template, partnership_template, services_template = FALLBACK_TEMPLATES
     if not template_file and (contract_type == "nda" or "nda" in q_lower or "non-disclosure" in q_lower or "confidential" in q_lower):
-        template_file = "nda.txt"
+        template_file = nda_template
     elif not template_file and (contract_type == "partnership" or "partnership" in q_lower):
-        template_file = "PartnershipAgreement.txt"
+        template_file = partnership_template
     elif not template_file and (contract_type == "services" or "service" in q_lower):
-        template_file = "ProfessionalServicesAgreement.txt"
-    if template_file:
-        full_template = _load_full_template(os.path.join("data", template_file))
-        if full_template:
-            template_chunks = [full_template]
+        template_file = services_template
+    # Full text comes from the in-memory registry (re-read only when the file changes)
+    template = template_registry.get(template_file) if template_file else None
+    if template:
+        template_chunks = [template.text]
+    return template, template_chunks, law_chunks
 
-    # Step 4: Build the prompt with entities for reliable placeholder substitution
-    today = date.today().strftime("%B %d, %Y")  # e.g. "February 21, 2026"
-    prompt = build_prompt(user_input, template_chunks, law_chunks, entities=entities, today=today)
-
-    # Debug: log full prompt to terminal
-    # _maybe_log_prompt(
-    #     prompt,
-    #     template_file=template_file,
-    #     template_len=len(template_chunks[0]) if template_chunks else 0,
-    #     law_len=sum(len(c) for c in law_chunks) if law_chunks else 0,
-    # )
-
-    # Call OpenAI with streaming enabled
-    stream = client.chat.completions.create(
-        model="gpt-4o-mini",
+async def _retrieve(user_input):
+    # Hybrid BM25 + vector ranking puts exact legal terms near the top,
+    # so fewer results still cover template and law
+    return await aretrieve(user_input, n_results=6, mode="hybrid")
+
+async def _prepare_prompt(user_input, mode, today, extraction=None, retrieved=None):
+    """
+    Extraction and retrieval do not depend on each other, so they run
+    concurrently and only join at prompt building.  An extraction task
+    already in flight and/or a finished retrieval result can be passed in.
+
+    Returns (rendered, prompt, prompt_report, timings).  ``rendered`` is the
+    locally filled template in hybrid mode, split into (body, signatures) at
+    the signature blocks (signatures is None when the template has none),
+    and None otherwise; ``prompt`` is then the clause prompt, or None when no
+    legal provisions were retrieved.
+    ``prompt_report`` holds the prompt's token count per section.
+    """
+    async def extract():
+        return await (extraction or extract_entities(user_input))
+
+    async def retrieve():
+        return retrieved if retrieved is not None else await _retrieve(user_input)
+
+    def build(extract, retrieve):
+        docs, metas, _ = retrieve
+        template, template_chunks, law_chunks = _select_template(user_input, extract, docs, metas)
+
+        if mode == "hybrid" and template:
+            filled = fill_template(template.text, extract, today)
+            report = {}
+            prompt = build_clause_prompt(user_input, filled, law_chunks, entities=extract, report=report) if law_chunks else None
+            split = signature_block_line(template.text)
+            if split is None:
+                return (filled, None), prompt, report
+            lines = filled.split("\n")
+            return ("\n".join(lines[:split]), "\n".join(lines[split:])), prompt, report
+
+        # Entities go into the prompt for reliable placeholder substitution
+        report = {}
+        # The registry already counted the template's tokens
+        prompt = build_prompt(user_input, template_chunks, law_chunks, entities=extract, today=today,
+                              report=report, template_tokens=template.tokens if template else None)
+
+        # Debug: log full prompt to terminal
+        # _maybe_log_prompt(
+        #     prompt,
+        #     template_file=template.filename if template else None,
+        #     template_len=len(template_chunks[0]) if template_chunks else 0,
+        #     law_len=sum(len(c) for c in law_chunks) if law_chunks else 0,
+        # )
+        return None, prompt, report
+
+    dag = (
+        StageDAG()
+        .add("extract", extract)
+        .add("retrieve", retrieve)
+        .add("prompt", build, deps=("extract", "retrieve"))
+    )
+    results, timings = await dag.run()
+    rendered, prompt, report = results["prompt"]
+    return rendered, prompt, report, timings
+
+async def _stream_completion(call, system, prompt, max_tokens):
+    """
+    Yield each text chunk as it arrives from OpenAI, recording time to first
+    token, stream duration and token usage under ``call``.
+    """
+    started = time.perf_counter()
+    first_token = True
+    usage = None
+    stream = await get_client().chat.completions.create(
+        model=GENERATION_MODEL,
         messages=[
-            {"role": "system", "content": (
-                "You are completing a legal contract template. "
-                "You MUST replace ALL placeholders with the extracted details provided. "
-                "This includes section headings — 'PARTY 1' must be replaced with the actual Party 1 name, "
-                "'PARTY 2' with the actual Party 2 name. "
-                "Reproduce the entire template verbatim otherwise. Do not skip any section."
-            )},
+            {"role": "system", "content": system},
             {"role": "user", "content": prompt}
         ],
         temperature=0.0,
-        max_tokens=16000,
+        max_tokens=max_tokens,
         stream=True,
+        stream_options={"include_usage": True},
     )
-
-    # Yield each text chunk as it arrives from OpenAI
-    for chunk in stream:
+    async for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue  # the final usage-only chunk
         delta = chunk.choices[0].delta.content
         if delta:
+            if first_token:
+                observe(f"{call}.first_token", time.perf_counter() - started)
+                first_token = False
             yield delta
+    observe(f"{call}.stream", time.perf_counter() - started)
+    record_usage(call, GENERATION_MODEL, usage)
+
+async def _contract_chunks(rendered, prompt):
+    if rendered is None:
+        async for delta in _stream_completion("generate", CONTRACT_SYSTEM_PROMPT, prompt, max_tokens=16000):
+            yield delta
+        return
+
+    # The filled template up to the signature blocks goes out before the
+    # model is even called; the clauses follow it, then the signature blocks
+    body, signatures = rendered
+    yield body
+    added = False
+    if prompt is not None:
+        async for delta in _stream_completion("clauses", CLAUSE_SYSTEM_PROMPT, prompt, max_tokens=CLAUSE_MAX_TOKENS):
+            if not added:
+                delta = "\n\n" + delta.lstrip()
+                added = True
+            yield delta
+    if signatures is not None:
+        yield ("\n\n" if added else "\n") + signatures
+
+def _elapsed_ms(since):
+    return round((time.perf_counter() - since) * 1000, 1)
+
+async def generate_contract(user_input, timings=None, mode=None):
+    """
+    Stream the completed contract.  ``mode`` overrides GENERATION_MODE.  If
+    ``timings`` is a dict it receives per-stage timings (start offset /
+    duration in ms), time to first chunk, total time, the cache outcome and,
+    on a miss, the prompt token count per section.
+
+    With GENERATION_CACHE on, retrieval runs first (its chunk IDs and the
+    candidate templates' text are part of the cache key) while extraction
+    starts beside it, so a miss loses no time to the lookup.  A hit cancels
+    the extraction and replays the stored contract; a miss hands the running
+    extraction to the prompt stage, and a stream that runs to completion is
+    stored.
+    """
+    started = time.perf_counter()
+    mode = mode or GENERATION_MODE
+    today = date.today().strftime("%B %d, %Y")  # e.g. "February 21, 2026"
+    stage_timings = {}
+    extraction = retrieved = cache_key = None
+
+    if GENERATION_CACHE:
+        extraction = asyncio.create_task(extract_entities(user_input))
+
+        def extracted(task):
+            if not task.cancelled():
+                stage_timings["extract"] = {"start_ms": 0.0, "duration_ms": _elapsed_ms(started)}
+
+        extraction.add_done_callback(extracted)
+        try:
+            retrieved = await _retrieve(user_input)
+            stage_timings["retrieve"] = {"start_ms": 0.0, "duration_ms": _elapsed_ms(started)}
+            # The key stats (and may re-read) template files: build it off the loop too
+            cache_key = await asyncio.to_thread(_contract_key, user_input, mode, today, retrieved[1])
+            cached = await generation_cache.aget("contracts", cache_key)
+        except BaseException:
+            extraction.cancel()
+            raise
+        if cached is not None:
+            extraction.cancel()
+            stage_timings.pop("extract", None)  # finished first, but its result is unused
+            if timings is not None:
+                timings.update(stage_timings, mode=cached["mode"], cache="hit")
+            async for chunk in _replay(cached["text"]):
+                if timings is not None and "first_token_ms" not in timings:
+                    timings["first_token_ms"] = _elapsed_ms(started)
+                yield chunk
+            observe("generate.replay", time.perf_counter() - started)
+            if timings is not None:
+                timings["total_ms"] = _elapsed_ms(started)
+            return
+
+    offset = _elapsed_ms(started)
+    rendered, prompt, prompt_report, dag_timings = await _prepare_prompt(user_input, mode, today, extraction, retrieved)
+    for name, timing in dag_timings.items():
+        if name not in stage_timings:
+            stage_timings[name] = dict(timing, start_ms=round(timing["start_ms"] + offset, 1))
+    served_mode = "hybrid" if rendered is not None else "llm"
+    if timings is not None:
+        timings.update(stage_timings, mode=served_mode, cache="miss" if GENERATION_CACHE else "off")
+        timings["prompt_tokens"] = prompt_report
+
+    parts = []
+    async for chunk in _contract_chunks(rendered, prompt):
+        if timings is not None and "first_token_ms" not in timings:
+            timings["first_token_ms"] = _elapsed_ms(started)
+        parts.append(chunk)
+        yield chunk
+    # Only reached when the client read the whole stream
+    if cache_key is not None:
+        await generation_cache.aput("contracts", cache_key, {"mode": served_mode, "text": "".join(parts)})
+    observe("generate.total", time.perf_counter() - started)
+    if timings is not None:
+        timings["total_ms"] = _elapsed_ms(started)
@@ -0,0 +1,363 @@
+"""
+inference_pool.py
+─────────────────
+Bounded process pool for CUAD clause extraction, so CPU-heavy RoBERTa
+inference never runs on the uvicorn event loop.
+
+Each worker process loads the scanner model once (in its initializer) and
+then serves scan jobs.  A failed warm-up (hub unreachable, export error) is
+logged and the model is loaded on the worker's first job instead, since an
+initializer that raises breaks the pool for good; a pool that breaks anyway
+(e.g. a worker killed by the OOM killer) is replaced on the next job.  At most SCAN_WORKERS jobs run at a time and at most
+SCAN_QUEUE_MAX_DEPTH more may wait for a free worker; beyond that
+``InferencePool.scan`` raises ``QueueFullError`` so the API can answer 503.
+
+``InferencePool.scan_stream`` relays per-category results from the worker
+as soon as each one is resolved; ``InferencePool.scan_batch_stream`` does the
+same per document for a batch of contracts, split into one shard per worker
+(each shard admitted as its own job) whose documents share inference
+batches.  Workers put events, tagged with their job ID, on one manager queue;
+a single reader thread hands each event to its stream's ``asyncio.Queue`` on
+the event loop.  Nothing is started until it is needed: the executor on the
+first job, the manager and the reader on the first streamed job, or both
+up front through ``start()`` and ``warm_up()``.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import contract_scanner
+import metrics
+
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "2"))
+SCAN_QUEUE_MAX_DEPTH = int(os.getenv("SCAN_QUEUE_MAX_DEPTH", "8"))
+SCAN_RETRY_AFTER = int(os.getenv("SCAN_RETRY_AFTER", "30"))
+
+log = logging.getLogger(__name__)
+
+# Intra-op threads per worker; defaults to an even split of the CPU cores
+SCAN_WORKER_THREADS = int(
+    os.getenv("SCAN_WORKER_THREADS", str(max(1, (os.cpu_count() or 1) // SCAN_WORKERS)))
+)
+
+
+class QueueFullError(Exception):
+    """Raised when the scan queue already holds SCAN_QUEUE_MAX_DEPTH jobs."""
+
+
+def _init_worker(threads: int) -> None:
+    """Runs once in every worker process: pin thread count, load and warm the model."""
+    # Must be set before torch / onnxruntime are imported by the scanner
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(threads))
+    try:
+        contract_scanner.warm_up()
+    except Exception:
+        # Raising here would mark the whole executor broken; the first job
+        # loads the model lazily (and reports its error) instead
+        log.exception("Scanner warm-up failed in worker %d", os.getpid())
+
+
+def _ping() -> int:
+    """No-op job used to force every worker process to start."""
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _scan_job(text: str) -> tuple[dict, float, float, dict]:
+    """
+    Worker-side job: returns (clauses, started_at, finished_at, phases) —
+    wall-clock times plus seconds per scanner phase.
+    """
+    started = time.time()
+    phases: dict = {}
+    result = contract_scanner.scan_contract(text, timings=phases)
+    return result, started, time.time(), phases
+
+
+def _scan_stream_job(text: str, events, job_id: int) -> None:
+    """Worker-side streaming job: pushes started / item / finished events."""
+    events.put((job_id, "started", time.time()))
+    phases: dict = {}
+    for category, result in contract_scanner.iter_scan(text, timings=phases):
+        events.put((job_id, "item", category, result))
+    events.put((job_id, "finished", time.time(), phases))
+
+
+def _scan_batch_job(texts: list[str], events, job_id: int) -> None:
+    """Worker-side batch job: one item event per completed document."""
+    events.put((job_id, "started", time.time()))
+    phases: dict = {}
+    for index, clauses in contract_scanner.scan_many(texts, timings=phases):
+        events.put((job_id, "item", index, clauses))
+    events.put((job_id, "finished", time.time(), phases))
+
+
+def _shard(texts: list[str], count: int) -> list[list[int]]:
+    """Split document indices into at most ``count`` shards of similar total length."""
+    shards: list[list[int]] = [[] for _ in range(count)]
+    sizes = [0] * count
+    for index in sorted(range(len(texts)), key=lambda i: -len(texts[i])):
+        lightest = sizes.index(min(sizes))
+        shards[lightest].append(index)
+        sizes[lightest] += len(texts[index])
+    return [sorted(shard) for shard in shards if shard]
+
+
+def _record(meta: dict, phases: dict) -> None:
+    """Bring a job's worker-side timings into the parent's metrics and ``meta``."""
+    meta["phases_ms"] = {phase: round(seconds * 1000, 1) for phase, seconds in phases.items()}
+    metrics.observe("scan.queue_wait", meta["queue_wait_ms"] / 1000)
+    metrics.observe("scan.inference", meta["inference_ms"] / 1000)
+    for phase, seconds in phases.items():
+        metrics.observe(f"scan.{phase}", seconds)
+
+
+class InferencePool:
+    """A lazily started process pool with a bounded admission queue."""
+
+    def __init__(self, workers: int = SCAN_WORKERS, max_depth: int = SCAN_QUEUE_MAX_DEPTH):
+        self.workers = workers
+        self.max_depth = max_depth
+        self._executor: ProcessPoolExecutor | None = None
+        self._manager = None
+        self._events = None  # manager queue shared by every streaming job
+        self._reader: threading.Thread | None = None
+        self._streams: dict[int, tuple] = {}  # job ID → (loop, asyncio.Queue)
+        self._job_ids = itertools.count()
+        self._start_lock = threading.Lock()
+        self._pending = 0  # running + waiting jobs
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(SCAN_WORKER_THREADS,),
+            )
+        return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken executor so the next job starts a fresh one."""
+        if self._executor is executor:
+            log.error("Scan worker pool is broken; starting a new one for the next job")
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start_manager(self) -> None:
+        with self._start_lock:
+            if self._manager is not None:
+                return
+            self._manager = mp.get_context("spawn").Manager()
+            self._events = self._manager.Queue()
+            self._reader = threading.Thread(
+                target=self._read_events, args=(self._events,), name="scan-events", daemon=True
+            )
+            self._reader.start()
+
+    def _read_events(self, events) -> None:
+        """Reader thread: route each worker event to the stream waiting for it."""
+        while True:
+            try:
+                event = events.get()
+            except (EOFError, OSError):  # manager shut down
+                return
+            if event is None:
+                return
+            stream = self._streams.get(event[0])
+            if stream is not None:
+                loop, inbox = stream
+                loop.call_soon_threadsafe(inbox.put_nowait, event[1:])
+
+    async def start(self) -> None:
+        """Start the event manager and its reader thread (the manager is a process)."""
+        if self._manager is None:
+            await asyncio.to_thread(self._start_manager)
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs admitted but still waiting for a free worker."""
+        return max(0, self._pending - self.workers)
+
+    @property
+    def saturated(self) -> bool:
+        return self._pending >= self.workers + self.max_depth
+
+    def _admit(self, jobs: int = 1) -> None:
+        if self._pending + jobs > self.workers + self.max_depth:
+            raise QueueFullError(
+                f"{self.queue_depth} scan jobs already queued (max {self.max_depth})"
+            )
+        self._pending += jobs
+
+    async def warm_up(self) -> None:
+        """Start every worker (each loads the model and runs a dummy inference)."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            await asyncio.gather(
+                *(loop.run_in_executor(executor, _ping) for _ in range(self.workers))
+            )
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+
+    async def scan(self, text: str) -> tuple[dict, dict]:
+        """
+        Run ``scan_contract(text)`` in a worker process.
+
+        Returns (clauses, meta) where meta holds queue_wait_ms and
+        inference_ms.  Raises QueueFullError when the queue is saturated.
+        """
+        self._admit()
+        executor = self._get_executor()
+        try:
+            submitted = time.time()
+            loop = asyncio.get_running_loop()
+            result, started, finished, phases = await loop.run_in_executor(executor, _scan_job, text)
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+        finally:
+            self._pending -= 1
+
+        meta = {
+            "queue_wait_ms": round(max(0.0, started - submitted) * 1000, 1),
+            "inference_ms": round((finished - started) * 1000, 1),
+        }
+        _record(meta, phases)
+        return result, meta
+
+    async def _relay(self, job, payload, meta: dict):
+        """Run a streaming ``job`` (already admitted) in a worker and yield its item events."""
+        job_id = next(self._job_ids)
+        try:
+            await self.start()
+            loop = asyncio.get_running_loop()
+            inbox: asyncio.Queue = asyncio.Queue()
+            self._streams[job_id] = (loop, inbox)
+            submitted = time.time()
+            executor = self._get_executor()
+            try:
+                future = loop.run_in_executor(executor, job, payload, self._events, job_id)
+            except BrokenProcessPool:
+                self._discard(executor)
+                raise
+            # A job that dies never sends "finished"; its future ends the wait
+            future.add_done_callback(lambda _: inbox.put_nowait(("done",)))
+
+            started = submitted
+            while True:
+                event = await inbox.get()
+                if event[0] == "done":
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        self._discard(executor)
+                    if future.exception() is not None:
+                        raise future.exception()  # re-raise a worker crash
+                    continue  # "finished" is still on its way through the reader
+                if event[0] == "started":
+                    started = event[1]
+                    meta["queue_wait_ms"] = round(max(0.0, started - submitted) * 1000, 1)
+                elif event[0] == "item":
+                    yield event[1], event[2]
+                else:
+                    meta["inference_ms"] = round((event[1] - started) * 1000, 1)
+                    _record(meta, event[2])
+                    break
+            await future
+        finally:
+            self._streams.pop(job_id, None)
+
+    async def scan_stream(self, text: str, meta: dict):
+        """
+        Async generator over ``(category, result)`` pairs of ``iter_scan(text)``
+        run in a worker process.  Fills ``meta`` with queue_wait_ms and
+        inference_ms once the worker has finished.
+        """
+        self._admit()
+        try:
+            async for item in self._relay(_scan_stream_job, text, meta):
+                yield item
+        finally:
+            self._pending -= 1
+
+    async def scan_batch_stream(self, texts: list[str], meta: dict):
+        """
+        Async generator over ``(text_index, clauses)`` for a batch of documents,
+        yielded as each document completes.
+
+        The batch is split into one shard per worker (fewer when the queue
+        has less room), each admitted as its own job; a shard's documents
+        share inference batches in its worker.  ``meta`` gets the slowest
+        shard's queue_wait_ms / inference_ms, the phases summed over shards
+        and the shard count.
+        """
+        room = self.workers + self.max_depth - self._pending
+        shards = _shard(texts, max(1, min(self.workers, room)))
+        self._admit(len(shards))
+        held = set(range(len(shards)))  # shards still counted in _pending
+        metas = [{} for _ in shards]
+        results: asyncio.Queue = asyncio.Queue()
+
+        def release(shard: int) -> None:
+            if shard in held:
+                held.discard(shard)
+                self._pending -= 1
+
+        async def run(shard: int, indices: list[int]):
+            try:
+                batch = [texts[index] for index in indices]
+                async for position, clauses in self._relay(_scan_batch_job, batch, metas[shard]):
+                    results.put_nowait((indices[position], clauses))
+                results.put_nowait(None)
+            except Exception as e:
+                results.put_nowait(e)
+            finally:
+                release(shard)
+
+        tasks = [asyncio.create_task(run(shard, indices)) for shard, indices in enumerate(shards)]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await results.get()
+                if item is None:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            for shard in list(held):  # cancelled tasks may not have run their cleanup yet
+                release(shard)
+
+        meta["shards"] = len(shards)
+        meta["queue_wait_ms"] = max(m.get("queue_wait_ms", 0.0) for m in metas)
+        meta["inference_ms"] = max(m.get("inference_ms", 0.0) for m in metas)
+        phases: dict = {}
+        for m in metas:
+            for phase, ms in m.get("phases_ms", {}).items():
+                phases[phase] = round(phases.get(phase, 0.0) + ms, 1)
+        meta["phases_ms"] = phases
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._events.put(None)  # stops the reader thread
+            self._reader.join(timeout=5)
+            self._manager.shutdown()
+            self._manager = self._events = self._reader = None
+
+
+scan_pool = InferencePool()
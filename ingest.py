@@ -0,0 +1,214 @@
+"""
+ingest.py
+─────────
+Bounded-memory ingestion of uploaded contracts.
+
+Uploads are spooled to a temporary file UPLOAD_CHUNK_BYTES at a time and
+rejected as soon as they exceed UPLOAD_MAX_MB, so a large exhibit never sits
+in memory as one bytes object.  PDF pages are extracted in a separate process
+pool, PDF_PAGES_PER_JOB pages per job with at most 2 × PDF_WORKERS jobs in
+flight, and appended to the document text in page order as each job returns.
+"""
+
+import asyncio
+import codecs
+import io
+import multiprocessing as mp
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from metrics import timed
+
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "50"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_JOB = int(os.getenv("PDF_PAGES_PER_JOB", "8"))
+
+SUPPORTED_SUFFIXES = (".pdf", ".txt")
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload (or an archive member) exceeds UPLOAD_MAX_MB, or an archive its limits."""
+
+
+def max_upload_bytes() -> int:
+    return int(UPLOAD_MAX_MB * 1024 * 1024)
+
+
+# ── spooling ──────────────────────────────────────────────────────────────────
+async def spool_upload(file, directory: str | None = None) -> str:
+    """Copy an UploadFile to a temp file in chunks; returns its path."""
+    limit = max_upload_bytes()
+    fd, path = tempfile.mkstemp(dir=directory, suffix=os.path.splitext(file.filename or "")[1])
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                written += len(chunk)
+                if written > limit:
+                    raise UploadTooLargeError(
+                        f"{file.filename} exceeds the {UPLOAD_MAX_MB:g} MB upload limit."
+                    )
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+@asynccontextmanager
+async def spooled_upload(file):
+    """``async with spooled_upload(file) as path`` — the temp file is removed on exit."""
+    path = await spool_upload(file)
+    try:
+        yield path
+    finally:
+        os.remove(path)
+
+
+def _copy_bounded(src, out, limit: int, error: str) -> int:
+    """Copy ``src`` to ``out`` in chunks, raising UploadTooLargeError past ``limit`` bytes."""
+    written = 0
+    while chunk := src.read(UPLOAD_CHUNK_BYTES):
+        written += len(chunk)
+        if written > limit:
+            raise UploadTooLargeError(error)
+        out.write(chunk)
+    return written
+
+
+def unpack_zip(
+    path: str,
+    directory: str,
+    max_members: int | None = None,
+    max_bytes: int | None = None,
+) -> list[tuple[str, str]]:
+    """
+    Extract the .pdf/.txt members of a zip archive into ``directory``.
+
+    Returns (member name, extracted path) pairs.  Members are copied in
+    chunks and each is held to the same size limit as a direct upload;
+    extraction stops with UploadTooLargeError as soon as the archive holds
+    more than ``max_members`` documents or its members add up to more than
+    ``max_bytes`` (sizes are counted as written, not as the archive claims).
+    Raises ValueError for a corrupt archive.
+    """
+    limit = max_upload_bytes()
+    members = []
+    total = 0
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.infolist():
+                name = member.filename
+                if member.is_dir() or name.startswith("__MACOSX/"):
+                    continue
+                if not name.lower().endswith(SUPPORTED_SUFFIXES):
+                    continue
+                if max_members is not None and len(members) >= max_members:
+                    raise UploadTooLargeError("Too many documents in the archive.")
+
+                budget, error = limit, f"{name} exceeds the {UPLOAD_MAX_MB:g} MB upload limit."
+                if max_bytes is not None and max_bytes - total < budget:
+                    budget = max_bytes - total
+                    error = f"The archive unpacks to more than {max_bytes / 1024 / 1024:g} MB."
+                if member.file_size > budget:
+                    raise UploadTooLargeError(error)
+                fd, target = tempfile.mkstemp(dir=directory, suffix=os.path.splitext(name)[1])
+                with archive.open(member) as src, os.fdopen(fd, "wb") as out:
+                    total += _copy_bounded(src, out, budget, error)
+                members.append((name, target))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Could not open {os.path.basename(path)}: {e}")
+    return members
+
+
+# ── PDF page extraction (runs in worker processes) ────────────────────────────
+_executor: ProcessPoolExecutor | None = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS, mp_context=mp.get_context("spawn")
+        )
+    return _executor
+
+
+def _page_count(path: str) -> int:
+    import PyPDF2
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def _extract_pages(path: str, start: int, end: int) -> list[str]:
+    import PyPDF2
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+async def iter_pdf_pages(path: str):
+    """Async generator over the text of each page, in order."""
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    n_pages = await loop.run_in_executor(executor, _page_count, path)
+    ranges = [
+        (start, min(start + PDF_PAGES_PER_JOB, n_pages))
+        for start in range(0, n_pages, PDF_PAGES_PER_JOB)
+    ]
+
+    in_flight = []
+    try:
+        for start, end in ranges:
+            in_flight.append(loop.run_in_executor(executor, _extract_pages, path, start, end))
+            if len(in_flight) >= 2 * PDF_WORKERS:
+                for page in await in_flight.pop(0):
+                    yield page
+        while in_flight:
+            for page in await in_flight.pop(0):
+                yield page
+    finally:
+        for job in in_flight:
+            job.cancel()
+
+
+@timed("extract_text")
+async def extract_text(path: str, filename: str) -> str:
+    """
+    Text of a spooled PDF or TXT contract.  Raises ValueError on an
+    unsupported, unreadable or empty file.
+    """
+    buffer = io.StringIO()
+    name = filename.lower()
+    if name.endswith(".pdf"):
+        try:
+            first = True
+            async for page in iter_pdf_pages(path):
+                if not first:
+                    buffer.write("\n")
+                buffer.write(page)
+                first = False
+        except Exception as e:
+            raise ValueError(f"Could not parse PDF: {e}")
+    elif name.endswith(".txt"):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with open(path, "rb") as f:
+            while chunk := f.read(UPLOAD_CHUNK_BYTES):
+                buffer.write(decoder.decode(chunk))
+        buffer.write(decoder.decode(b"", final=True))
+    else:
+        raise ValueError("Unsupported file type. Please upload a .pdf or .txt file.")
+
+    text = buffer.getvalue()
+    if not text.strip():
+        raise ValueError("Uploaded file is empty.")
+    return text
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
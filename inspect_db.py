@@ -1,7 +1,7 @@
-from retrieval import collection
+from retrieval import get_collection
 
 # Get all chunks (limit to 10 for inspection)
-results = collection.get(limit=10)
+results = get_collection().get(limit=10)
 
 for i, (doc, meta, idx) in enumerate(zip(results['documents'], results['metadatas'], results['ids'])):
     print(f"\n--- Chunk {i} ---")
@@ -0,0 +1,131 @@
+"""
+intent_router.py
+────────────────
+Local intent classification by cosine similarity to per-intent centroids.
+
+Centroids are the normalized mean embeddings of the labeled examples in
+intent_seeds.json, embedded once in one batched call through the shared
+embedding cache's async path (concurrent first requests wait for that one
+load).  A query's confidence is the softmax of its centroid similarities at
+INTENT_TEMPERATURE; below INTENT_CONFIDENCE_THRESHOLD the router falls back
+to ``retrieval.classify_intent_llm``.  Results are memoized per normalized
+query, and ``stats()`` reports how often the LLM fallback fires.  Intents
+are the same labels the LLM classifier returns, so
+``route_filter_from_intent`` works unchanged.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+INTENT_SEEDS_PATH = os.getenv("INTENT_SEEDS_PATH", "intent_seeds.json")
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.6"))
+INTENT_TEMPERATURE = float(os.getenv("INTENT_TEMPERATURE", "0.02"))
+INTENT_MEMO_ITEMS = int(os.getenv("INTENT_MEMO_ITEMS", "1024"))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+class IntentRouter:
+    def __init__(
+        self,
+        seeds_path: str = INTENT_SEEDS_PATH,
+        threshold: float = INTENT_CONFIDENCE_THRESHOLD,
+        temperature: float = INTENT_TEMPERATURE,
+        memo_items: int = INTENT_MEMO_ITEMS,
+    ):
+        self.seeds_path = seeds_path
+        self.threshold = threshold
+        self.temperature = temperature
+        self.memo_items = memo_items
+        self._intents: list[str] = []
+        self._centroids: np.ndarray | None = None
+        self._memo: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = asyncio.Lock()
+        self._stats = {"queries": 0, "memo_hits": 0, "local": 0, "fallback": 0}
+
+    async def _embed(self, texts: list[str]) -> np.ndarray:
+        from retrieval import get_embedding_function
+
+        vectors = np.asarray(await get_embedding_function().acall(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _read_seeds(self) -> dict[str, list[str]]:
+        with open(self.seeds_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    async def load(self) -> int:
+        """Embed the seed examples and build one centroid per intent (once)."""
+        async with self._load_lock:
+            if self._centroids is not None:
+                return len(self._intents)
+            seeds = await asyncio.to_thread(self._read_seeds)
+            intents = list(seeds)
+            examples = [example for intent in intents for example in seeds[intent]]
+            vectors = await self._embed(examples)
+
+            centroids, start = [], 0
+            for intent in intents:
+                end = start + len(seeds[intent])
+                centroid = vectors[start:end].mean(axis=0)
+                centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+                start = end
+            self._intents, self._centroids = intents, np.stack(centroids)
+            return len(intents)
+
+    async def classify_local(self, query: str) -> tuple[str, float]:
+        """Nearest centroid and its softmax confidence, without any fallback."""
+        if self._centroids is None:
+            await self.load()
+        sims = self._centroids @ (await self._embed([query]))[0]
+        weights = np.exp((sims - sims.max()) / self.temperature)
+        probs = weights / weights.sum()
+        best = int(np.argmax(probs))
+        return self._intents[best], float(probs[best])
+
+    async def classify(self, query: str) -> tuple[str, float]:
+        """(intent, confidence) — locally when confident, else via the LLM."""
+        key = normalize_query(query)
+        with self._lock:
+            self._stats["queries"] += 1
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self._stats["memo_hits"] += 1
+                return self._memo[key]
+
+        intent, confidence = await self.classify_local(query)
+        if confidence >= self.threshold:
+            event = "local"
+        else:
+            from retrieval import classify_intent_llm
+
+            intent, confidence = await classify_intent_llm(query)
+            event = "fallback"
+
+        with self._lock:
+            self._stats[event] += 1
+            self._memo[key] = (intent, confidence)
+            while len(self._memo) > self.memo_items:
+                self._memo.popitem(last=False)
+        return intent, confidence
+
+    def stats(self) -> dict:
+        with self._lock:
+            classified = self._stats["local"] + self._stats["fallback"]
+            return {
+                **self._stats,
+                "fallback_rate": round(self._stats["fallback"] / classified, 4) if classified else 0.0,
+            }
+
+
+intent_router = IntentRouter()
@@ -1,27 +1,82 @@
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 from generation import generate_contract
-from contract_scanner import scan_contract
-from risk_assessment import assess_risk
-import traceback
+from templates import template_registry
+from retrieval import get_collection, get_embedding_function, EMBEDDING_BACKEND
+from inference_pool import scan_pool, QueueFullError, SCAN_RETRY_AFTER
+from risk_assessment import assess_risk, RISK_MODEL
+from result_cache import scan_cache, generation_cache, content_key
+from embedding_cache import embedding_cache
+from contract_scanner import scanner_fingerprint
+import ingest
+import openai_client
+from request_logging import setup_logging, RequestLogMiddleware, capped_fields
+import metrics
+import asyncio
 import json
-import io
+import tempfile
 import logging
+import os
 
-# Log to both console AND a file called requests.log
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s  %(message)s",
-    handlers=[
-        logging.FileHandler("requests.log", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+# JSON lines to console and requests.log, written off the event loop
+log_listener = setup_logging()
 log = logging.getLogger(__name__)
 
-app = FastAPI(title="Legal Contract Generator API", version="1.0.0")
+# Components preloaded at startup (comma-separated: scanner, chroma, templates).
+# Anything not listed loads lazily on first use — a /generate-only
+# deployment can set WARMUP=chroma and never import torch.
+WARMUP = {c.strip() for c in os.getenv("WARMUP", "scanner,chroma,templates").split(",") if c.strip()}
+warmup_status: dict[str, str] = {}
+
+
+def _warm_chroma():
+    get_collection().count()
+    if EMBEDDING_BACKEND != "openai":
+        # Load the local embedding model now (bypassing the cache, which may hit)
+        get_embedding_function().inner(["warm-up"])
+
+
+async def _warm_up():
+    jobs = {
+        "scanner": scan_pool.warm_up,
+        "chroma": lambda: asyncio.to_thread(_warm_chroma),
+        "templates": lambda: asyncio.to_thread(template_registry.load_all),
+    }
+    for name in jobs:
+        warmup_status[name] = "pending" if name in WARMUP else "disabled"
+
+    async def run(name, job):
+        try:
+            await job()
+            warmup_status[name] = "ready"
+            log.info(f"[startup] {name} warmed up")
+        except Exception as e:
+            warmup_status[name] = f"error: {e}"
+            log.error(f"[startup] {name} warm-up failed: {e}")
+
+    await asyncio.gather(*(run(name, job) for name, job in jobs.items() if name in WARMUP))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Event manager process for streamed scans: started before requests arrive
+    # when the scanner is warmed up, else by the first streamed scan
+    if "scanner" in WARMUP:
+        await scan_pool.start()
+    # Warm up in the background so the server answers /ready while loading
+    warm_up = asyncio.create_task(_warm_up())
+    yield
+    warm_up.cancel()
+    scan_pool.shutdown()
+    ingest.shutdown()
+    await openai_client.aclose()
+    log_listener.stop()
+
+
+app = FastAPI(title="Legal Contract Generator API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,102 +84,380 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Request ID + one structured access record per request (bodies sampled and capped)
+app.add_middleware(RequestLogMiddleware)
+# Outermost: per-request trace, request metrics, optional Server-Timing header
+app.add_middleware(metrics.TimingMiddleware)
 
 
 class ContractRequest(BaseModel):
     description: str
 
 
-# ── Debug middleware: logs every incoming request ──────────────────────────────
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    body = await request.body()
-    log.info("========== INCOMING REQUEST ==========")
-    log.info(f"METHOD : {request.method}")
-    log.info(f"URL    : {request.url}")
-    log.info(f"BODY   : {body.decode('utf-8', errors='replace')}")
-    response = await call_next(request)
-    log.info(f"RESPONSE STATUS: {response.status_code}")
-    log.info("======================================")
-    return response
-# ──────────────────────────────────────────────────────────────────────────────
-
-
 @app.get("/")
 def root():
     return {"message": "Legal Contract Generator API is running. POST to /generate"}
 
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once every enabled component has warmed up, else 503."""
+    is_ready = bool(warmup_status) and all(
+        status in ("ready", "disabled") for status in warmup_status.values()
+    )
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, "components": warmup_status},
+    )
+
+
 @app.post("/generate")
-def generate(request: ContractRequest):
-    log.info(f"[generate] description = {request.description!r}")
+async def generate(request: ContractRequest):
+    log.info("[generate] request", extra=capped_fields("description", request.description))
     if not request.description.strip():
         raise HTTPException(status_code=400, detail="description cannot be empty")
     try:
-        # generate_contract is now a generator — stream chunks to the client
-        def stream():
-            for chunk in generate_contract(request.description):
+        # generate_contract is now a generator — stream chunks to the client.
+        # The first chunk is awaited here, so failures before it become a 500
+        # and the Server-Timing header covers extraction, retrieval and TTFT.
+        timings = {}
+        chunks = generate_contract(request.description, timings=timings)
+        first = await anext(chunks, "")
+
+        async def stream():
+            yield first
+            async for chunk in chunks:
                 yield chunk
+            log.info("[generate] finished", extra={"timings": timings})
 
         return StreamingResponse(stream(), media_type="text/plain; charset=utf-8")
     except Exception as e:
-        log.error(f"[ERROR] {e}")
-        traceback.print_exc()
+        log.exception(f"[generate] Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/templates")
+def list_templates():
+    """Registered templates with token counts and placeholder inventories."""
+    return [template.summary() for template in template_registry.all()]
+
+
+async def _read_upload_text(file: UploadFile) -> str:
+    """
+    Extract the text of an uploaded PDF or TXT contract.  The upload is
+    spooled to disk under the size cap (413), bad input is a 400.
+    """
+    try:
+        async with ingest.spooled_upload(file) as path:
+            return await ingest.extract_text(path, file.filename or "")
+    except ingest.UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        log.error(f"[scan] Could not read {file.filename}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/scan")
 async def scan_contract_endpoint(file: UploadFile = File(...)):
     """Upload a contract (PDF or TXT) → extract clauses via CUAD → return structured JSON."""
     log.info(f"[scan] Received file: {file.filename}")
 
     # ── 1. Read uploaded file ──────────────────────────────────────────────────
-    raw_bytes = await file.read()
-    filename = (file.filename or "").lower()
-
-    if filename.endswith(".pdf"):
-        try:
-            import PyPDF2
-            reader = PyPDF2.PdfReader(io.BytesIO(raw_bytes))
-            text = "\n".join(page.extract_text() or "" for page in reader.pages)
-        except Exception as e:
-            log.error(f"[scan] PDF parse error: {e}")
-            raise HTTPException(status_code=400, detail=f"Could not parse PDF: {e}")
-    elif filename.endswith(".txt"):
-        text = raw_bytes.decode("utf-8", errors="replace")
-    else:
-        raise HTTPException(
-            status_code=400,
-            detail="Unsupported file type. Please upload a .pdf or .txt file."
-        )
-
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
-
+    text = await _read_upload_text(file)
     log.info(f"[scan] Extracted {len(text)} chars from {file.filename}")
 
-    # ── 2. CUAD clause extraction ──────────────────────────────────────────────
+    # ── 2. CUAD clause extraction (cache, then worker process pool) ────────────
+    clauses_key = content_key(text, scanner_fingerprint())
+    risk_key = content_key(text, scanner_fingerprint(), RISK_MODEL)
+    extracted = await scan_cache.aget("clauses", clauses_key)
+    meta = {"queue_wait_ms": 0.0, "inference_ms": 0.0, "cache": {"clauses": "hit", "risk": "hit"}}
     try:
-        extracted = scan_contract(text)
+        if extracted is None:
+            extracted, pool_meta = await scan_pool.scan(text)
+            await scan_cache.aput("clauses", clauses_key, extracted)
+            meta.update(pool_meta)
+            meta["cache"]["clauses"] = "miss"
+    except QueueFullError as e:
+        log.warning(f"[scan] Rejected, queue saturated: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Scanner is busy. Please retry shortly.",
+            headers={"Retry-After": str(SCAN_RETRY_AFTER)},
+        )
     except Exception as e:
-        log.error(f"[scan] CUAD extraction error: {e}")
-        traceback.print_exc()
+        log.exception(f"[scan] CUAD extraction error: {e}")
         raise HTTPException(status_code=500, detail=f"Clause extraction failed: {e}")
 
-    log.info(f"[scan] Extracted {sum(1 for v in extracted.values() if v['found'])} clauses")
+    log.info(
+        f"[scan] Extracted {sum(1 for v in extracted.values() if v['found'])} clauses "
+        f"(queue wait {meta['queue_wait_ms']} ms, inference {meta['inference_ms']} ms)"
+    )
 
     # ── 3. LLM risk assessment (structured JSON) ──────────────────────────────
     try:
-        risk_report = assess_risk(extracted)
+        risk_report = await scan_cache.aget("risk", risk_key)
+        if risk_report is None:
+            risk_report = await assess_risk(extracted)
+            await scan_cache.aput("risk", risk_key, risk_report)
+            meta["cache"]["risk"] = "miss"
     except Exception as e:
-        log.error(f"[scan] Risk assessment error: {e}")
-        traceback.print_exc()
+        log.exception(f"[scan] Risk assessment error: {e}")
         raise HTTPException(status_code=500, detail=f"Risk assessment failed: {e}")
 
     log.info(f"[scan] Risk assessment complete — overall: {risk_report.get('overallRisk', '?')}")
 
-    return JSONResponse(content={"clauses": extracted, "risk": risk_report})
+    return JSONResponse(content={"clauses": extracted, "risk": risk_report, "meta": meta})
+
+
+@app.post("/scan/stream")
+async def scan_contract_stream_endpoint(file: UploadFile = File(...)):
+    """
+    Same as /scan, streamed as NDJSON: one {"event": "clause", "category", "answer",
+    "score", "found", ...} line per category as soon as it is resolved, then
+    {"event": "risk", "risk": {...}} and a closing {"event": "done", "meta": {...}}.
+    """
+    log.info(f"[scan/stream] Received file: {file.filename}")
+    text = await _read_upload_text(file)
+    log.info(f"[scan/stream] Extracted {len(text)} chars from {file.filename}")
+
+    clauses_key = content_key(text, scanner_fingerprint())
+    risk_key = content_key(text, scanner_fingerprint(), RISK_MODEL)
+    extracted = await scan_cache.aget("clauses", clauses_key)
+    if extracted is None and scan_pool.saturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Scanner is busy. Please retry shortly.",
+            headers={"Retry-After": str(SCAN_RETRY_AFTER)},
+        )
+
+    def line(event: dict) -> str:
+        return json.dumps(event) + "\n"
+
+    async def events():
+        nonlocal extracted
+        meta = {"queue_wait_ms": 0.0, "inference_ms": 0.0, "cache": {"clauses": "hit", "risk": "hit"}}
+        try:
+            if extracted is None:
+                extracted = {}
+                async for category, info in scan_pool.scan_stream(text, meta):
+                    extracted[category] = info
+                    yield line({"event": "clause", "category": category, **info})
+                await scan_cache.aput("clauses", clauses_key, extracted)
+                meta["cache"]["clauses"] = "miss"
+            else:
+                for category, info in extracted.items():
+                    yield line({"event": "clause", "category": category, **info})
+
+            risk_report = await scan_cache.aget("risk", risk_key)
+            if risk_report is None:
+                risk_report = await assess_risk(extracted)
+                await scan_cache.aput("risk", risk_key, risk_report)
+                meta["cache"]["risk"] = "miss"
+            yield line({"event": "risk", "risk": risk_report})
+            yield line({"event": "done", "meta": meta})
+        except Exception as e:
+            log.exception(f"[scan/stream] Error: {e}")
+            yield line({"event": "error", "detail": str(e)})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+# Upper bound on documents per /scan/batch request (zip members included)
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "200"))
+# Upper bound on the bytes one /scan/batch request writes to disk (uploads + unpacked members)
+BATCH_MAX_MB = float(os.getenv("BATCH_MAX_MB", "500"))
+# Risk assessments (LLM calls) running at once for one batch
+BATCH_RISK_CONCURRENCY = int(os.getenv("BATCH_RISK_CONCURRENCY", "4"))
+
+
+async def _batch_documents(files: list[UploadFile], directory: str) -> list[tuple[str, str]]:
+    """
+    Spool uploads into ``directory`` as (filename, path) pairs, expanding .zip
+    archives.  The document count and the bytes written are checked as they
+    grow, so an oversized batch is rejected before it is fully on disk.
+    """
+    too_many = f"Too many documents; the limit is {BATCH_MAX_DOCUMENTS}."
+    max_bytes = int(BATCH_MAX_MB * 1024 * 1024)
+    documents = []
+    written = 0
+    try:
+        for file in files:
+            if len(documents) >= BATCH_MAX_DOCUMENTS:
+                raise ingest.UploadTooLargeError(too_many)
+            path = await ingest.spool_upload(file, directory)
+            written += os.path.getsize(path)
+            if written > max_bytes:
+                raise ingest.UploadTooLargeError(f"The batch exceeds the {BATCH_MAX_MB:g} MB limit.")
+            filename = file.filename or ""
+            if filename.lower().endswith(".zip"):
+                members = await asyncio.to_thread(
+                    ingest.unpack_zip, path, directory,
+                    max_members=BATCH_MAX_DOCUMENTS - len(documents),
+                    max_bytes=max_bytes - written,
+                )
+                documents.extend(members)
+                written += sum(os.path.getsize(member_path) for _, member_path in members)
+            else:
+                documents.append((filename, path))
+    except ingest.UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not documents:
+        raise HTTPException(status_code=400, detail="No .pdf or .txt documents uploaded.")
+    return documents
+
+
+@app.post("/scan/batch")
+async def scan_batch_endpoint(files: list[UploadFile] = File(...)):
+    """
+    Scan many contracts (PDF/TXT files, or .zip archives of them) in one request.
+
+    Uncached documents are split into one shard per scanner worker, and the
+    documents of a shard share inference batches; risk assessments then run
+    with bounded concurrency.  Streams NDJSON: one {"event": "document", "index",
+    "filename", "clauses", "risk"} line per document in completion order,
+    {"event": "error", "index", "filename", "detail"} for unreadable ones,
+    and a closing {"event": "done", "meta": {...}}.  Lines do not follow the
+    upload order (cached and blank documents come first, shards interleave):
+    consumers must key results by ``index``, the document's position in the
+    upload (archives expanded in place).
+    """
+    texts, errors = {}, {}
+    with tempfile.TemporaryDirectory(prefix="scan_batch_") as directory:
+        documents = await _batch_documents(files, directory)
+        log.info(f"[scan/batch] Received {len(documents)} documents")
+        extracted_texts = await asyncio.gather(
+            *(ingest.extract_text(path, filename) for filename, path in documents),
+            return_exceptions=True,
+        )
+    for index, text in enumerate(extracted_texts):
+        if isinstance(text, ValueError):
+            errors[index] = str(text)
+        elif isinstance(text, BaseException):
+            raise text
+        else:
+            texts[index] = text
+
+    fingerprint = scanner_fingerprint()
+    cached, pending = {}, []
+    for index, text in texts.items():
+        extracted = await scan_cache.aget("clauses", content_key(text, fingerprint))
+        if extracted is None:
+            pending.append(index)
+        else:
+            cached[index] = extracted
+    if pending and scan_pool.saturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Scanner is busy. Please retry shortly.",
+            headers={"Retry-After": str(SCAN_RETRY_AFTER)},
+        )
+
+    def line(event: dict) -> str:
+        return json.dumps(event) + "\n"
+
+    async def events():
+        meta = {
+            "documents": len(documents),
+            "errors": len(errors),
+            "queue_wait_ms": 0.0,
+            "inference_ms": 0.0,
+            "cache": {"clauses_hits": len(cached), "risk_hits": 0},
+        }
+        results: asyncio.Queue = asyncio.Queue()
+        risk_slots = asyncio.Semaphore(BATCH_RISK_CONCURRENCY)
+
+        async def assess(index: int, extracted: dict):
+            risk_key = content_key(texts[index], fingerprint, RISK_MODEL)
+            try:
+                risk_report = await scan_cache.aget("risk", risk_key)
+                if risk_report is None:
+                    async with risk_slots:
+                        risk_report = await assess_risk(extracted)
+                    await scan_cache.aput("risk", risk_key, risk_report)
+                else:
+                    meta["cache"]["risk_hits"] += 1
+                await results.put((index, extracted, risk_report, None))
+            except Exception as e:
+                log.error(f"[scan/batch] Risk assessment error for {documents[index][0]}: {e}")
+                await results.put((index, extracted, None, f"Risk assessment failed: {e}"))
+
+        async def scan_pending():
+            try:
+                if pending:
+                    batch = [texts[index] for index in pending]
+                    async for position, extracted in scan_pool.scan_batch_stream(batch, meta):
+                        index = pending[position]
+                        await scan_cache.aput("clauses", content_key(texts[index], fingerprint), extracted)
+                        tasks.append(asyncio.create_task(assess(index, extracted)))
+            except Exception as e:
+                log.exception(f"[scan/batch] CUAD extraction error: {e}")
+                await results.put((None, None, None, f"Clause extraction failed: {e}"))
+            await asyncio.gather(*tasks)
+            await results.put(None)
+
+        tasks = [asyncio.create_task(assess(index, extracted)) for index, extracted in cached.items()]
+        producer = asyncio.create_task(scan_pending())
+        try:
+            for index, detail in errors.items():
+                yield line({"event": "error", "index": index,
+                            "filename": documents[index][0], "detail": detail})
+            while (item := await results.get()) is not None:
+                index, extracted, risk_report, detail = item
+                event = {"index": index, "filename": documents[index][0] if index is not None else None}
+                if detail is None:
+                    yield line({"event": "document", **event, "clauses": extracted, "risk": risk_report})
+                else:
+                    yield line({"event": "error", **event, "detail": detail})
+            yield line({"event": "done", "meta": meta})
+        finally:
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/scan/cache/stats")
+def scan_cache_stats():
+    """Hit/miss counters per namespace plus current cache size."""
+    return scan_cache.stats()
+
+
+@app.delete("/scan/cache/{namespace}")
+def invalidate_scan_cache(namespace: str, key: str | None = None):
+    """Drop cached clauses or risk reports — one key, or the whole namespace."""
+    if namespace not in ("clauses", "risk"):
+        raise HTTPException(status_code=404, detail=f"Unknown cache namespace: {namespace}")
+    return {"removed": scan_cache.invalidate(namespace, key)}
+
+
+@app.get("/generate/cache/stats")
+def generation_cache_stats():
+    """Hit/miss/expiry counters and size of the generated-contract cache."""
+    return generation_cache.stats()
+
+
+@app.delete("/generate/cache")
+def invalidate_generation_cache():
+    """Drop every cached contract."""
+    return {"removed": generation_cache.invalidate("contracts")}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Request, stage-latency and OpenAI token metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/embeddings/cache/stats")
+def embedding_cache_stats():
+    """Hit rate of the query/chunk embedding cache."""
+    return embedding_cache.stats()
 
 
 if __name__ == "__main__":
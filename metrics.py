@@ -0,0 +1,210 @@
+"""
+metrics.py
+──────────
+Lightweight tracing spans and Prometheus metrics, without extra dependencies.
+
+``span(stage)`` (or the ``@timed(stage)`` decorator) times a block of work: the duration goes into the
+``stage_duration_seconds`` histogram and into the trace of the request being
+served (a per-request dict in a context variable, so spans from tasks and
+threads spawned for the request land in it too).  Work that ran elsewhere,
+e.g. in a scanner worker process, is recorded with ``observe(stage, seconds)``
+once its timings come back.  ``record_usage`` counts OpenAI tokens.
+
+``TimingMiddleware`` starts the trace, counts requests and their latency per
+route, and can send the trace as a ``Server-Timing`` header: always with
+TIMING_HEADER=1, otherwise when the request carries ``X-Timing: 1``.  The
+header holds the spans finished before the response started; streamed
+stages that run later only reach the histograms and the access log.
+``render()`` is the text served at /metrics.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+
+TIMING_HEADER = os.getenv("TIMING_HEADER", "0") == "1"
+
+# Seconds; stages range from sub-millisecond lookups to multi-minute generations
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_trace: contextvars.ContextVar[dict | None] = contextvars.ContextVar("trace", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._values: dict[tuple, list] = {}  # labels → [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = [counts, total + value, n + 1]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = _label_text((*self.labels, "le"), (*key, bound))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_bucket{_label_text((*self.labels, 'le'), (*key, '+Inf'))} {n}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {n}")
+        return lines
+
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.",
+                        ("method", "route", "status"))
+http_duration = Histogram("http_request_duration_seconds",
+                          "HTTP request latency, including the whole streamed body.", ("method", "route"))
+stage_duration = Histogram("stage_duration_seconds", "Latency of pipeline stages.", ("stage",))
+openai_requests = Counter("openai_requests_total", "OpenAI API calls.", ("call", "model"))
+openai_tokens = Counter("openai_tokens_total", "OpenAI tokens by kind (prompt, cached, completion).",
+                        ("call", "model", "kind"))
+METRICS = (http_requests, http_duration, stage_duration, openai_requests, openai_tokens)
+
+
+# ── tracing ───────────────────────────────────────────────────────────────────
+def observe(stage: str, seconds: float) -> None:
+    """Record a finished stage in the histogram and the current request's trace."""
+    stage_duration.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace[stage] = trace.get(stage, 0.0) + seconds * 1000
+
+
+class span:
+    """``with span("retrieve"): ...`` — time the block as stage ``retrieve``."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Work cancelled midway (e.g. extraction on a cache hit) is not a sample
+        if exc_type is None or not issubclass(exc_type, asyncio.CancelledError):
+            observe(self.stage, time.perf_counter() - self._started)
+        return False
+
+
+def timed(stage: str):
+    """Decorator form of ``span`` for plain and async functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_trace() -> dict:
+    """Milliseconds per stage recorded so far for the request being served."""
+    return {stage: round(ms, 1) for stage, ms in (_trace.get() or {}).items()}
+
+
+def record_usage(call: str, model: str, usage) -> None:
+    """Count one OpenAI call and the tokens in its ``usage`` (if the response had one)."""
+    openai_requests.inc(call=call, model=model)
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    openai_tokens.inc(prompt, call=call, model=model, kind="prompt")
+    openai_tokens.inc(cached, call=call, model=model, kind="cached")
+    openai_tokens.inc(getattr(usage, "completion_tokens", 0) or 0, call=call, model=model, kind="completion")
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+# ── middleware ────────────────────────────────────────────────────────────────
+def _server_timing(trace: dict) -> str:
+    return ", ".join(f"{stage.replace(' ', '_')};dur={ms:.1f}" for stage, ms in trace.items())
+
+
+class TimingMiddleware:
+    """ASGI middleware: per-request trace, request metrics, optional Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = _trace.set({})
+        headers = dict(scope.get("headers") or [])
+        send_header = TIMING_HEADER or headers.get(b"x-timing") == b"1"
+        status = 500
+        started = time.perf_counter()
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if send_header and current_trace():
+                    message = dict(message)
+                    message["headers"] = [*message.get("headers", []),
+                                          (b"server-timing", _server_timing(current_trace()).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_requests.inc(method=scope["method"], route=route, status=status)
+            http_duration.observe(time.perf_counter() - started, method=scope["method"], route=route)
+            _trace.reset(token)
@@ -0,0 +1,226 @@
+"""
+numpy_index.py
+──────────────
+Exact cosine search over an in-memory float32 matrix, as a drop-in for the
+small slice of the Chroma collection API that retrieval.py uses (count, get,
+upsert, delete, query, metadata).
+
+Unit-normalized chunk vectors are stored as ``vectors.npy`` and opened
+memory-mapped; IDs, documents, metadatas and the collection metadata live in
+``chunks.json``.  A query is one matmul against the matrix plus an
+argpartition for the top k.  Metadata ``where`` filters use the same subset of
+Chroma's syntax as the BM25 side of hybrid retrieval.
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+def matches_where(meta: dict, where: dict | None) -> bool:
+    """Evaluate a Chroma-style metadata filter (equality, $eq/$ne/$in/$nin, $and/$or)."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            ok = all(matches_where(meta, sub) for sub in cond)
+        elif key == "$or":
+            ok = any(matches_where(meta, sub) for sub in cond)
+        elif isinstance(cond, dict):
+            op, value = next(iter(cond.items()))
+            if op == "$eq":
+                ok = meta.get(key) == value
+            elif op == "$ne":
+                ok = meta.get(key) != value
+            elif op == "$in":
+                ok = meta.get(key) in value
+            elif op == "$nin":
+                ok = meta.get(key) not in value
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+        else:
+            ok = meta.get(key) == cond
+        if not ok:
+            return False
+    return True
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NumpyIndex:
+    """Chroma-collection-shaped exact search index persisted under ``path``."""
+
+    def __init__(self, path: str, embedding_function, metadata: dict | None = None):
+        self.path = path
+        self._embedding_function = embedding_function
+        self._vectors_path = os.path.join(path, "vectors.npy")
+        self._chunks_path = os.path.join(path, "chunks.json")
+        self.metadata = dict(metadata or {})  # replaced by the stored one, if any
+        self._version = None
+        self._load()
+
+    # ── storage ───────────────────────────────────────────────────────────────
+    def _load(self) -> None:
+        try:
+            stat = os.stat(self._chunks_path)
+            version = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            self._ids, self._documents, self._metadatas = [], [], []
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            self._position = {}
+            self._masks = {}
+            self._version = None
+            return
+        if version == self._version:
+            return
+        with open(self._chunks_path, "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        self.metadata = chunks["metadata"]
+        self._ids = chunks["ids"]
+        self._documents = chunks["documents"]
+        self._metadatas = chunks["metadatas"]
+        self._vectors = (
+            np.load(self._vectors_path, mmap_mode="r")
+            if self._ids else np.zeros((0, 0), dtype=np.float32)
+        )
+        self._position = {uid: i for i, uid in enumerate(self._ids)}
+        self._masks = {}  # where filter → row mask, rebuilt after every reload
+        self._version = version
+
+    def _save(self, vectors: np.ndarray) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._vectors_path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+        os.replace(self._vectors_path + ".tmp", self._vectors_path)
+        with open(self._chunks_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "metadata": self.metadata,
+                    "ids": self._ids,
+                    "documents": self._documents,
+                    "metadatas": self._metadatas,
+                },
+                f,
+            )
+        os.replace(self._chunks_path + ".tmp", self._chunks_path)
+        self._version = None
+        self._load()
+
+    def reset(self, metadata: dict | None = None) -> None:
+        """Drop every chunk (used when the embedding model changes)."""
+        self.metadata = dict(metadata or {})
+        self._ids, self._documents, self._metadatas = [], [], []
+        self._save(np.zeros((0, 0), dtype=np.float32))
+
+    def _mask(self, where: dict | None) -> np.ndarray | None:
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        if key not in self._masks:
+            self._masks[key] = np.array(
+                [matches_where(meta, where) for meta in self._metadatas], dtype=bool
+            )
+        return self._masks[key]
+
+    # ── collection API ────────────────────────────────────────────────────────
+    def count(self) -> int:
+        self._load()
+        return len(self._ids)
+
+    def upsert(self, ids, documents, metadatas, embeddings=None) -> None:
+        self._load()
+        if embeddings is None:
+            embeddings = self._embedding_function(documents)
+        rows = _normalize(np.asarray(embeddings, dtype=np.float32))
+        vectors = np.array(self._vectors, dtype=np.float32)  # writable copy of the mmap
+        if vectors.size == 0:
+            vectors = np.zeros((0, rows.shape[1]), dtype=np.float32)
+
+        appended = []
+        for uid, doc, meta, row in zip(ids, documents, metadatas, rows):
+            if uid in self._position:
+                i = self._position[uid]
+                vectors[i] = row
+                self._documents[i] = doc
+                self._metadatas[i] = meta
+            else:
+                self._position[uid] = len(self._ids)
+                self._ids.append(uid)
+                self._documents.append(doc)
+                self._metadatas.append(meta)
+                appended.append(row)
+        if appended:
+            vectors = np.vstack([vectors, np.stack(appended)])
+        self._save(vectors)
+
+    def delete(self, ids) -> None:
+        self._load()
+        drop = {self._position[uid] for uid in ids if uid in self._position}
+        if not drop:
+            return
+        keep = [i for i in range(len(self._ids)) if i not in drop]
+        vectors = np.array(self._vectors, dtype=np.float32)[keep]
+        self._ids = [self._ids[i] for i in keep]
+        self._documents = [self._documents[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._save(vectors)
+
+    def get(self, ids=None, where=None, limit=None, include=("documents", "metadatas")) -> dict:
+        self._load()
+        if ids is None:
+            rows = [i for i, meta in enumerate(self._metadatas) if matches_where(meta, where)]
+        else:
+            rows = [self._position[uid] for uid in ids if uid in self._position]
+        rows = rows[:limit] if limit is not None else rows
+        result = {"ids": [self._ids[i] for i in rows]}
+        if "documents" in include:
+            result["documents"] = [self._documents[i] for i in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas[i] for i in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [np.array(self._vectors[i]) for i in rows]
+        return result
+
+    def query(
+        self,
+        query_texts=None,
+        query_embeddings=None,
+        n_results: int = 10,
+        where: dict | None = None,
+        include=("documents", "metadatas", "distances"),
+    ) -> dict:
+        """Top ``n_results`` by cosine distance for each query, nearest first."""
+        self._load()
+        if query_embeddings is None:
+            query_embeddings = self._embedding_function(query_texts)
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+
+        result = {key: [] for key in ("ids", *include)}
+        if not self._ids:
+            for key in result:
+                result[key] = [[] for _ in queries]
+            return result
+
+        sims = queries @ self._vectors.T
+        mask = self._mask(where)
+        if mask is not None:
+            sims[:, ~mask] = -np.inf
+        available = len(self._ids) if mask is None else int(mask.sum())
+        k = min(n_results, available)
+
+        for row in sims:
+            top = np.argpartition(-row, k - 1)[:k] if k else np.array([], dtype=int)
+            top = top[np.argsort(-row[top], kind="stable")]
+            result["ids"].append([self._ids[i] for i in top])
+            if "documents" in include:
+                result["documents"].append([self._documents[i] for i in top])
+            if "metadatas" in include:
+                result["metadatas"].append([self._metadatas[i] for i in top])
+            if "distances" in include:
+                result["distances"].append([float(1.0 - row[i]) for i in top])
+        return result
@@ -0,0 +1,75 @@
+"""
+openai_client.py
+────────────────
+The one ``AsyncOpenAI`` client every module shares.
+
+It is built on first use over a single pooled ``httpx.AsyncClient``, so all
+LLM and embedding calls reuse the same keep-alive connections.  Blocking code
+that has no event loop (batch indexing, the sync retrieval API) uses
+``get_sync_client()``, built the same way over an ``httpx.Client``.  Pool
+size, keep-alive and timeouts are configurable:
+
+    OPENAI_MAX_CONNECTIONS     total connections in the pool        (100)
+    OPENAI_MAX_KEEPALIVE       idle connections kept open           (20)
+    OPENAI_KEEPALIVE_EXPIRY    seconds an idle connection lives     (30)
+    OPENAI_CONNECT_TIMEOUT     seconds to establish a connection    (5)
+    OPENAI_TIMEOUT             seconds for read/write/pool waits    (120)
+    OPENAI_MAX_RETRIES         SDK retries on transient errors      (2)
+"""
+
+import os
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+_client = None
+_sync_client = None
+
+
+def _http_settings() -> dict:
+    import httpx
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    }
+
+
+def get_client():
+    """The shared AsyncOpenAI client (created on first use)."""
+    global _client
+    if _client is None:
+        import httpx
+        from openai import AsyncOpenAI
+
+        http_client = httpx.AsyncClient(**_http_settings())
+        _client = AsyncOpenAI(http_client=http_client, max_retries=OPENAI_MAX_RETRIES)
+    return _client
+
+
+def get_sync_client():
+    """The shared blocking OpenAI client, for code without an event loop (created on first use)."""
+    global _sync_client
+    if _sync_client is None:
+        import httpx
+        from openai import OpenAI
+
+        http_client = httpx.Client(**_http_settings())
+        _sync_client = OpenAI(http_client=http_client, max_retries=OPENAI_MAX_RETRIES)
+    return _sync_client
+
+
+async def aclose() -> None:
+    """Close the pooled connections (on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,64 @@
+"""
+prefilter_recall.py
+───────────────────
+Measures what the lexical prefilter costs in recall against a full sweep.
+
+For every contract, each category found by the full sweep (top_k=0) counts
+as recalled at a given K when the prefiltered scan returns the same answer
+span.  Usage:
+
+    python prefilter_recall.py [contract.txt ...] [--k 2,4,8]
+"""
+
+import argparse
+import glob
+import time
+
+import contract_scanner
+
+
+def _timed_scan(text: str, top_k: int) -> tuple[dict, float]:
+    start = time.perf_counter()
+    result = contract_scanner.scan_contract(text, top_k=top_k)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[3])
+    parser.add_argument("files", nargs="*", default=sorted(glob.glob("data/*.txt")))
+    parser.add_argument("--k", default="2,4,8", help="comma-separated K values to try")
+    args = parser.parse_args()
+
+    texts = []
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+
+    contract_scanner._get_runner()  # keep model load out of the timings
+
+    baseline, full_seconds = [], 0.0
+    for text in texts:
+        result, seconds = _timed_scan(text, top_k=0)
+        baseline.append(result)
+        full_seconds += seconds
+
+    print(f"\n{'K':>4} {'recall':>8} {'found':>7} {'scan s':>8} {'speed-up':>9}")
+    print(f"{'full':>4} {'100%':>8} "
+          f"{sum(v['found'] for doc in baseline for v in doc.values()):>7} "
+          f"{full_seconds:>8.2f} {'1.0x':>9}")
+
+    for k in (int(k) for k in args.k.split(",")):
+        recalled, relevant, found, seconds = 0, 0, 0, 0.0
+        for text, full in zip(texts, baseline):
+            result, elapsed = _timed_scan(text, top_k=k)
+            seconds += elapsed
+            for category, ref in full.items():
+                found += result[category]["found"]
+                if ref["found"]:
+                    relevant += 1
+                    recalled += (result[category]["start"], result[category]["end"]) == (
+                        ref["start"], ref["end"]
+                    )
+        recall = recalled / relevant if relevant else 1.0
+        print(f"{k:>4} {recall:>8.0%} {found:>7} {seconds:>8.2f} "
+              f"{full_seconds / seconds if seconds else 0:>8.1f}x")
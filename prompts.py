@@ -1,37 +1,129 @@
-def build_prompt(user_input, template_chunks, law_chunks, entities=None, today=None):
-    template_text = "\n\n".join(template_chunks) if template_chunks else "No template provided. Please draft from scratch using standard legal practices."
-    law_text = "\n\n".join(law_chunks) if law_chunks else "No specific legal provisions retrieved."
+import os
+from functools import lru_cache
 
-    # Dynamically render every extracted field — no hardcoded field names
-    if entities:
-        lines = [f"  - {key.replace('_', ' ').title()}: {value}"
-                 for key, value in entities.items() if value]
-        extracted_block = "Extracted details from user description:\n" + "\n".join(lines) if lines else ""
-    else:
-        extracted_block = ""
+from metrics import timed
 
-    # Always include today's date
-    date_line = f"  - Today's Date: {today}" if today else ""
-    if date_line:
-        extracted_block = (extracted_block + "\n" + date_line) if extracted_block else f"Extracted details from user description:\n{date_line}"
+PROMPT_MODEL = "gpt-4o-mini"
+# Input tokens a generation prompt may use; law chunks are dropped (lowest
+# ranked first) to stay under it.  The template is never cut.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "12000"))
+# Consecutive chunks from the splitter share up to chunk_overlap characters
+CHUNK_MIN_OVERLAP = 20
+CHUNK_MAX_OVERLAP = 200
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text, model=PROMPT_MODEL):
+    """Token count of ``text`` for ``model``; a ~4 chars/token estimate if tiktoken is missing."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
 
-    prompt = f"""You are an expert legal assistant completing a contract template based on the user's description.
+@lru_cache(maxsize=64)
+def _static_tokens(text):
+    """``count_tokens`` for the fixed strings (instructions, headings) every prompt repeats."""
+    return count_tokens(text)
 
-User description:
-{user_input}
+def _overlap(left, right):
+    """Length of the longest suffix of ``left`` that starts ``right`` (0 if under the minimum)."""
+    for size in range(min(len(left), len(right), CHUNK_MAX_OVERLAP), CHUNK_MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def dedupe_chunks(chunks):
+    """
+    Drop repeated chunks and chunks contained in another, and stitch chunks
+    that overlap end-to-start (neighbours from the splitter) into one.
+    Keeps the rank order of the first occurrence.
+    """
+    merged = []
+    for chunk in chunks:
+        chunk = chunk.strip()
+        if not chunk or any(chunk in kept for kept in merged):
+            continue
+        merged = [kept for kept in merged if kept not in chunk]
+        for i, kept in enumerate(merged):
+            if _overlap(kept, chunk):
+                merged[i] = kept + chunk[_overlap(kept, chunk):]
+                break
+            if _overlap(chunk, kept):
+                merged[i] = chunk + kept[_overlap(chunk, kept):]
+                break
+        else:
+            merged.append(chunk)
+    return merged
+
+def _fit_chunks(chunks, budget, model=PROMPT_MODEL):
+    """The leading chunks whose tokens (joined by blank lines) fit ``budget``."""
+    kept, used = [], 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk + "\n\n", model)
+        if used + tokens > budget:
+            break
+        kept.append(chunk)
+        used += tokens
+    return kept
+
+def _details_block(entities, today=None):
+    # Dynamically render every extracted field — no hardcoded field names
+    lines = [f"  - {key.replace('_', ' ').title()}: {value}"
+             for key, value in (entities or {}).items() if value]
+    # Always include today's date
+    if today:
+        lines.append(f"  - Today's Date: {today}")
+    return "Extracted details from user description:\n" + "\n".join(lines) if lines else ""
 
-{extracted_block}
+def _assemble(sections, budget, law_chunks, law_heading, law_fallback, report, known_tokens=None):
+    """
+    Join ``sections`` (name → text, in prompt order, with a "law" slot),
+    filling the law slot with as many deduplicated law chunks as the budget
+    leaves room for.  ``known_tokens`` (name → count) skips tokenizing
+    sections whose size the caller already has.  Fills ``report`` with
+    per-section token counts; the total is their sum plus the separators.
+    """
+    known_tokens = known_tokens or {}
+    law = dedupe_chunks(law_chunks or [])
+    fixed = {name: text for name, text in sections.items() if name != "law"}
+    fixed_tokens = {
+        name: known_tokens[name] if name in known_tokens else count_tokens(text)
+        for name, text in fixed.items()
+    }
+    law_tokens_left = budget - sum(fixed_tokens.values()) - _static_tokens(law_heading)
+    kept = _fit_chunks(law, law_tokens_left)
+    law_text = law_heading + ("\n\n".join(kept) if kept else law_fallback)
 
-Template (from a trusted source):
-{template_text}
+    parts = {name: (law_text if name == "law" else text) for name, text in sections.items()}
+    prompt = "\n\n".join(text for text in parts.values() if text)
+    if report is not None:
+        law_tokens = count_tokens(law_text)
+        separators = sum(1 for text in parts.values() if text) - 1
+        report.update({f"{name}_tokens": tokens for name, tokens in fixed_tokens.items()})
+        report.update({
+            "law_tokens": law_tokens,
+            "law_chunks": {"received": len(law_chunks or []), "deduplicated": len(law), "kept": len(kept)},
+            "total_tokens": sum(fixed_tokens.values()) + law_tokens + separators * _static_tokens("\n\n"),
+            "budget": budget,
+        })
+    return prompt
 
-Relevant legal provisions (for reference):
-{law_text}
+CONTRACT_INSTRUCTIONS = """You are an expert legal assistant completing a contract template based on the user's description.
 
 Instructions:
 1. Reproduce the ENTIRE template in full — every section, clause, and subsection. Do NOT skip or omit any part.
 
-2. Replace EVERY placeholder using the Extracted details above. Match by meaning:
+2. Replace EVERY placeholder using the Extracted details given after the template. Match by meaning:
    - Party 1 name → replaces PARTY 1 headings, [Company name], [Disclosing Party], first-party signature fields
    - Party 2 name → replaces PARTY 2 headings, [Partner name], [Receiving Party], second-party signature fields
    - Duration      → replaces duration/term/end-date placeholders
@@ -52,7 +144,71 @@ Instructions:
 
 6. Where the Relevant Legal Provisions mention specific obligations, strengthen or add the clause. Mark added clauses with "(Added per applicable law)".
 
-7. Do NOT add, remove, or reorder sections beyond what is instructed above.
+7. Do NOT add, remove, or reorder sections beyond what is instructed above."""
+
+TEMPLATE_HEADING = "Template (from a trusted source):\n"
+
+@timed("build_prompt")
+def build_prompt(user_input, template_chunks, law_chunks, entities=None, today=None,
+                 budget=PROMPT_TOKEN_BUDGET, report=None, template_tokens=None):
+    """
+    Contract-completion prompt, ordered for provider-side prefix caching:
+    static instructions, then the template (identical for every request on
+    it), then the law provisions, then the per-request description and
+    details.  Law chunks are deduplicated and trimmed to ``budget`` tokens;
+    if ``report`` is a dict it receives the token count of each section.
+    ``template_tokens`` is the token count of the joined template chunks
+    when the caller has it (the registry's ``Template.tokens``), so the
+    template is not tokenized again.
+    """
+    template_text = "\n\n".join(template_chunks) if template_chunks else "No template provided. Please draft from scratch using standard legal practices."
+
+    known_tokens = {
+        "instructions": _static_tokens(CONTRACT_INSTRUCTIONS),
+        "footer": _static_tokens("Contract:"),
+    }
+    if template_chunks and template_tokens is not None:
+        known_tokens["template"] = _static_tokens(TEMPLATE_HEADING) + template_tokens
+
+    sections = {
+        "instructions": CONTRACT_INSTRUCTIONS,
+        "template": TEMPLATE_HEADING + template_text,
+        "law": None,
+        "request": "\n\n".join(part for part in (
+            f"User description:\n{user_input}", _details_block(entities, today)) if part),
+        "footer": "Contract:",
+    }
+    return _assemble(sections, budget, law_chunks, "Relevant legal provisions (for reference):\n",
+                     "No specific legal provisions retrieved.", report, known_tokens)
+
+CLAUSE_INSTRUCTIONS = """You are an expert legal assistant reviewing a contract that has already been completed from a template.
+
+Instructions:
+1. Write ONLY the clauses that must be added so the contract meets the Relevant Legal Provisions below. Do NOT repeat any part of the contract.
+
+2. Give each added clause a short title and mark it with "(Added per applicable law)", e.g. "Data Protection (Added per applicable law). ...".
+
+3. Separate clauses with a blank line. Use the extracted party names, never placeholders.
+
+4. If the contract already satisfies the provisions, reply with nothing."""
 
-Contract:"""
-    return prompt
\ No newline at end of file
+@timed("build_prompt")
+def build_clause_prompt(user_input, contract_text, law_chunks, entities=None,
+                        budget=PROMPT_TOKEN_BUDGET, report=None):
+    """
+    Prompt for the hybrid mode: the template is already filled in locally, so
+    the model only writes the clauses the legal provisions call for.
+    """
+    sections = {
+        "instructions": CLAUSE_INSTRUCTIONS,
+        "contract": f"Completed contract:\n{contract_text}",
+        "law": None,
+        "request": "\n\n".join(part for part in (
+            f"User description:\n{user_input}", _details_block(entities)) if part),
+        "footer": "Added clauses:",
+    }
+    known_tokens = {
+        "instructions": _static_tokens(CLAUSE_INSTRUCTIONS),
+        "footer": _static_tokens("Added clauses:"),
+    }
+    return _assemble(sections, budget, law_chunks, "Relevant legal provisions:\n", "(none)", report, known_tokens)
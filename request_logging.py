@@ -0,0 +1,203 @@
+"""
+request_logging.py
+──────────────────
+Structured, non-blocking logging for the API.
+
+Records are formatted as one JSON object per line.  Loggers only put records
+on an in-memory queue (``QueueHandler``); a ``QueueListener`` thread does the
+file and console I/O, so logging never blocks the event loop.  Every request
+gets an ID (the caller's ``X-Request-ID`` if it sent a sane one), stored in a
+context variable so all records logged while serving it carry it, and echoed
+back in the response headers.
+
+``RequestLogMiddleware`` writes one record per request: method, path, status,
+duration, body size and the request's stage timings (see metrics.py).
+Request bodies are never buffered for logging; a sampled fraction of
+textual requests has the first bytes of its body captured as it streams
+through.  Handlers that log user text pass it through ``capped_fields``,
+which applies the same byte cap.
+
+    LOG_LEVEL              root log level                               (INFO)
+    LOG_FILE               JSON log file                                (requests.log)
+    LOG_FILE_MAX_MB        size at which the file rotates               (50)
+    LOG_FILE_BACKUPS       rotated files kept                           (3)
+    LOG_BODY_SAMPLE_RATE   fraction of requests whose body is captured  (0.01)
+    LOG_BODY_MAX_BYTES     bytes of body captured per sampled request   (2048)
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+import uuid
+
+from metrics import current_trace
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "requests.log")
+LOG_FILE_MAX_MB = float(os.getenv("LOG_FILE_MAX_MB", "50"))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "3"))
+LOG_BODY_SAMPLE_RATE = float(os.getenv("LOG_BODY_SAMPLE_RATE", "0.01"))
+LOG_BODY_MAX_BYTES = int(os.getenv("LOG_BODY_MAX_BYTES", "2048"))
+
+REQUEST_ID_HEADER = "x-request-id"
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+_TEXT_TYPES = ("application/json", "text/", "application/x-www-form-urlencoded")
+
+request_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def capped_fields(name: str, text: str, max_bytes: int = LOG_BODY_MAX_BYTES) -> dict:
+    """``extra=`` fields for user text: the first ``max_bytes`` bytes, its size, and whether it was cut."""
+    encoded = text.encode("utf-8")
+    return {
+        name: encoded[:max_bytes].decode("utf-8", errors="ignore"),
+        f"{name}_bytes": len(encoded),
+        f"{name}_truncated": len(encoded) > max_bytes,
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any ``extra=`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:  # already formatted by the queue handler
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _RequestIdFilter(logging.Filter):
+    """Stamps the request ID onto records as they are logged, in the caller's context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback here, but keep the record's extra
+        # fields (the stock prepare flattens everything into ``msg``)
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Route the root logger through a queue to JSON file and console handlers.
+    Returns the started listener; stop it on shutdown to flush the queue.
+    """
+    formatter = JsonFormatter()
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=int(LOG_FILE_MAX_MB * 1024 * 1024),
+        backupCount=LOG_FILE_BACKUPS, encoding="utf-8",
+    )
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(_RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+    listener.start()
+    return listener
+
+
+class RequestLogMiddleware:
+    """ASGI middleware: request ID, one access record per request, sampled body capture."""
+
+    def __init__(self, app, logger: logging.Logger | None = None):
+        self.app = app
+        self.log = logger or logging.getLogger("access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")
+        request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        sample = (
+            LOG_BODY_SAMPLE_RATE > 0
+            and content_type.startswith(_TEXT_TYPES)
+            and random.random() < LOG_BODY_SAMPLE_RATE
+        )
+        body = bytearray()
+        body_bytes = 0
+        status = 500
+        started = time.perf_counter()
+
+        async def logged_receive():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_bytes += len(chunk)
+                if sample and len(body) < LOG_BODY_MAX_BYTES:
+                    body.extend(chunk[:LOG_BODY_MAX_BYTES - len(body)])
+            return message
+
+        async def logged_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = dict(message)
+                message["headers"] = [*message.get("headers", []),
+                                      (REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, logged_receive, logged_send)
+        finally:
+            fields = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "body_bytes": body_bytes,
+            }
+            stages = current_trace()
+            if stages:
+                fields["stages_ms"] = stages
+            if sample:
+                fields["body"] = body.decode("utf-8", errors="replace")
+                fields["body_truncated"] = body_bytes > len(body)
+            self.log.info(f"{scope['method']} {scope['path']} {status}", extra=fields)
+            request_id_var.reset(token)
@@ -0,0 +1,137 @@
+"""
+result_cache.py
+───────────────
+Content-addressed, two-tier result cache.
+
+Entries live in namespaces (e.g. "clauses" and "risk") so each kind of result
+can be invalidated on its own.  Lookups go to an in-memory LRU first and then
+to a SQLite file that is kept under a byte budget by evicting the least
+recently used rows (``sqlite_lru.SQLiteLRU``, shared with the embedding
+cache).  An optional TTL expires entries by age in both tiers.  Async callers
+use ``aget`` / ``aput``, which run the lookup in a worker thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from sqlite_lru import EXPIRED, SQLiteLRU
+
+SCAN_CACHE_PATH = os.getenv("SCAN_CACHE_PATH", "./cache/scan_cache.sqlite3")
+SCAN_CACHE_MAX_MB = float(os.getenv("SCAN_CACHE_MAX_MB", "256"))
+SCAN_CACHE_MEMORY_ITEMS = int(os.getenv("SCAN_CACHE_MEMORY_ITEMS", "128"))
+GENERATION_CACHE_PATH = os.getenv("GENERATION_CACHE_PATH", "./cache/generation_cache.sqlite3")
+GENERATION_CACHE_MAX_MB = float(os.getenv("GENERATION_CACHE_MAX_MB", "128"))
+GENERATION_CACHE_MEMORY_ITEMS = int(os.getenv("GENERATION_CACHE_MEMORY_ITEMS", "32"))
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", str(7 * 24 * 3600)))  # seconds, 0 = no expiry
+
+
+def content_key(text: str, *parts: str) -> str:
+    """
+    SHA-256 of the normalized text plus any identity ``parts`` (model name,
+    question-set hash, …).  Normalization folds Unicode forms and collapses
+    whitespace so re-extracted copies of the same document share a key.
+    """
+    normalized = " ".join(unicodedata.normalize("NFKC", text).split())
+    digest = hashlib.sha256(normalized.encode("utf-8"))
+    for part in parts:
+        digest.update(b"\0" + part.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """JSON-serializable results keyed by (namespace, key)."""
+
+    def __init__(self, path: str, max_bytes: int, memory_items: int = 128, ttl: float | None = None):
+        self.path = path
+        self.memory_items = memory_items
+        self.ttl = ttl or None
+        self.disk = SQLiteLRU(path, max_bytes, ttl=self.ttl)
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, int]] = {}
+
+    def _count(self, namespace: str, event: str) -> None:
+        counts = self._stats.setdefault(
+            namespace, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0}
+        )
+        counts[event] += 1
+
+    def _remember(self, namespace: str, key: str, value, created: float) -> None:
+        self._memory[(namespace, key)] = (value, created)
+        self._memory.move_to_end((namespace, key))
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, namespace: str, key: str):
+        """Return the cached value, or None on a miss."""
+        with self._lock:
+            if (namespace, key) in self._memory:
+                value, created = self._memory[(namespace, key)]
+                if not self.disk.expired(created):
+                    self._memory.move_to_end((namespace, key))
+                    self._count(namespace, "memory_hits")
+                    return value
+                del self._memory[(namespace, key)]
+
+            row = self.disk.get(namespace, key)
+            if row is None or row is EXPIRED:
+                self._count(namespace, "expired" if row is EXPIRED else "misses")
+                return None
+            payload, created = row
+            value = json.loads(payload)
+            self._remember(namespace, key, value, created)
+            self._count(namespace, "disk_hits")
+            return value
+
+    def put(self, namespace: str, key: str, value) -> None:
+        payload = json.dumps(value)
+        with self._lock:
+            self.disk.put_many(namespace, {key: payload})
+            self._remember(namespace, key, value, time.time())
+
+    async def aget(self, namespace: str, key: str):
+        """Async ``get``: the disk lookup and JSON decoding run in a worker thread."""
+        return await asyncio.to_thread(self.get, namespace, key)
+
+    async def aput(self, namespace: str, key: str, value) -> None:
+        """Async ``put``: JSON encoding and the disk write run in a worker thread."""
+        await asyncio.to_thread(self.put, namespace, key, value)
+
+    def invalidate(self, namespace: str, key: str | None = None) -> int:
+        """Drop one entry, or the whole namespace when ``key`` is None."""
+        with self._lock:
+            if key is None:
+                for cached in [k for k in self._memory if k[0] == namespace]:
+                    del self._memory[cached]
+            else:
+                self._memory.pop((namespace, key), None)
+            return self.disk.delete(namespace, key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ttl_s": self.ttl,
+                "namespaces": {ns: dict(counts) for ns, counts in self._stats.items()},
+                **self.disk.stats(),
+                "memory_entries": len(self._memory),
+            }
+
+
+scan_cache = ResultCache(
+    SCAN_CACHE_PATH,
+    max_bytes=int(SCAN_CACHE_MAX_MB * 1024 * 1024),
+    memory_items=SCAN_CACHE_MEMORY_ITEMS,
+)
+
+generation_cache = ResultCache(
+    GENERATION_CACHE_PATH,
+    max_bytes=int(GENERATION_CACHE_MAX_MB * 1024 * 1024),
+    memory_items=GENERATION_CACHE_MEMORY_ITEMS,
+    ttl=GENERATION_CACHE_TTL,
+)
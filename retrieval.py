@@ -1,42 +1,292 @@
 import os
 import json
-import chromadb
-from chromadb.utils import embedding_functions
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from openai import OpenAI
-
-# 1. Setup Embedding Function
-# Ensure you have 'pip install openai' and 'OPENAI_API_KEY' set in your environment
-openai_client = OpenAI()
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    model_name="text-embedding-ada-002"
-)
-
-# 2. Initialize ChromaDB
-client = chromadb.PersistentClient(path="./chroma_db")
-collection = client.get_or_create_collection(
-    name="legal_docs",
-    embedding_function=openai_ef,
-    metadata={"hnsw:space": "cosine"}
-)
-
-# 3. Configure Text Splitter
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=800,
-    chunk_overlap=100,
-    separators=["\n\n", "\n", ".", " ", ""]
-)
-
-def index_documents(folder_path="data"):
-    """Reads .txt files, chunks them, and upserts them into ChromaDB."""
+import asyncio
+import hashlib
+from collections import Counter
+from bm25 import BM25, tokenize
+from numpy_index import matches_where
+from metrics import record_usage, span, timed
+from openai_client import get_client, get_sync_client
+from result_cache import generation_cache
+
+# Heavy clients (ChromaDB, the embedding function, the text splitter) are built
+# on first use, so importing this module stays cheap.
+CHROMA_PATH = "./chroma_db"
+NUMPY_INDEX_PATH = "./numpy_index"
+# Vector store: "chroma" (PersistentClient + HNSW) or "numpy" (exact search
+# over a memory-mapped matrix; plenty for a few hundred chunks)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+if VECTOR_BACKEND not in ("chroma", "numpy"):
+    raise ValueError(f"VECTOR_BACKEND must be 'chroma' or 'numpy', got {VECTOR_BACKEND!r}")
+INDEX_DIR = NUMPY_INDEX_PATH if VECTOR_BACKEND == "numpy" else CHROMA_PATH
+# Content hashes of indexed files and chunks, kept inside the vector store's
+# directory so deleting it also forgets what was indexed
+MANIFEST_PATH = os.path.join(INDEX_DIR, "index_manifest.json")
+# Per-chunk term counts for BM25, maintained by index_documents next to the vectors
+LEXICAL_INDEX_PATH = os.path.join(INDEX_DIR, "lexical_index.json")
+# "vector" (cosine only) or "hybrid" (BM25 + vector, reciprocal rank fusion)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per ranking, before fusion
+RRF_K = 60
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+COLLECTION_NAME = "legal_docs"
+
+# Embedding backend: "openai" (remote API), or a local CPU model —
+# "sentence-transformers" (LOCAL_EMBEDDING_MODEL) or "onnx" (Chroma's bundled
+# all-MiniLM-L6-v2 ONNX build, no torch needed).  The collection records which
+# model built it and is rebuilt when this changes.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_MODELS = {
+    "openai": "text-embedding-ada-002",
+    "sentence-transformers": LOCAL_EMBEDDING_MODEL,
+    "onnx": "all-MiniLM-L6-v2",
+}
+if EMBEDDING_BACKEND not in EMBEDDING_MODELS:
+    raise ValueError(f"EMBEDDING_BACKEND must be one of {sorted(EMBEDDING_MODELS)}, got {EMBEDDING_BACKEND!r}")
+EMBEDDING_MODEL = EMBEDDING_MODELS[EMBEDDING_BACKEND]
+EMBEDDING_MODEL_ID = f"{EMBEDDING_BACKEND}:{EMBEDDING_MODEL}"
+# Collections built before the model was recorded used the OpenAI default
+LEGACY_EMBEDDING_MODEL_ID = "openai:text-embedding-ada-002"
+
+_collection = None
+_embedding_function = None
+_text_splitter = None
+_lexical = None  # (mtime, chunk IDs, metadatas, BM25) for LEXICAL_INDEX_PATH
+
+async def _aembed_openai(texts):
+    """Embed on the shared AsyncOpenAI client (the async path of the OpenAI backend)."""
+    response = await get_client().embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    record_usage("embedding", EMBEDDING_MODEL, response.usage)
+    return [item.embedding for item in response.data]
+
+def _embed_openai(texts):
+    """Embed on the blocking OpenAI client (indexing and the sync retrieval API)."""
+    response = get_sync_client().embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    record_usage("embedding", EMBEDDING_MODEL, response.usage)
+    return [item.embedding for item in response.data]
+
+def _chroma_embedding_function():
+    """EMBEDDING_BACKEND as a Chroma embedding function (the collection persists its config)."""
+    from chromadb.utils import embedding_functions
+
+    if EMBEDDING_BACKEND == "sentence-transformers":
+        # Batched CPU encoding; the model loads once per process
+        return embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=EMBEDDING_MODEL,
+            device="cpu",
+            normalize_embeddings=True
+        )
+    if EMBEDDING_BACKEND == "onnx":
+        return embedding_functions.ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+    # Ensure you have 'pip install openai' and 'OPENAI_API_KEY' set in your environment
+    return embedding_functions.OpenAIEmbeddingFunction(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        model_name=EMBEDDING_MODEL
+    )
+
+def _plain_embedding_function():
+    """
+    EMBEDDING_BACKEND as a plain ``texts -> vectors`` callable, for the numpy
+    backend, which runs without chromadb installed.  Only the "onnx" backend
+    still needs chromadb: the MiniLM ONNX build ships with it.
+    """
+    if EMBEDDING_BACKEND == "sentence-transformers":
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+        return lambda input: list(model.encode(list(input), normalize_embeddings=True))
+    if EMBEDDING_BACKEND == "onnx":
+        from chromadb.utils import embedding_functions
+
+        return embedding_functions.ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+    return _embed_openai
+
+def get_embedding_function():
+    """
+    The embedding function shared by the collection and batch indexing,
+    behind the (model, text hash) embedding cache.  Async callers use its
+    ``acall``, which for the OpenAI backend goes through the shared client.
+    """
+    global _embedding_function
+    if _embedding_function is None:
+        from embedding_cache import CachedEmbeddingFunction, embedding_cache
+
+        ef = _chroma_embedding_function() if VECTOR_BACKEND == "chroma" else _plain_embedding_function()
+        _embedding_function = CachedEmbeddingFunction(
+            ef, EMBEDDING_MODEL_ID, embedding_cache,
+            async_inner=_aembed_openai if EMBEDDING_BACKEND == "openai" else None
+        )
+    return _embedding_function
+
+def _get_numpy_collection():
+    from numpy_index import NumpyIndex
+
+    collection = NumpyIndex(
+        NUMPY_INDEX_PATH,
+        embedding_function=get_embedding_function(),
+        metadata={"embedding_model": EMBEDDING_MODEL_ID}
+    )
+    built_with = collection.metadata.get("embedding_model", LEGACY_EMBEDDING_MODEL_ID)
+    if built_with != EMBEDDING_MODEL_ID:
+        print(f"Index was built with {built_with}, now using {EMBEDDING_MODEL_ID}: rebuilding.")
+        collection.reset({"embedding_model": EMBEDDING_MODEL_ID})
+        return collection, True
+    return collection, False
+
+def get_collection():
+    """
+    Open (or create) the vector collection (VECTOR_BACKEND) on first use.
+
+    If the collection was built with a different embedding model than the
+    configured one, it is dropped and the corpus re-indexed from data/.
+    """
+    global _collection
+    if _collection is None and VECTOR_BACKEND == "numpy":
+        _collection, rebuild = _get_numpy_collection()
+        if rebuild:
+            index_documents(force=True)
+    elif _collection is None:
+        import chromadb
+
+        client = chromadb.PersistentClient(path=CHROMA_PATH)
+        metadata = {"hnsw:space": "cosine", "embedding_model": EMBEDDING_MODEL_ID}
+        try:
+            collection = client.get_or_create_collection(
+                name=COLLECTION_NAME,
+                embedding_function=get_embedding_function(),
+                metadata=metadata
+            )
+            built_with = (collection.metadata or {}).get("embedding_model", LEGACY_EMBEDDING_MODEL_ID)
+        except ValueError as e:
+            # Newer Chroma versions refuse a conflicting persisted embedding function
+            collection, built_with = None, f"an incompatible embedding function ({e})"
+
+        if built_with == EMBEDDING_MODEL_ID:
+            _collection = collection
+        else:
+            print(f"Collection was built with {built_with}, now using {EMBEDDING_MODEL_ID}: rebuilding.")
+            client.delete_collection(name=COLLECTION_NAME)
+            _collection = client.create_collection(
+                name=COLLECTION_NAME,
+                embedding_function=get_embedding_function(),
+                metadata=metadata
+            )
+            index_documents(force=True)
+    return _collection
+
+def get_text_splitter():
+    """Configure the text splitter on first use."""
+    global _text_splitter
+    if _text_splitter is None:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        _text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=800,
+            chunk_overlap=100,
+            separators=["\n\n", "\n", ".", " ", ""]
+        )
+    return _text_splitter
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+
+def _save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def classify_source(filename):
+    """Metadata tagging: 'law' keyword takes priority over template keywords."""
+    file_lower = filename.lower()
+    law_keys      = ["law", "regulation", "statute", "act", "code", "rule"]
+    template_keys = ["nda", "contractor", "saas", "partnership", "services", "agreement"]
+    if any(k in file_lower for k in law_keys):
+        return "law"
+    elif any(k in file_lower for k in template_keys):
+        return "template"
+    return "law"  # default to law if unclear
+
+def _stored_embeddings(ids):
+    """Fetch already-computed vectors from the collection, keyed by chunk ID."""
+    stored = {}
+    for start in range(0, len(ids), EMBED_BATCH_SIZE):
+        got = get_collection().get(ids=ids[start:start + EMBED_BATCH_SIZE], include=["embeddings"])
+        for uid, embedding in zip(got["ids"], got["embeddings"]):
+            stored[uid] = [float(x) for x in embedding]
+    return stored
+
+def _load_lexical_index():
+    try:
+        with open(LEXICAL_INDEX_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"chunks": {}}
+
+def _save_lexical_index(index):
+    os.makedirs(os.path.dirname(LEXICAL_INDEX_PATH), exist_ok=True)
+    tmp_path = LEXICAL_INDEX_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp_path, LEXICAL_INDEX_PATH)
+
+def _lexical_entry(chunk, meta):
+    return {"tf": dict(Counter(tokenize(chunk))), "meta": meta}
+
+def get_lexical_index():
+    """(chunk IDs, metadatas, BM25) over all indexed chunks; reloaded when the file changes."""
+    global _lexical
+    try:
+        mtime = os.path.getmtime(LEXICAL_INDEX_PATH)
+    except FileNotFoundError:
+        mtime = None
+    if _lexical is None or _lexical[0] != mtime:
+        chunks = _load_lexical_index()["chunks"]
+        ids = sorted(chunks)
+        bm25 = BM25([chunks[uid]["tf"] for uid in ids])
+        _lexical = (mtime, ids, [chunks[uid]["meta"] for uid in ids], bm25)
+    return _lexical[1:]
+
+def index_documents(folder_path="data", force=False):
+    """
+    Incrementally syncs .txt files into ChromaDB.
+
+    A manifest records a SHA-256 per file and per chunk.  Unchanged files are
+    skipped; a chunk whose text was embedded before (at any ID) reuses the
+    stored vector; only new chunk texts are embedded, batched across files;
+    chunks and files that disappeared are deleted.  The BM25 lexical index
+    is updated alongside.  ``force`` ignores the manifest and re-embeds
+    everything.
+
+    Returns counts of embedded, reused, removed and unchanged items.  Any
+    change to the corpus invalidates the cached generated contracts.
+    """
     if not os.path.exists(folder_path):
         print(f"Directory '{folder_path}' not found.")
         return
 
-    doc_count = 0
+    collection = get_collection()
+    manifest = {"files": {}} if force else _load_manifest()
+    if manifest["files"] and collection.count() == 0:
+        manifest = {"files": {}}  # collection was wiped behind the manifest's back
+    old_files = manifest["files"]
+    new_files = {}
+    lexical = {} if force else _load_lexical_index()["chunks"]
+
+    pending = []    # (id, chunk text, metadata, chunk hash) to upsert
+    stale_ids = []
+    unchanged_files = 0
     exclude_files = {"mutual-nda.txt"}
-    for filename in os.listdir(folder_path):
+    for filename in sorted(os.listdir(folder_path)):
         if not filename.endswith(".txt"):
             continue
         if filename.lower() in exclude_files:
@@ -44,59 +294,211 @@ def index_documents(folder_path="data"):
             continue
 
         filepath = os.path.join(folder_path, filename)
-        with open(filepath, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        # Metadata tagging: 'law' keyword takes priority over template keywords
-        file_lower = filename.lower()
-        law_keys      = ["law", "regulation", "statute", "act", "code", "rule"]
-        template_keys = ["nda", "contractor", "saas", "partnership", "services", "agreement"]
-        if any(k in file_lower for k in law_keys):
-            source = "law"
-        elif any(k in file_lower for k in template_keys):
-            source = "template"
-        else:
-            source = "law"  # default to law if unclear
+        with open(filepath, "rb") as f:
+            raw = f.read()
+        file_hash = hashlib.sha256(raw).hexdigest()
 
-        # Split text into manageable chunks
-        chunks = text_splitter.split_text(text)
+        previous = old_files.get(filename)
+        if previous and previous["sha256"] == file_hash:
+            new_files[filename] = previous
+            unchanged_files += 1
+            if any(uid not in lexical for uid in previous["chunks"]):
+                # Indexed before the lexical index existed: fill it, no embedding needed
+                source = previous["source"]
+                for i, chunk in enumerate(get_text_splitter().split_text(raw.decode("utf-8"))):
+                    meta = {"source": source, "file": filename, "chunk_index": i}
+                    lexical[f"{source}_{filename}_{i}"] = _lexical_entry(chunk, meta)
+            continue
 
-        # Prepare data for batch insertion
-        documents = []
-        metadatas = []
-        ids = []
+        source = classify_source(filename)
+        chunks = get_text_splitter().split_text(raw.decode("utf-8"))
 
+        chunk_hashes = {}
+        changed = 0
         for i, chunk in enumerate(chunks):
             uid = f"{source}_{filename}_{i}"
-            documents.append(chunk)
-            metadatas.append({"source": source, "file": filename, "chunk_index": i})
-            ids.append(uid)
+            chunk_hash = _sha256(chunk)
+            chunk_hashes[uid] = chunk_hash
+            if previous is None or previous["chunks"].get(uid) != chunk_hash:
+                pending.append((uid, chunk, {"source": source, "file": filename, "chunk_index": i}, chunk_hash))
+                changed += 1
+        if previous:
+            stale_ids.extend(uid for uid in previous["chunks"] if uid not in chunk_hashes)
+
+        new_files[filename] = {"sha256": file_hash, "source": source, "chunks": chunk_hashes}
+        print(f"Indexed {filename}: {changed}/{len(chunks)} chunks changed.")
 
-        # Use upsert to avoid "ID already exists" errors on re-runs
+    for filename, previous in old_files.items():
+        if filename not in new_files:
+            stale_ids.extend(previous["chunks"])
+            print(f"Removed {filename}: {len(previous['chunks'])} chunks.")
+
+    # Vectors for chunk texts that are already in the collection (moved chunks)
+    known = {}
+    for entry in old_files.values():
+        for uid, chunk_hash in entry["chunks"].items():
+            known.setdefault(chunk_hash, uid)
+    reusable = {known[h] for _, _, _, h in pending if h in known}
+    stored = _stored_embeddings(sorted(reusable)) if reusable else {}
+
+    embedded = reused = 0
+    embed = get_embedding_function()
+    for start in range(0, len(pending), EMBED_BATCH_SIZE):
+        batch = pending[start:start + EMBED_BATCH_SIZE]
+        to_embed = [chunk for _, chunk, _, h in batch if known.get(h) not in stored]
+        fresh = iter(embed(to_embed)) if to_embed else iter(())
+        embeddings = []
+        for _, _, _, h in batch:
+            if known.get(h) in stored:
+                embeddings.append(stored[known[h]])
+                reused += 1
+            else:
+                embeddings.append([float(x) for x in next(fresh)])
+                embedded += 1
         collection.upsert(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
+            ids=[uid for uid, _, _, _ in batch],
+            documents=[chunk for _, chunk, _, _ in batch],
+            metadatas=[meta for _, _, meta, _ in batch],
+            embeddings=embeddings,
         )
-        doc_count += len(chunks)
-        print(f"Indexed {filename}: {len(chunks)} chunks.")
 
-    print(f"--- Finished. Total chunks in session: {doc_count} ---")
+    for start in range(0, len(stale_ids), EMBED_BATCH_SIZE):
+        collection.delete(ids=stale_ids[start:start + EMBED_BATCH_SIZE])
+
+    for uid, chunk, meta, _ in pending:
+        lexical[uid] = _lexical_entry(chunk, meta)
+    for uid in stale_ids:
+        lexical.pop(uid, None)
+    _save_lexical_index({"chunks": lexical})
+    _save_manifest({"files": new_files})
+    summary = {
+        "embedded": embedded,
+        "reused": reused,
+        "removed": len(stale_ids),
+        "unchanged_files": unchanged_files,
+    }
+    print(f"--- Finished. {embedded} chunks embedded, {reused} reused, "
+          f"{len(stale_ids)} removed, {unchanged_files} files unchanged ---")
+    if embedded or reused or stale_ids:
+        dropped = generation_cache.invalidate("contracts")
+        print(f"Corpus changed: dropped {dropped} cached contracts.")
+    return summary
+
+def _lexical_search(query, k, where=None):
+    """Chunk IDs of the ``k`` best BM25 matches for ``query``, best first."""
+    ids, metas, bm25 = get_lexical_index()
+    allowed = (lambda doc: matches_where(metas[doc], where)) if where else None
+    return [ids[doc] for doc, _ in bm25.top_k(tokenize(query), k, allowed)]
+
+def _fuse(*rankings):
+    """Reciprocal rank fusion: sum of 1 / (RRF_K + rank) over the rankings."""
+    fused = Counter()
+    for ranking in rankings:
+        for rank, uid in enumerate(ranking, 1):
+            fused[uid] += 1.0 / (RRF_K + rank)
+    return sorted(fused, key=lambda uid: (-fused[uid], uid))
+
+def retrieve_many(queries, n_results=3, where=None, mode=None):
+    """
+    Retrieves for several queries at once: one batched embedding call and one
+    collection query for all of them (plus, in hybrid mode, one fetch for
+    the BM25-only hits of every query).
+
+    Returns (results, chunks).  ``results[i]`` is the ranked list of
+    (chunk ID, distance) for ``queries[i]``; ``chunks`` maps each distinct
+    chunk ID to (document, metadata), so a chunk several queries share is
+    held once.  ``mode`` is "vector" or "hybrid" (defaults to RETRIEVAL_MODE).
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode not in ("vector", "hybrid"):
+        raise ValueError(f"Unknown retrieval mode: {mode!r}")
+    queries = list(queries)
+    if not queries:
+        return [], {}
+    embeddings = get_embedding_function()(queries)
+    return _search_many(queries, embeddings, n_results, where, mode)
+
+async def aretrieve_many(queries, n_results=3, where=None, mode=None):
+    """retrieve_many for async callers: embeds without blocking the event loop."""
+    mode = mode or RETRIEVAL_MODE
+    if mode not in ("vector", "hybrid"):
+        raise ValueError(f"Unknown retrieval mode: {mode!r}")
+    queries = list(queries)
+    if not queries:
+        return [], {}
+    with span("retrieve.embed"):
+        embeddings = await get_embedding_function().acall(queries)
+    with span("retrieve.search"):
+        return await asyncio.to_thread(_search_many, queries, embeddings, n_results, where, mode)
 
-def retrieve(query, n_results=3, where=None):
-    """Queries the collection and returns documents, metadatas, distances."""
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results,
+def _search_many(queries, embeddings, n_results, where, mode):
+    import numpy as np
+
+    collection = get_collection()
+    depth = max(n_results, HYBRID_CANDIDATES) if mode == "hybrid" else n_results
+    vector = collection.query(
+        query_embeddings=embeddings,
+        n_results=depth,
         where=where,
         include=["documents", "metadatas", "distances"]
     )
-    
+
+    chunks = {}
+    distances = []  # per query: chunk ID → cosine distance
+    rankings = []
+    for i, query in enumerate(queries):
+        ids = vector["ids"][i]
+        for uid, doc, meta in zip(ids, vector["documents"][i], vector["metadatas"][i]):
+            chunks.setdefault(uid, (doc, meta))
+        distances.append(dict(zip(ids, vector["distances"][i])))
+        if mode == "hybrid":
+            rankings.append(_fuse(ids, _lexical_search(query, depth, where))[:n_results])
+        else:
+            rankings.append(ids)
+
+    # BM25-only hits: fetch text and vectors so their cosine distance is exact too
+    missing = sorted({uid for i, top in enumerate(rankings) for uid in top if uid not in distances[i]})
+    if missing:
+        got = collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+        stored = {}
+        for uid, doc, meta, emb in zip(got["ids"], got["documents"], got["metadatas"], got["embeddings"]):
+            chunks.setdefault(uid, (doc, meta))
+            e = np.asarray(emb, dtype=np.float32)
+            stored[uid] = e / (np.linalg.norm(e) or 1.0)
+        for i, top in enumerate(rankings):
+            q = np.asarray(embeddings[i], dtype=np.float32)
+            q = q / (np.linalg.norm(q) or 1.0)
+            for uid in top:
+                if uid not in distances[i] and uid in stored:
+                    distances[i][uid] = 1.0 - float(q @ stored[uid])
+
+    results = [
+        [(uid, distances[i][uid]) for uid in top if uid in distances[i]]
+        for i, top in enumerate(rankings)
+    ]
+    return results, chunks
+
+def retrieve(query, n_results=3, where=None, mode=None):
+    """
+    Queries the collection and returns documents, metadatas, distances.
+
+    ``mode`` is "vector" or "hybrid" (defaults to RETRIEVAL_MODE); hybrid
+    fuses the cosine ranking with a BM25 ranking over the same chunks.
+    """
+    results, chunks = retrieve_many([query], n_results=n_results, where=where, mode=mode)
+    return _unpack(results[0], chunks)
+
+async def aretrieve(query, n_results=3, where=None, mode=None):
+    """retrieve for async callers."""
+    results, chunks = await aretrieve_many([query], n_results=n_results, where=where, mode=mode)
+    return _unpack(results[0], chunks)
+
+def _unpack(hits, chunks):
     # Extracting results for cleaner access
-    docs = results.get('documents', [[]])[0]
-    metas = results.get('metadatas', [[]])[0]
-    distances = results.get('distances', [[]])[0]
-    
+    docs = [chunks[uid][0] for uid, _ in hits]
+    metas = [chunks[uid][1] for uid, _ in hits]
+    distances = [dist for _, dist in hits]
+
     return docs, metas, distances
 
 def guess_filter(query):
@@ -105,7 +507,7 @@ def guess_filter(query):
         return {"source": "template"}
     return None
 
-def classify_intent_llm(query, model="gpt-4o-mini"):
+async def classify_intent_llm(query, model="gpt-4o-mini"):
     intents = ["nda_template", "contractor_termination", "general_legal_question", "other"]
     
     # OpenAI Tool Definition
@@ -128,7 +530,7 @@ def classify_intent_llm(query, model="gpt-4o-mini"):
     }]
 
     # Correct OpenAI SDK Call
-    response = openai_client.chat.completions.create(
+    response = await get_client().chat.completions.create(
         model=model,
         messages=[
             {"role": "system", "content": "Classify the user query into a single intent."},
@@ -138,11 +540,22 @@ def classify_intent_llm(query, model="gpt-4o-mini"):
         tool_choice={"type": "function", "function": {"name": "classify_intent"}}
     )
 
+    record_usage("intent", model, response.usage)
+
     # Parsing the response
     tool_call = response.choices[0].message.tool_calls[0]
     data = json.loads(tool_call.function.arguments)
     return data["intent"], float(data["confidence"])
 
+@timed("classify_intent")
+async def classify_intent(query):
+    """
+    Same contract as classify_intent_llm, answered by the local centroid
+    router (intent_router.py); the LLM is only called below its threshold.
+    """
+    from intent_router import intent_router
+    return await intent_router.classify(query)
+
 def route_filter_from_intent(intent):
     if intent == "nda_template":
         return {"source": "template"}
@@ -158,19 +571,34 @@ if __name__ == "__main__":
         "I need a nondisclosure agreement for a business partnership"
     ]
     use_intent_classifier = True
-    for q in queries:
+    if use_intent_classifier:
+        async def classify_all():
+            return [await classify_intent(q) for q in queries]
+        classified = asyncio.run(classify_all())
+
+    filters = {}
+    for n, q in enumerate(queries):
         if use_intent_classifier:
-            intent, conf = classify_intent_llm(q)
+            intent, conf = classified[n]
             where = route_filter_from_intent(intent)
-            print(f"\nQuery: {q} (intent={intent}, confidence={conf:.2f}, filter={where})")
+            print(f"Query: {q} (intent={intent}, confidence={conf:.2f}, filter={where})")
         else:
             where = guess_filter(q)
-            print(f"\nQuery: {q} (filter={where})")
+            print(f"Query: {q} (filter={where})")
+        filters.setdefault(json.dumps(where, sort_keys=True), []).append(q)
+    if use_intent_classifier:
+        from intent_router import intent_router
+        print(f"Intent router: {intent_router.stats()}")
 
-        docs, metas, dists = retrieve(q, n_results=2, where=where)
-        for i, (doc, meta, dist) in enumerate(zip(docs, metas, dists), 1):
-            source = meta.get("source", "unknown") if isinstance(meta, dict) else "unknown"
-            file = meta.get("file", "unknown") if isinstance(meta, dict) else "unknown"
+    # One batched retrieval per distinct filter
+    for key, group in filters.items():
+        results, chunks = retrieve_many(group, n_results=2, where=json.loads(key))
+        for q, hits in zip(group, results):
+            print(f"\nQuery: {q}")
+            for i, (uid, dist) in enumerate(hits, 1):
+                doc, meta = chunks[uid]
+                source = meta.get("source", "unknown") if isinstance(meta, dict) else "unknown"
+                file = meta.get("file", "unknown") if isinstance(meta, dict) else "unknown"
 
-            print(f"Result {i} (distance={dist:.4f}) ({source} - {file}):")
-            print(f"{doc[:200]}...")
+                print(f"Result {i} (distance={dist:.4f}) ({source} - {file}):")
+                print(f"{doc[:200]}...")
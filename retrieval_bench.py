@@ -0,0 +1,102 @@
+"""
+retrieval_bench.py
+──────────────────
+Benchmarks the vector store backends (Chroma vs the NumPy exact index).
+
+Each backend runs in a fresh process: time to open the index, per-query
+latency with and without a metadata filter (query embeddings are computed
+up front, so only the vector search is timed), peak RSS, and top-k overlap
+with the first backend.  Missing indexes are built from data/ first.  Usage:
+
+    python retrieval_bench.py [--backends chroma,numpy] [--k 6] [--repeat 200]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import statistics
+import time
+
+QUERIES = [
+    "I need a nondisclosure agreement for a business partnership",
+    "non-solicitation of employees after termination",
+    "DPDP Act obligations for personal data processing",
+    "indemnify the client against third party claims",
+    "professional services agreement with monthly fees",
+    "governing law and jurisdiction for disputes",
+]
+
+
+def _run_backend(backend: str, k: int, repeat: int, conn) -> None:
+    os.environ["VECTOR_BACKEND"] = backend
+    import retrieval
+
+    start = time.perf_counter()
+    collection = retrieval.get_collection()
+    chunks = collection.count()
+    open_s = time.perf_counter() - start
+    if chunks == 0:
+        retrieval.index_documents("data")
+        chunks = collection.count()
+
+    embeddings = retrieval.get_embedding_function()(QUERIES)
+    timings, top_ids = {}, {}
+    for label, where in (("all", None), ("template", {"source": "template"})):
+        samples = []
+        for _ in range(repeat):
+            for embedding in embeddings:
+                t = time.perf_counter()
+                result = collection.query(
+                    query_embeddings=[embedding], n_results=k, where=where,
+                    include=["documents", "metadatas", "distances"],
+                )
+                samples.append((time.perf_counter() - t) * 1000)
+        samples.sort()
+        timings[label] = (statistics.median(samples), samples[int(len(samples) * 0.95)])
+        top_ids[label] = [
+            collection.query(query_embeddings=[e], n_results=k, where=where)["ids"][0]
+            for e in embeddings
+        ]
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    conn.send({"open_s": open_s, "chunks": chunks, "timings": timings,
+               "top_ids": top_ids, "rss_mb": peak_rss_mb})
+    conn.close()
+
+
+def _measure(backend: str, k: int, repeat: int) -> dict:
+    ctx = mp.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_run_backend, args=(backend, k, repeat, child))
+    proc.start()
+    report = parent.recv()
+    proc.join()
+    return report
+
+
+def _overlap(reference: list[list[str]], candidate: list[list[str]]) -> float:
+    shared = sum(len(set(r) & set(c)) for r, c in zip(reference, candidate))
+    total = sum(len(r) for r in reference)
+    return shared / total if total else 1.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[3])
+    parser.add_argument("--backends", default="chroma,numpy")
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    backends = args.backends.split(",")
+    reports = {backend: _measure(backend, args.k, args.repeat) for backend in backends}
+    reference = reports[backends[0]]["top_ids"]
+
+    print(f"\n{'backend':<8} {'chunks':>7} {'open s':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'p50 ms (where)':>15} {'peak RSS MB':>12} {'top-k overlap':>14}")
+    for backend, report in reports.items():
+        all_p50, all_p95 = report["timings"]["all"]
+        where_p50, _ = report["timings"]["template"]
+        overlap = _overlap(reference["all"], report["top_ids"]["all"])
+        print(f"{backend:<8} {report['chunks']:>7} {report['open_s']:>7.3f} {all_p50:>7.3f} "
+              f"{all_p95:>7.3f} {where_p50:>15.3f} {report['rss_mb']:>12.0f} {overlap:>14.0%}")
@@ -6,9 +6,10 @@ from GPT-4o-mini.
 """
 
 import json
-from openai import OpenAI
+from metrics import record_usage, timed
+from openai_client import get_client
 
-client = OpenAI()
+RISK_MODEL = "gpt-4o-mini"
 
 RISK_SCHEMA_EXAMPLE = """{
   "overallRisk": "Red | Yellow | Green",
@@ -56,7 +57,8 @@ Consider both the extracted clauses AND the missing categories when assessing ri
 Missing critical clauses (like Limitation of Liability, Indemnification, Confidentiality) should be flagged as risks."""
 
 
-def assess_risk(extracted_clauses: dict) -> dict:
+@timed("assess_risk")
+async def assess_risk(extracted_clauses: dict) -> dict:
     """
     Produce a structured risk-assessment for the given CUAD extractions.
 
@@ -66,8 +68,8 @@ def assess_risk(extracted_clauses: dict) -> dict:
     """
     prompt = _build_risk_prompt(extracted_clauses)
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
+    response = await get_client().chat.completions.create(
+        model=RISK_MODEL,
         messages=[
             {
                 "role": "system",
@@ -83,6 +85,8 @@ def assess_risk(extracted_clauses: dict) -> dict:
         max_tokens=4000,
     )
 
+    record_usage("risk", RISK_MODEL, response.usage)
+
     raw = response.choices[0].message.content.strip()
 
     # Strip markdown code fences if the model wraps them anyway
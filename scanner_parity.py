@@ -0,0 +1,86 @@
+"""
+scanner_parity.py
+─────────────────
+Compares the ONNX Runtime scanner engines against the PyTorch reference.
+
+Each engine runs in a fresh process so its latency and peak RSS are measured
+in isolation.  Usage:
+
+    python scanner_parity.py [contract.txt ...] [--engines torch,onnx,onnx-int8]
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+
+def _run_engine(engine: str, texts: list[str], conn) -> None:
+    import contract_scanner
+
+    start = time.perf_counter()
+    contract_scanner._get_runner(engine)
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [contract_scanner.scan_contract(text, engine=engine) for text in texts]
+    scan_s = time.perf_counter() - start
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    conn.send({"results": results, "load_s": load_s, "scan_s": scan_s, "rss_mb": peak_rss_mb})
+    conn.close()
+
+
+def _measure(engine: str, texts: list[str]) -> dict:
+    ctx = mp.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_run_engine, args=(engine, texts, child))
+    proc.start()
+    report = parent.recv()
+    proc.join()
+    return report
+
+
+def _compare(reference: list[dict], candidate: list[dict]) -> dict:
+    deltas, found_agree, answer_agree, total = [], 0, 0, 0
+    for ref_doc, cand_doc in zip(reference, candidate):
+        for category, ref in ref_doc.items():
+            cand = cand_doc[category]
+            deltas.append(abs(ref["score"] - cand["score"]))
+            found_agree += ref["found"] == cand["found"]
+            answer_agree += ref["answer"] == cand["answer"]
+            total += 1
+    return {
+        "max_score_delta": max(deltas, default=0.0),
+        "mean_score_delta": sum(deltas) / len(deltas) if deltas else 0.0,
+        "found_agreement": found_agree / total if total else 1.0,
+        "answer_agreement": answer_agree / total if total else 1.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[3])
+    parser.add_argument("files", nargs="*", default=["data/ProfessionalServicesAgreement.txt"])
+    parser.add_argument("--engines", default="torch,onnx,onnx-int8")
+    args = parser.parse_args()
+
+    texts = []
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+
+    engines = args.engines.split(",")
+    if "torch" not in engines:
+        engines.insert(0, "torch")
+
+    reports = {engine: _measure(engine, texts) for engine in engines}
+    reference = reports["torch"]["results"]
+
+    print(f"\n{'engine':<10} {'load s':>8} {'scan s':>8} {'peak RSS MB':>12} "
+          f"{'max Δscore':>11} {'mean Δscore':>12} {'found =':>8} {'answer =':>9}")
+    for engine, report in reports.items():
+        parity = _compare(reference, report["results"])
+        print(f"{engine:<10} {report['load_s']:>8.2f} {report['scan_s']:>8.2f} "
+              f"{report['rss_mb']:>12.0f} {parity['max_score_delta']:>11.4f} "
+              f"{parity['mean_score_delta']:>12.4f} {parity['found_agreement']:>8.0%} "
+              f"{parity['answer_agreement']:>9.0%}")
@@ -0,0 +1,180 @@
+"""
+sqlite_lru.py
+─────────────
+The disk tier shared by result_cache.py and embedding_cache.py: a SQLite
+table of (namespace, key) → value rows kept under a byte budget by evicting
+the least recently used rows, with an optional TTL by age.
+
+The store keeps a running byte total, so a put only evicts when the budget
+is actually exceeded, and holds the access times of hits in memory, writing
+them back in batches rather than one commit per hit.  Values are stored as
+given (text or bytes); callers own serialization and any memory tier.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Hits whose last_access update is held back before one batched write
+TOUCH_BATCH = 64
+# Rows read per step while evicting the least recently used entries
+EVICT_BATCH = 64
+
+# ``get`` result for a row that outlived the TTL (it is deleted on the spot)
+EXPIRED = object()
+
+
+class SQLiteLRU:
+    """Byte-budgeted, LRU-evicted SQLite rows keyed by (namespace, key)."""
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        ttl: float | None = None,
+        touch_batch: int = TOUCH_BATCH,
+        evict_batch: int = EVICT_BATCH,
+        legacy_tables: tuple[str, ...] = (),
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl or None
+        self.touch_batch = touch_batch
+        self.evict_batch = evict_batch
+        self.legacy_tables = legacy_tables  # dropped on open (older layouts of the same file)
+        self._lock = threading.RLock()
+        self._touched: dict[tuple[str, str], float] = {}  # pending last_access updates
+        self._bytes = 0  # running SUM(size)
+        self._db = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            for table in self.legacy_tables:
+                self._db.execute(f"DROP TABLE IF EXISTS {table}")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT, key TEXT, value TEXT, size INTEGER, last_access REAL,"
+                " created REAL, PRIMARY KEY (namespace, key))"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+            if "created" not in columns:  # cache file from before TTL support
+                self._db.execute("ALTER TABLE entries ADD COLUMN created REAL")
+                self._db.execute("UPDATE entries SET created = last_access")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_lru ON entries (last_access)")
+            self._db.commit()
+            (self._bytes,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return self._db
+
+    def expired(self, created: float | None) -> bool:
+        return self.ttl is not None and created is not None and time.time() - created > self.ttl
+
+    def _flush_touches(self, db: sqlite3.Connection) -> None:
+        """Write the held-back access times (the caller commits)."""
+        if self._touched:
+            db.executemany(
+                "UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                [(when, namespace, key) for (namespace, key), when in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _touch(self, db: sqlite3.Connection, namespace: str, key: str, when: float) -> None:
+        self._touched[(namespace, key)] = when
+        if len(self._touched) >= self.touch_batch:
+            self._flush_touches(db)
+            db.commit()
+
+    def _delete(self, db: sqlite3.Connection, namespace: str, key: str, size: int) -> None:
+        db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        self._touched.pop((namespace, key), None)
+        self._bytes -= size
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        """Drop the least recently used rows until the table fits ``max_bytes``."""
+        self._flush_touches(db)
+        while self._bytes > self.max_bytes:
+            rows = db.execute(
+                "SELECT namespace, key, size FROM entries ORDER BY last_access LIMIT ?",
+                (self.evict_batch,),
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            for namespace, key, size in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._delete(db, namespace, key, size)
+
+    def get(self, namespace: str, key: str):
+        """``(value, created)`` for a live row, ``EXPIRED`` for one past the TTL, else None."""
+        with self._lock:
+            db = self._conn()
+            row = db.execute(
+                "SELECT value, created, size FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            value, created, size = row
+            if self.expired(created):
+                self._delete(db, namespace, key, size)
+                db.commit()
+                return EXPIRED
+            self._touch(db, namespace, key, time.time())
+            return value, created
+
+    def put_many(self, namespace: str, values: dict, replace: bool = True) -> None:
+        """
+        Store ``key → value`` rows in one transaction.  With ``replace=False``
+        an existing row is kept (and counts as a use) instead of overwritten.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            for key, value in values.items():
+                size = len(value)
+                if replace:
+                    old = db.execute(
+                        "SELECT size FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+                    ).fetchone()
+                    db.execute(
+                        "INSERT OR REPLACE INTO entries (namespace, key, value, size, last_access, created)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (namespace, key, value, size, now, now),
+                    )
+                    self._touched.pop((namespace, key), None)
+                    self._bytes += size - (old[0] if old else 0)
+                elif db.execute(
+                    "INSERT OR IGNORE INTO entries (namespace, key, value, size, last_access, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (namespace, key, value, size, now, now),
+                ).rowcount:
+                    self._bytes += size
+                else:
+                    self._touched[(namespace, key)] = now
+            if self._bytes > self.max_bytes:
+                self._evict(db)
+            db.commit()
+
+    def delete(self, namespace: str, key: str | None = None) -> int:
+        """Drop one row, or the whole namespace when ``key`` is None; returns the row count."""
+        with self._lock:
+            db = self._conn()
+            if key is None:
+                cur = db.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+                for touched in [k for k in self._touched if k[0] == namespace]:
+                    del self._touched[touched]
+            else:
+                cur = db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                self._touched.pop((namespace, key), None)
+            db.commit()
+            if cur.rowcount:
+                (self._bytes,) = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()
+            return {"disk_entries": entries, "disk_bytes": self._bytes}
@@ -0,0 +1,71 @@
+"""
+stage_dag.py
+────────────
+Tiny dependency-graph runner for request pipelines.
+
+Stages are callables that receive the results of the stages they depend on
+as keyword arguments.  Every stage whose dependencies are done is started at
+once as an asyncio task, so independent I/O-bound stages (LLM calls,
+embedding lookups) overlap.  Coroutine functions are awaited on the event
+loop; plain functions run in a worker thread.  ``run`` returns the results
+plus a per-stage timing record: start offset and duration in milliseconds.
+"""
+
+import asyncio
+import inspect
+import time
+
+
+class StageDAG:
+    def __init__(self):
+        self._stages: dict[str, tuple] = {}
+
+    def add(self, name: str, fn, deps: tuple[str, ...] = ()) -> "StageDAG":
+        """Register ``fn(**{dep: result for dep in deps})`` as stage ``name``."""
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Stage {name!r} depends on unknown stages {missing}")
+        self._stages[name] = (fn, tuple(deps))
+        return self
+
+    async def run(self) -> tuple[dict, dict]:
+        """
+        Run every stage as soon as its dependencies finish.
+
+        Returns (results, timings) keyed by stage name.  The first stage to
+        raise cancels the ones still running and re-raises.
+        """
+        origin = time.perf_counter()
+        results: dict = {}
+        timings: dict = {}
+        running: dict = {}  # task → stage name
+        pending = dict(self._stages)
+
+        async def timed(name, fn, kwargs):
+            start = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(fn):
+                    return await fn(**kwargs)
+                return await asyncio.to_thread(fn, **kwargs)
+            finally:
+                end = time.perf_counter()
+                timings[name] = {
+                    "start_ms": round((start - origin) * 1000, 1),
+                    "duration_ms": round((end - start) * 1000, 1),
+                }
+
+        try:
+            while pending or running:
+                for name, (fn, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        kwargs = {dep: results[dep] for dep in deps}
+                        running[asyncio.create_task(timed(name, fn, kwargs))] = name
+                        del pending[name]
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[running.pop(task)] = task.result()
+        finally:
+            for task in running:
+                task.cancel()
+        return results, timings
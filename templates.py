@@ -0,0 +1,224 @@
+"""
+templates.py
+────────────
+In-memory registry of the contract files in data/.
+
+Every .txt file is read once (at startup via ``load_all``, or on first
+``get``) and served from memory afterwards; an entry is re-read only when
+its file's mtime changes.  Each entry carries metadata the prompt builder
+and the UI can use without touching the text again: token count and a
+placeholder inventory (``[____]`` blanks, ``[    ]`` checkboxes, other
+bracketed fill-ins, PARTY 1 / PARTY 2 headings and Print Name lines).
+
+``fill_template`` substitutes extracted entities into those placeholders
+locally, so the hybrid generation mode only asks the LLM for the clauses that
+need judgment.  Placeholders it has no value for are left as they are.
+``signature_block_line`` tells it where those clauses go: before the
+signature blocks rather than after the end of the document.
+"""
+
+import hashlib
+import os
+import re
+import threading
+
+from prompts import count_tokens
+from retrieval import classify_source
+
+TEMPLATE_DIR = os.getenv("TEMPLATE_DIR", "data")
+
+BLANK_RE = re.compile(r"\[\s*\$?_+\s*\]")
+CHECKBOX_RE = re.compile(r"^\s*\[\s*\]", re.MULTILINE)
+BRACKET_RE = re.compile(r"\[([^\[\]\n]+)\]")
+PARTY_HEADING_RE = re.compile(r"^\s*(PARTY [12])\s*$", re.MULTILINE)
+PRINT_NAME_RE = re.compile(r"^\s*Print Name\b", re.MULTILINE)
+PRINT_NAME_LINE_RE = re.compile(r"^(\s*Print Name)\b:?[ \t]*$")
+SIGNATURE_LINE_RE = re.compile(r"^\s*Signature[ \t]*$")
+CHECKBOX_MARK_RE = re.compile(r"^(\s*)\[\s*\]")
+CHECKED_BOX = "[ x ]"
+
+# Bracketed fill-in label (lower-cased) → entity keys that can fill it
+FILL_IN_ENTITIES = [
+    (re.compile(r"today'?s date|effective date|^date$"), ("effective_date",)),
+    (re.compile(r"disclosing party|^party 1$"), ("party_1",)),
+    (re.compile(r"partner name|receiving party|^party 2$"), ("party_2",)),
+    (re.compile(r"fill in state"), ("governing_state", "governing_law", "jurisdiction")),
+    (re.compile(r"geographic"), ("territory",)),
+    (re.compile(r"payment schedule"), ("payment_schedule",)),
+    (re.compile(r"year\(s\)"), ("duration", "term")),
+    (re.compile(r"^evaluating whether"), ("purpose",)),
+]
+COMPANY_NAME_RE = re.compile(r"company name")  # n-th on a line → party n
+FEE_LINE_RE = re.compile(r"\b(pay|fee|fees|amount|price)\b", re.IGNORECASE)
+
+
+def placeholder_inventory(text: str) -> dict:
+    """Counts and distinct labels of the placeholders a template contains."""
+    fill_ins = []
+    for label in BRACKET_RE.findall(text):
+        label = " ".join(label.split())
+        if label and label.strip("_$ ") and label not in fill_ins:
+            fill_ins.append(label)
+    return {
+        "blanks": len(BLANK_RE.findall(text)),
+        "checkboxes": len(CHECKBOX_RE.findall(text)),
+        "fill_ins": fill_ins,
+        "party_headings": PARTY_HEADING_RE.findall(text),
+        "print_name_lines": len(PRINT_NAME_RE.findall(text)),
+    }
+
+
+def signature_block_line(text: str) -> int | None:
+    """
+    Index of the line where the template's signature blocks start: the first
+    PARTY 1 / PARTY 2 heading, else the first bare "Signature" line (with a
+    tabbed party-column heading right above it, if any).  None if there is
+    no signature block.  ``fill_template`` keeps lines one to one, so the
+    index holds for the filled text too.
+    """
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        if PARTY_HEADING_RE.match(line):
+            return i
+    for i, line in enumerate(lines):
+        if SIGNATURE_LINE_RE.match(line):
+            return i - 1 if i and "\t" in lines[i - 1] and lines[i - 1].strip() else i
+    return None
+
+
+def _entity(entities: dict, *keys: str) -> str:
+    """First non-empty value among ``keys`` (or keys extending them, e.g. party_1_name)."""
+    for key in keys:
+        for name, value in entities.items():
+            if value and (name == key or name.startswith(key + "_")):
+                if isinstance(value, (list, tuple)):
+                    return ", ".join(str(v) for v in value)
+                return str(value)
+    return ""
+
+
+def fill_template(text: str, entities: dict, today: str) -> str:
+    """
+    Deterministically substitute ``entities`` into the template's placeholders:
+    PARTY 1 / PARTY 2 headings, Print Name lines (per party block, or both
+    columns of a tabbed signature table), date fill-ins, other known bracketed
+    fill-ins, and ``[____]`` amount blanks on fee lines.  A checkbox line is
+    ticked when something on it was filled in.
+    """
+    parties = [_entity(entities, "party_1"), _entity(entities, "party_2")]
+    date_value = _entity(entities, "effective_date") or today
+    fee = _entity(entities, "fee_amount", "fee", "payment_amount")
+    party = 0  # signature block we are in, from the last PARTY heading
+
+    lines = []
+    for line in text.split("\n"):
+        heading = PARTY_HEADING_RE.match(line)
+        if heading:
+            party = int(heading.group(1)[-1]) - 1
+            lines.append(parties[party] or line)
+            continue
+
+        print_name = PRINT_NAME_LINE_RE.match(line.rstrip("\t "))
+        if print_name and "\t" in line and all(parties):
+            lines.append(f"{print_name.group(1)}\t{parties[0]}\t\t{parties[1]}")
+            continue
+        if print_name and parties[party]:
+            lines.append(f"{print_name.group(1)}: {parties[party]}")
+            continue
+
+        filled = False
+        company = 0
+
+        def fill_in(match):
+            nonlocal filled, company
+            label = " ".join(match.group(1).split()).lower()
+            value = ""
+            if COMPANY_NAME_RE.search(label):
+                value = parties[company] if company < len(parties) else ""
+                company += 1
+            elif BLANK_RE.fullmatch(match.group(0)):
+                value = fee if fee and FEE_LINE_RE.search(line) else ""
+            else:
+                for pattern, keys in FILL_IN_ENTITIES:
+                    if pattern.search(label):
+                        value = date_value if keys == ("effective_date",) else _entity(entities, *keys)
+                        break
+            if not value:
+                return match.group(0)
+            filled = True
+            return value
+
+        new_line = BRACKET_RE.sub(fill_in, line)
+        if filled and CHECKBOX_RE.match(line):
+            new_line = CHECKBOX_MARK_RE.sub(lambda m: m.group(1) + CHECKED_BOX, new_line, count=1)
+        lines.append(new_line)
+    return "\n".join(lines)
+
+
+class Template:
+    """One file's text plus its precomputed metadata."""
+
+    def __init__(self, filename: str, text: str, mtime: float):
+        self.filename = filename
+        self.text = text
+        self.mtime = mtime
+        self.source = classify_source(filename)
+        self.tokens = count_tokens(text)
+        self.digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self.placeholders = placeholder_inventory(text)
+
+    def summary(self) -> dict:
+        """Metadata without the text, e.g. for the UI."""
+        return {
+            "filename": self.filename,
+            "source": self.source,
+            "chars": len(self.text),
+            "tokens": self.tokens,
+            "placeholders": self.placeholders,
+        }
+
+
+class TemplateRegistry:
+    def __init__(self, directory: str = TEMPLATE_DIR):
+        self.directory = directory
+        self._entries: dict[str, Template] = {}
+        self._lock = threading.Lock()
+
+    def _read(self, filename: str, mtime: float) -> Template:
+        with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as f:
+            return Template(filename, f.read(), mtime)
+
+    def load_all(self) -> int:
+        """(Re)load every .txt file in the directory; returns how many are registered."""
+        filenames = sorted(f for f in os.listdir(self.directory) if f.endswith(".txt"))
+        for filename in filenames:
+            self.get(filename)
+        with self._lock:
+            for filename in set(self._entries) - set(filenames):
+                del self._entries[filename]
+            return len(self._entries)
+
+    def get(self, filename: str) -> Template | None:
+        """The registered template, re-read if its mtime changed; None if the file is gone."""
+        if os.path.basename(filename) != filename:
+            return None  # only plain file names inside the registry directory
+        try:
+            mtime = os.path.getmtime(os.path.join(self.directory, filename))
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(filename, None)
+            return None
+
+        entry = self._entries.get(filename)
+        if entry is None or entry.mtime != mtime:
+            entry = self._read(filename, mtime)
+            with self._lock:
+                self._entries[filename] = entry
+        return entry
+
+    def all(self) -> list[Template]:
+        with self._lock:
+            return sorted(self._entries.values(), key=lambda t: t.filename)
+
+
+template_registry = TemplateRegistry()
@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+
+import numpy as np
+
+import sqlite_lru
+from embedding_cache import CachedEmbeddingFunction, EmbeddingCache, text_hash
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault("max_bytes", 1 << 20)
+    return EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), **kwargs)
+
+
+def test_only_misses_reach_the_inner_function(tmp_path):
+    inner = CountingEmbeddings()
+    embed = CachedEmbeddingFunction(inner, "model-a", make_cache(tmp_path))
+
+    first = embed(["alpha", "beta", "alpha"])
+    second = embed(["beta", "gamma"])
+    assert inner.calls == [["alpha", "beta"], ["gamma"]]
+    assert [v.tolist() for v in first] == [[5.0, 1.0], [4.0, 1.0], [5.0, 1.0]]
+    assert second[0].dtype == np.float32
+
+
+def test_vectors_are_keyed_by_model(tmp_path):
+    cache = make_cache(tmp_path)
+    inner = CountingEmbeddings()
+    CachedEmbeddingFunction(inner, "model-a", cache)(["alpha"])
+    CachedEmbeddingFunction(inner, "model-b", cache)(["alpha"])
+    assert inner.calls == [["alpha"], ["alpha"]]
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    make_cache(tmp_path).put_many("m", {text_hash("alpha"): np.ones(4, dtype=np.float32)})
+    cache = make_cache(tmp_path)
+    found = cache.get_many("m", [text_hash("alpha"), text_hash("beta")])
+    assert list(found) == [text_hash("alpha")]
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["misses"] == 1
+    assert cache.stats()["disk_bytes"] == 16
+
+
+def test_eviction_drops_least_recently_used(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sqlite_lru.time, "time", lambda: now[0])
+    cache = make_cache(tmp_path, max_bytes=3 * 16, memory_items=0)
+    vector = np.ones(4, dtype=np.float32)
+    for text in ("a", "b", "c"):
+        cache.put_many("m", {text_hash(text): vector})
+        now[0] += 1
+    assert cache.get_many("m", [text_hash("a")])  # "b" is now the least recently used
+    now[0] += 1
+    cache.put_many("m", {text_hash("d"): vector})
+
+    found = cache.get_many("m", [text_hash(t) for t in "abcd"])
+    assert set(found) == {text_hash(t) for t in "acd"}
+    assert cache.stats()["disk_bytes"] == 3 * 16
+
+
+def test_repeated_puts_do_not_grow_the_running_size(tmp_path):
+    cache = make_cache(tmp_path)
+    vector = np.ones(4, dtype=np.float32)
+    cache.put_many("m", {text_hash("a"): vector})
+    cache.put_many("m", {text_hash("a"): vector, text_hash("b"): vector})
+    assert cache.stats()["disk_bytes"] == 32
+    assert make_cache(tmp_path).stats()["disk_bytes"] == 32
+
+
+def test_acall_uses_the_async_inner_function(tmp_path):
+    inner = CountingEmbeddings()
+    async_calls = []
+
+    async def async_inner(texts):
+        async_calls.append(list(texts))
+        return [[2.0, 2.0] for _ in texts]
+
+    embed = CachedEmbeddingFunction(inner, "m", make_cache(tmp_path), async_inner=async_inner)
+
+    async def main():
+        await embed.acall(["alpha"])
+        return await embed.acall(["alpha", "beta"])
+
+    vectors = asyncio.run(main())
+    assert async_calls == [["alpha"], ["beta"]] and inner.calls == []
+    assert [v.tolist() for v in vectors] == [[2.0, 2.0], [2.0, 2.0]]
+
+
+def test_old_vectors_table_is_dropped(tmp_path):
+    path = tmp_path / "embeddings.sqlite3"
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE vectors (model TEXT, text_hash TEXT, vector BLOB, last_access REAL)")
+    db.execute("INSERT INTO vectors VALUES ('m', 'h', x'00000000', 1.0)")
+    db.commit()
+    db.close()
+
+    cache = make_cache(tmp_path)
+    assert cache.stats()["disk_bytes"] == 0
+    tables = {row[0] for row in sqlite3.connect(path).execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {"entries"}
@@ -1,5 +1,11 @@
+import asyncio
 from generation import generate_contract
 
+
+async def collect(inp):
+    return "".join([chunk async for chunk in generate_contract(inp)])
+
+
 test_inputs = [
   """NDA between Manish and Deepak for 2 years in India. 
 Manish will engage in promotional activities on social media. 
@@ -7,7 +13,7 @@ Deepak will pay Manish ₹50,000 per month. Governing law: India."""]
 for inp in test_inputs:
     print(f"\n>>> Input: {inp}")
     print("-" * 50)
-    result = "".join(generate_contract(inp))
+    result = asyncio.run(collect(inp))
     print(result)
     print("=" * 80)
 
@@ -0,0 +1,152 @@
+import asyncio
+import importlib.util
+import os
+import time
+
+import pytest
+
+import generation
+from result_cache import ResultCache
+from templates import TemplateRegistry
+
+TEMPLATE = "[ ] Governed by [fill in state].\nPARTY 1\nPrint Name"
+RETRIEVED = (["Template chunk."], [{"source": "template", "file": "nda.txt", "chunk_index": 0}], [0.1])
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    (tmp_path / "nda.txt").write_text(TEMPLATE, encoding="utf-8")
+    calls = {"extract": 0, "retrieve": 0}
+    delays = {"extract": 0.0, "retrieve": 0.0}
+    events = []  # (stage, "start" | "end" | "cancelled", perf_counter)
+
+    async def stage(name, result):
+        calls[name] += 1
+        events.append((name, "start", time.perf_counter()))
+        try:
+            await asyncio.sleep(delays[name])
+        except asyncio.CancelledError:
+            events.append((name, "cancelled", time.perf_counter()))
+            raise
+        events.append((name, "end", time.perf_counter()))
+        return result
+
+    async def fake_retrieve(user_input):
+        return await stage("retrieve", RETRIEVED)
+
+    async def fake_extract(user_input):
+        return await stage("extract", {"party_1": "Acme Corp", "governing_state": "Delaware"})
+
+    monkeypatch.setattr(generation, "template_registry", TemplateRegistry(str(tmp_path)))
+    monkeypatch.setattr(generation, "generation_cache",
+                        ResultCache(str(tmp_path / "generation.sqlite3"), max_bytes=1 << 20))
+    monkeypatch.setattr(generation, "_retrieve", fake_retrieve)
+    monkeypatch.setattr(generation, "extract_entities", fake_extract)
+    monkeypatch.setattr(generation, "GENERATION_CACHE", True)
+    return tmp_path, calls, delays, events
+
+
+def generate(description="An NDA between Acme Corp and Beta LLC"):
+    async def collect():
+        timings = {}
+        text = "".join([chunk async for chunk in generation.generate_contract(description, timings, mode="hybrid")])
+        return text, timings
+
+    return asyncio.run(collect())
+
+
+def overlapping(events, first, second):
+    when = {(name, kind): at for name, kind, at in events}
+    return when[(first, "start")] < when[(second, "end")] and when[(second, "start")] < when[(first, "end")]
+
+
+def test_miss_runs_extraction_beside_retrieval(pipeline):
+    _, calls, delays, events = pipeline
+    delays.update(extract=0.2, retrieve=0.2)
+    started = time.perf_counter()
+    text, timings = generate()
+
+    assert timings["cache"] == "miss" and calls == {"extract": 1, "retrieve": 1}
+    assert overlapping(events, "extract", "retrieve")
+    assert time.perf_counter() - started < 0.35  # not 0.2 + 0.2 back to back
+    assert timings["extract"]["start_ms"] == timings["retrieve"]["start_ms"] == 0.0
+    assert text == "[ x ] Governed by Delaware.\nAcme Corp\nPrint Name: Acme Corp"
+
+
+@pytest.mark.parametrize("cache_env", [None, "0"], ids=["default", "cache-off"])
+def test_extract_and_retrieve_overlap_in_every_cache_setting(pipeline, monkeypatch, cache_env):
+    _, _, delays, events = pipeline
+    if cache_env is None:
+        monkeypatch.delenv("GENERATION_CACHE", raising=False)
+    else:
+        monkeypatch.setenv("GENERATION_CACHE", cache_env)
+    # Read the setting the way a fresh process would
+    spec = importlib.util.find_spec("generation")
+    fresh = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(fresh)
+    monkeypatch.setattr(generation, "GENERATION_CACHE", fresh.GENERATION_CACHE)
+    assert fresh.GENERATION_CACHE is (cache_env is None)
+
+    delays.update(extract=0.1, retrieve=0.1)
+    _, timings = generate()
+    assert overlapping(events, "extract", "retrieve")
+    extract, retrieve = timings["extract"], timings["retrieve"]
+    assert extract["start_ms"] < retrieve["start_ms"] + retrieve["duration_ms"]
+    assert retrieve["start_ms"] < extract["start_ms"] + extract["duration_ms"]
+
+
+def test_hit_replays_without_using_the_extraction(pipeline):
+    _, calls, delays, events = pipeline
+    text, _ = generate()
+
+    delays["extract"] = 5.0  # a hit must not wait for it
+    started = time.perf_counter()
+    replayed, timings = generate()
+    assert time.perf_counter() - started < 1.0
+    assert replayed == text
+    assert timings["cache"] == "hit" and "extract" not in timings
+    assert events[-1][:2] == ("extract", "cancelled")
+    assert calls["retrieve"] == 2
+
+
+def test_editing_the_template_changes_the_cache_key(pipeline):
+    tmp_path, calls, _, _ = pipeline
+    generate()
+    template = tmp_path / "nda.txt"
+    template.write_text(TEMPLATE.replace("Governed", "Construed"), encoding="utf-8")
+    mtime = os.path.getmtime(template) + 10
+    os.utime(template, (mtime, mtime))
+
+    text, timings = generate()
+    assert timings["cache"] == "miss" and calls["extract"] == 2
+    assert text.startswith("[ x ] Construed by Delaware.")
+
+
+def test_fingerprint_covers_candidate_templates(pipeline):
+    assert generation._template_candidates(RETRIEVED[1]) == ("nda.txt",)
+    assert generation._template_candidates([{"source": "law"}]) == generation.FALLBACK_TEMPLATES
+    with_template = generation.generation_fingerprint("hybrid", ("nda.txt",))
+    assert with_template != generation.generation_fingerprint("hybrid")
+    assert generation.generation_fingerprint("hybrid", ("missing.txt",)).endswith("missing.txt:-")
+
+
+def test_hybrid_clauses_go_before_the_signature_blocks(pipeline, monkeypatch):
+    law = (["Template chunk.", "Personal data must be protected."],
+           RETRIEVED[1] + [{"source": "law", "file": "privacy_law.txt", "chunk_index": 0}], [0.1, 0.2])
+
+    async def fake_retrieve(user_input):
+        return law
+
+    async def fake_completion(call, system, prompt, max_tokens):
+        assert call == "clauses"
+        for delta in ("  Data Protection (Added per applicable law).", " Data stays in the EU."):
+            yield delta
+
+    monkeypatch.setattr(generation, "_retrieve", fake_retrieve)
+    monkeypatch.setattr(generation, "_stream_completion", fake_completion)
+    text, _ = generate()
+    assert text == (
+        "[ x ] Governed by Delaware.\n\n"
+        "Data Protection (Added per applicable law). Data stays in the EU.\n\n"
+        "Acme Corp\nPrint Name: Acme Corp"
+    )
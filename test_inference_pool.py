@@ -0,0 +1,195 @@
+import asyncio
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import inference_pool
+from inference_pool import InferencePool, QueueFullError
+
+
+def _count_job(n: int, events, job_id: int) -> None:
+    events.put((job_id, "started", time.time()))
+    for i in range(n):
+        time.sleep(0.01)
+        events.put((job_id, "item", i, {"n": i}))
+    events.put((job_id, "finished", time.time(), {"model": 0.01 * n}))
+
+
+def _crash_job(n: int, events, job_id: int) -> None:
+    events.put((job_id, "started", time.time()))
+    raise RuntimeError("worker died")
+
+
+def make_pool(workers=2, max_depth=8):
+    pool = InferencePool(workers=workers, max_depth=max_depth)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+    pool._get_executor = lambda: executor
+    return pool, executor
+
+
+async def collect(pool, n, meta):
+    return [item async for item in pool._relay(_count_job, n, meta)]
+
+
+def test_concurrent_streams_share_one_reader_thread():
+    pool, executor = make_pool(workers=2, max_depth=16)
+
+    async def main():
+        # One default-executor thread: streams must not hold it while they wait
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        await pool.start()
+        metas = [{} for _ in range(6)]
+        results = await asyncio.gather(*(collect(pool, 5, meta) for meta in metas))
+        return results, metas
+
+    try:
+        results, metas = asyncio.run(main())
+    finally:
+        pool.shutdown()
+        executor.shutdown()
+    assert all(result == [(i, {"n": i}) for i in range(5)] for result in results)
+    assert all("inference_ms" in meta and meta["phases_ms"] == {"model": 50.0} for meta in metas)
+    assert pool._pending == 0 and not pool._streams
+
+
+def test_worker_crash_is_raised():
+    pool, executor = make_pool()
+
+    async def main():
+        return [item async for item in pool._relay(_crash_job, 1, {})]
+
+    try:
+        with pytest.raises(RuntimeError, match="worker died"):
+            asyncio.run(main())
+    finally:
+        pool.shutdown()
+        executor.shutdown()
+    assert pool._pending == 0
+
+
+def test_admission_rejects_when_saturated():
+    pool = InferencePool(workers=1, max_depth=1)
+    pool._pending = 2
+    assert pool.saturated
+    with pytest.raises(QueueFullError):
+        pool._admit()
+
+
+def test_shard_balances_by_length_and_keeps_order():
+    texts = ["a" * 100, "b" * 10, "c" * 60, "d" * 50]
+    shards = inference_pool._shard(texts, 2)
+    assert sorted(i for shard in shards for i in shard) == [0, 1, 2, 3]
+    assert all(shard == sorted(shard) for shard in shards)
+    assert sorted(sum(len(texts[i]) for i in shard) for shard in shards) == [110, 110]
+    assert inference_pool._shard(["x"], 4) == [[0]]
+
+
+def test_batch_is_split_across_workers_and_each_shard_admitted():
+    pool = InferencePool(workers=3, max_depth=8)
+    seen = []
+
+    async def fake_relay(job, batch, meta):
+        seen.append((len(batch), pool._pending))
+        await asyncio.sleep(0.01)
+        for position, text in enumerate(batch):
+            yield position, {"text": text}
+        meta.update(queue_wait_ms=1.0, inference_ms=float(len(batch)), phases_ms={"model": 2.0})
+
+    pool._relay = fake_relay
+    texts = [f"doc {i}" for i in range(7)]
+    meta = {}
+
+    async def main():
+        return {index: clauses async for index, clauses in pool.scan_batch_stream(texts, meta)}
+
+    results = asyncio.run(main())
+    assert results == {i: {"text": text} for i, text in enumerate(texts)}
+    assert len(seen) == 3 and all(pending == 3 for _, pending in seen)
+    assert meta["shards"] == 3 and meta["inference_ms"] == 3.0 and meta["phases_ms"] == {"model": 6.0}
+    assert pool._pending == 0
+
+
+def test_batch_uses_fewer_shards_when_the_queue_is_nearly_full():
+    pool = InferencePool(workers=4, max_depth=0)
+    pool._pending = 3
+
+    async def fake_relay(job, batch, meta):
+        for position, _ in enumerate(batch):
+            yield position, {}
+
+    pool._relay = fake_relay
+    meta = {}
+
+    async def main():
+        return [item async for item in pool.scan_batch_stream(["a", "b", "c"], meta)]
+
+    assert len(asyncio.run(main())) == 3
+    assert meta["shards"] == 1 and pool._pending == 3
+
+
+def _failing_initializer() -> None:
+    raise RuntimeError("hub unreachable")
+
+
+class FlakyStartPool(InferencePool):
+    """The first executor's initializer raises; later ones start normally."""
+
+    def __init__(self):
+        super().__init__(workers=1, max_depth=4)
+        self.executors = []
+
+    def _get_executor(self):
+        if self._executor is None:
+            failing = not self.executors
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, mp_context=mp.get_context("spawn"),
+                initializer=_failing_initializer if failing else None,
+            )
+            self.executors.append(self._executor)
+        return self._executor
+
+
+def test_broken_pool_is_replaced_on_the_next_job():
+    pool = FlakyStartPool()
+
+    async def main():
+        await pool.start()
+        with pytest.raises(BrokenProcessPool):
+            await collect(pool, 1, {})
+        return await collect(pool, 2, {})
+
+    try:
+        second = asyncio.run(main())
+    finally:
+        pool.shutdown()
+    assert second == [(0, {"n": 0}), (1, {"n": 1})]
+    assert len(pool.executors) == 2
+
+
+def test_warm_up_failure_in_the_initializer_is_logged_not_raised(monkeypatch, caplog):
+    def failing_warm_up():
+        raise OSError("hub unreachable")
+
+    monkeypatch.setattr(inference_pool.contract_scanner, "warm_up", failing_warm_up)
+    monkeypatch.setenv("OMP_NUM_THREADS", "1")
+    monkeypatch.setenv("MKL_NUM_THREADS", "1")
+    inference_pool._init_worker(1)
+    assert "Scanner warm-up failed" in caplog.text
+
+
+def test_nothing_starts_until_the_first_job():
+    pool, executor = make_pool()
+    assert pool._manager is None and pool._reader is None
+
+    async def main():
+        return await collect(pool, 1, {})  # no start(): the first stream brings up the manager
+
+    try:
+        assert asyncio.run(main()) == [(0, {"n": 0})]
+        assert pool._manager is not None and pool._reader.is_alive()
+    finally:
+        pool.shutdown()
+        executor.shutdown()
@@ -0,0 +1,42 @@
+import os
+import zipfile
+
+import pytest
+
+from ingest import UploadTooLargeError, unpack_zip
+
+
+def make_zip(tmp_path, members):
+    path = tmp_path / "batch.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+def test_unpack_zip_keeps_supported_members(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    path = make_zip(tmp_path, {"a.txt": "alpha", "b.pdf": "%PDF", "notes.md": "skip", "__MACOSX/a.txt": "x"})
+    members = unpack_zip(path, str(out))
+    assert [name for name, _ in members] == ["a.txt", "b.pdf"]
+    assert open(members[0][1]).read() == "alpha"
+
+
+def test_unpack_zip_stops_at_the_member_limit(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    path = make_zip(tmp_path, {f"{i}.txt": "x" for i in range(5)})
+    with pytest.raises(UploadTooLargeError):
+        unpack_zip(path, str(out), max_members=3)
+    assert len(os.listdir(out)) == 3  # aborted before extracting the rest
+
+
+def test_unpack_zip_stops_at_the_byte_limit(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    path = make_zip(tmp_path, {f"{i}.txt": "x" * 1000 for i in range(5)})
+    with pytest.raises(UploadTooLargeError, match="unpacks to more than"):
+        unpack_zip(path, str(out), max_bytes=2500)
+    assert sum(os.path.getsize(out / name) for name in os.listdir(out)) <= 2500
+
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import numpy as np
+
+import retrieval
+from intent_router import IntentRouter
+
+AXES = {"nda": [1.0, 0.0, 0.0], "termination": [0.0, 1.0, 0.0], "unclear": [0.5, 0.5, 0.0]}
+
+
+class AxisEmbeddings:
+    """Maps each text to the axis named by its first word; counts async calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        raise AssertionError("the router must embed through acall")
+
+    async def acall(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(0)  # let concurrent callers interleave
+        return [np.asarray(AXES[text.split()[0]], dtype=np.float32) for text in texts]
+
+
+def make_router(tmp_path, monkeypatch):
+    seeds = tmp_path / "seeds.json"
+    seeds.write_text(json.dumps({
+        "nda_template": ["nda mutual", "nda one-way"],
+        "contractor_termination": ["termination notice"],
+    }))
+    embeddings = AxisEmbeddings()
+    monkeypatch.setattr(retrieval, "_embedding_function", embeddings)
+    return IntentRouter(str(seeds), threshold=0.9, temperature=0.02), embeddings
+
+
+def test_concurrent_first_requests_load_the_seeds_once(tmp_path, monkeypatch):
+    router, embeddings = make_router(tmp_path, monkeypatch)
+
+    async def main():
+        return await asyncio.gather(*(router.classify(f"nda draft {i}") for i in range(5)))
+
+    results = asyncio.run(main())
+    assert [intent for intent, _ in results] == ["nda_template"] * 5
+    seed_loads = [call for call in embeddings.calls if len(call) == 3]
+    assert seed_loads == [["nda mutual", "nda one-way", "termination notice"]]
+    assert router.stats()["local"] == 5
+
+
+def test_low_confidence_falls_back_to_the_llm_and_is_memoized(tmp_path, monkeypatch):
+    router, embeddings = make_router(tmp_path, monkeypatch)
+    fallbacks = []
+
+    async def fake_llm(query):
+        fallbacks.append(query)
+        return "general_legal_question", 1.0
+
+    monkeypatch.setattr(retrieval, "classify_intent_llm", fake_llm)
+
+    async def main():
+        first = await router.classify("unclear  request")
+        second = await router.classify("Unclear request")
+        return first, second
+
+    assert asyncio.run(main()) == (("general_legal_question", 1.0),) * 2
+    assert fallbacks == ["unclear  request"]
+    stats = router.stats()
+    assert stats["fallback"] == 1 and stats["memo_hits"] == 1 and stats["fallback_rate"] == 1.0
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from numpy_index import NumpyIndex, matches_where
+
+
+def make_index(tmp_path, embed=None):
+    return NumpyIndex(str(tmp_path / "index"), embedding_function=embed, metadata={"embedding_model": "m"})
+
+
+def test_query_ranks_by_cosine_distance(tmp_path):
+    index = make_index(tmp_path)
+    index.upsert(
+        ids=["x", "y", "xy"],
+        documents=["along x", "along y", "diagonal"],
+        metadatas=[{"source": "law"}, {"source": "template"}, {"source": "law"}],
+        embeddings=[[2.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+    )
+    result = index.query(query_embeddings=[[1.0, 0.1]], n_results=2)
+    assert result["ids"] == [["x", "xy"]]
+    assert result["documents"] == [["along x", "diagonal"]]
+    assert result["distances"][0][0] == pytest.approx(1 - 1 / np.sqrt(1.01), abs=1e-6)
+
+
+def test_where_filter_and_small_collections(tmp_path):
+    index = make_index(tmp_path)
+    index.upsert(ids=["x", "y"], documents=["a", "b"],
+                 metadatas=[{"source": "law"}, {"source": "template"}],
+                 embeddings=[[1.0, 0.0], [0.0, 1.0]])
+    result = index.query(query_embeddings=[[1.0, 0.0]], n_results=5, where={"source": "template"})
+    assert result["ids"] == [["y"]]
+    assert make_index(tmp_path / "empty").query(query_embeddings=[[1.0, 0.0]])["ids"] == [[]]
+
+
+def test_upsert_replaces_and_delete_removes(tmp_path):
+    index = make_index(tmp_path)
+    index.upsert(ids=["x", "y"], documents=["a", "b"], metadatas=[{}, {}],
+                 embeddings=[[1.0, 0.0], [0.0, 1.0]])
+    index.upsert(ids=["x"], documents=["a2"], metadatas=[{"v": 2}], embeddings=[[0.0, 3.0]])
+    assert index.count() == 2
+    assert index.get(ids=["x"])["documents"] == ["a2"]
+    distances = index.query(query_embeddings=[[0.0, 1.0]], n_results=2)["distances"][0]
+    assert distances == pytest.approx([0.0, 0.0], abs=1e-6)  # x now points along y
+
+    index.delete(ids=["y", "missing"])
+    assert index.get()["ids"] == ["x"]
+    stored = index.get(ids=["x"], include=["embeddings"])["embeddings"][0]
+    assert np.allclose(stored, [0.0, 1.0])  # stored unit-normalized
+
+
+def test_persists_and_embeds_documents_when_no_vectors_given(tmp_path):
+    embed = lambda texts: [[float(len(text)), 1.0] for text in texts]
+    index = make_index(tmp_path, embed)
+    index.upsert(ids=["a"], documents=["abc"], metadatas=[{"source": "law"}])
+
+    reopened = make_index(tmp_path, embed)
+    assert reopened.count() == 1
+    assert reopened.metadata == {"embedding_model": "m"}
+    assert reopened.query(query_texts=["xyz"], n_results=1)["ids"] == [["a"]]
+    reopened.reset({"embedding_model": "other"})
+    assert make_index(tmp_path).count() == 0
+
+
+def test_matches_where_operators():
+    meta = {"source": "law", "file": "a.txt"}
+    assert matches_where(meta, {"source": {"$eq": "law"}})
+    assert matches_where(meta, {"source": {"$in": ["law", "template"]}})
+    assert not matches_where(meta, {"file": {"$nin": ["a.txt"]}})
+    assert matches_where(meta, {"$or": [{"source": "template"}, {"file": "a.txt"}]})
+    assert not matches_where(meta, {"$and": [{"source": "law"}, {"file": {"$ne": "a.txt"}}]})
+    with pytest.raises(ValueError):
+        matches_where(meta, {"source": {"$gt": 1}})
@@ -0,0 +1,62 @@
+import prompts
+from prompts import _fit_chunks, build_prompt, dedupe_chunks
+
+OVERLAP = "the receiving party shall keep it secret"  # longer than CHUNK_MIN_OVERLAP
+
+
+def test_dedupe_drops_repeats_and_contained_chunks():
+    chunks = ["Section 1. Data must be protected.", " Section 1. Data must be protected. ", "Data must be", "", "Other."]
+    assert dedupe_chunks(chunks) == ["Section 1. Data must be protected.", "Other."]
+    assert dedupe_chunks(["short", "a short clause"]) == ["a short clause"]
+
+
+def test_dedupe_stitches_overlapping_neighbours_in_either_order():
+    left = "Recipients agree that " + OVERLAP
+    right = OVERLAP + " for five years."
+    stitched = "Recipients agree that " + OVERLAP + " for five years."
+    assert dedupe_chunks([left, right]) == [stitched]
+    assert dedupe_chunks([right, left]) == [stitched]
+    assert dedupe_chunks(["ends with abc", "abc starts"]) == ["ends with abc", "abc starts"]  # overlap too short
+
+
+def test_fit_chunks_keeps_the_leading_chunks_that_fit(monkeypatch):
+    monkeypatch.setattr(prompts, "count_tokens", lambda text, model=None: (len(text) + 3) // 4)
+    chunks = ["a" * 38, "b" * 38, "c" * 2]  # 10, 10 and 1 tokens with their separators
+    assert _fit_chunks(chunks, 20) == chunks[:2]
+    assert _fit_chunks(chunks, 19) == chunks[:1]  # stops at the first chunk that does not fit
+    assert _fit_chunks(chunks, 0) == []
+
+
+def test_budget_drops_the_lowest_ranked_law_chunks():
+    law = ["First provision. " * 10, "Second provision. " * 10, "Third provision. " * 10]
+    report = {}
+    full = build_prompt("An NDA", ["Template text."], law, report=report)
+    assert report["law_chunks"]["kept"] == 3
+    assert report["total_tokens"] <= report["budget"]
+
+    budget = report["total_tokens"] - 20
+    trimmed_report = {}
+    trimmed = build_prompt("An NDA", ["Template text."], law, budget=budget, report=trimmed_report)
+    assert trimmed_report["law_chunks"] == {"received": 3, "deduplicated": 3, "kept": 2}
+    assert law[2].strip() in full and law[2].strip() not in trimmed
+    assert trimmed_report["total_tokens"] <= budget
+
+
+def test_known_template_tokens_skip_tokenizing_the_template(monkeypatch):
+    template = "Template body. " * 200
+    counted = []
+    real_count = prompts.count_tokens
+
+    def counting(text, model=prompts.PROMPT_MODEL):
+        counted.append(text)
+        return real_count(text, model)
+
+    monkeypatch.setattr(prompts, "count_tokens", counting)
+
+    report = {}
+    build_prompt("An NDA", [template], [], report=report, template_tokens=real_count(template))
+    assert not any(template in text for text in counted)
+    assert report["template_tokens"] == prompts._static_tokens(prompts.TEMPLATE_HEADING) + real_count(template)
+
+    build_prompt("An NDA", [template], [], report={})  # no count given: tokenized as before
+    assert any(template in text for text in counted)
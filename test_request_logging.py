@@ -0,0 +1,32 @@
+import json
+import logging
+import queue
+
+from request_logging import JsonFormatter, _QueueHandler, capped_fields
+
+
+def test_capped_fields_cut_on_a_character_boundary():
+    assert capped_fields("description", "short") == {
+        "description": "short", "description_bytes": 5, "description_truncated": False,
+    }
+    fields = capped_fields("description", "é" * 3, max_bytes=3)  # 2 bytes per character
+    assert fields == {"description": "é", "description_bytes": 6, "description_truncated": True}
+
+
+def test_exceptions_and_extra_fields_survive_the_queue():
+    records = queue.SimpleQueue()
+    logger = logging.getLogger("test_request_logging")
+    logger.propagate = False
+    handler = _QueueHandler(records)
+    logger.addHandler(handler)
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        logger.exception("[generate] Error", extra=capped_fields("description", "x" * 10, max_bytes=4))
+    finally:
+        logger.removeHandler(handler)
+
+    entry = json.loads(JsonFormatter().format(records.get_nowait()))
+    assert entry["message"] == "[generate] Error"
+    assert entry["description"] == "xxxx" and entry["description_truncated"] is True
+    assert "RuntimeError: boom" in entry["exception"]
@@ -0,0 +1,73 @@
+import asyncio
+
+import result_cache
+from result_cache import ResultCache, content_key
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResultCache(str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_content_key_normalizes_whitespace_and_parts():
+    assert content_key("Alpha  Inc.\n\nand Beta") == content_key("Alpha Inc. and Beta")
+    assert content_key("text", "model-a") != content_key("text", "model-b")
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    make_cache(tmp_path, max_bytes=10_000).put("clauses", "k", {"a": 1})
+    cache = make_cache(tmp_path, max_bytes=10_000)
+    assert cache.get("clauses", "k") == {"a": 1}
+    assert cache.stats()["namespaces"]["clauses"]["disk_hits"] == 1
+
+
+def test_ttl_expires_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    cache = make_cache(tmp_path, max_bytes=10_000, ttl=60)
+    cache.put("contracts", "k", "text")
+    now[0] += 30
+    assert cache.get("contracts", "k") == "text"
+    now[0] += 60
+    assert cache.get("contracts", "k") is None
+    assert cache.stats()["namespaces"]["contracts"]["expired"] == 1
+    assert cache.stats()["disk_bytes"] == 0
+
+
+def test_eviction_drops_least_recently_used(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    value = "x" * 100  # 102 bytes as JSON
+    cache = make_cache(tmp_path, max_bytes=350, memory_items=0)
+    for key in ("a", "b", "c"):
+        cache.put("ns", key, value)
+        now[0] += 1
+    assert cache.get("ns", "a") == value  # "b" is now the least recently used
+    now[0] += 1
+    cache.put("ns", "d", value)
+
+    assert cache.get("ns", "b") is None
+    assert all(cache.get("ns", key) == value for key in ("a", "c", "d"))
+    assert cache.stats()["disk_bytes"] == 3 * 102
+
+
+def test_running_size_tracks_replacements_and_invalidation(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10_000)
+    cache.put("ns", "k", "x" * 10)
+    cache.put("ns", "k", "x" * 20)
+    cache.put("other", "k", "x" * 5)
+    assert cache.stats()["disk_bytes"] == 22 + 7
+
+    assert cache.invalidate("ns") == 1
+    assert cache.get("ns", "k") is None
+    assert cache.stats()["disk_bytes"] == 7
+    assert make_cache(tmp_path, max_bytes=10_000).stats()["disk_bytes"] == 7
+
+
+def test_async_wrappers(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10_000)
+
+    async def roundtrip():
+        await cache.aput("risk", "k", {"overallRisk": "low"})
+        return await cache.aget("risk", "k"), await cache.aget("risk", "missing")
+
+    assert asyncio.run(roundtrip()) == ({"overallRisk": "low"}, None)
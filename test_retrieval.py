@@ -0,0 +1,191 @@
+import hashlib
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import retrieval
+from bm25 import BM25, tokenize
+from numpy_index import NumpyIndex
+from result_cache import ResultCache
+
+
+class ParagraphSplitter:
+    def split_text(self, text):
+        return [part.strip() for part in text.split("\n\n") if part.strip()]
+
+
+class FakeEmbeddings:
+    """Deterministic 8-d vectors from the text hash; records every text embedded."""
+
+    def __init__(self):
+        self.embedded = []
+
+    def __call__(self, texts):
+        self.embedded.extend(texts)
+        return [self.vector(text) for text in texts]
+
+    async def acall(self, texts):
+        return self(texts)
+
+    @staticmethod
+    def vector(text):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(8).astype(np.float32)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    data.mkdir()
+    index_dir = tmp_path / "index"
+    embeddings = FakeEmbeddings()
+    cache = ResultCache(str(tmp_path / "generation.sqlite3"), max_bytes=1 << 20)
+
+    monkeypatch.setattr(retrieval, "MANIFEST_PATH", str(index_dir / "index_manifest.json"))
+    monkeypatch.setattr(retrieval, "LEXICAL_INDEX_PATH", str(index_dir / "lexical_index.json"))
+    monkeypatch.setattr(retrieval, "_collection", NumpyIndex(str(index_dir), embedding_function=embeddings))
+    monkeypatch.setattr(retrieval, "_embedding_function", embeddings)
+    monkeypatch.setattr(retrieval, "_text_splitter", ParagraphSplitter())
+    monkeypatch.setattr(retrieval, "_lexical", None)
+    monkeypatch.setattr(retrieval, "generation_cache", cache)
+
+    def write(name, *paragraphs):
+        (data / name).write_text("\n\n".join(paragraphs), encoding="utf-8")
+
+    def index():
+        return retrieval.index_documents(str(data))
+
+    return write, index, embeddings, cache, data
+
+
+def lexical_ids():
+    return set(retrieval._load_lexical_index()["chunks"])
+
+
+def test_first_index_embeds_everything_then_nothing(corpus):
+    write, index, embeddings, _, _ = corpus
+    write("nda.txt", "Confidential information stays secret.", "Term of two years.")
+    write("privacy_law.txt", "Personal data must be protected.")
+
+    assert index() == {"embedded": 3, "reused": 0, "removed": 0, "unchanged_files": 0}
+    assert retrieval.get_collection().count() == 3
+    assert index() == {"embedded": 0, "reused": 0, "removed": 0, "unchanged_files": 2}
+    assert len(embeddings.embedded) == 3
+
+
+def test_modified_file_reembeds_only_changed_chunks(corpus):
+    write, index, embeddings, _, _ = corpus
+    write("nda.txt", "Confidential information stays secret.", "Term of two years.")
+    index()
+    embeddings.embedded.clear()
+
+    write("nda.txt", "Confidential information stays secret.", "Term of three years.")
+    assert index() == {"embedded": 1, "reused": 0, "removed": 0, "unchanged_files": 0}
+    assert embeddings.embedded == ["Term of three years."]
+    got = retrieval.get_collection().get(ids=["template_nda.txt_1"])
+    assert got["documents"] == ["Term of three years."]
+
+
+def test_moved_chunk_reuses_its_stored_vector(corpus):
+    write, index, embeddings, _, _ = corpus
+    write("nda.txt", "Confidential information stays secret.", "Term of two years.")
+    index()
+    embeddings.embedded.clear()
+
+    write("nda.txt", "A new preamble.", "Confidential information stays secret.", "Term of two years.")
+    summary = index()
+    assert embeddings.embedded == ["A new preamble."]
+    assert summary["embedded"] == 1 and summary["reused"] == 2
+
+
+def test_shrunk_and_deleted_files_are_removed(corpus):
+    write, index, _, _, data = corpus
+    write("nda.txt", "Confidential information stays secret.", "Term of two years.")
+    write("privacy_law.txt", "Personal data must be protected.")
+    index()
+
+    write("nda.txt", "Confidential information stays secret.")
+    os.remove(data / "privacy_law.txt")
+    assert index() == {"embedded": 0, "reused": 0, "removed": 2, "unchanged_files": 0}
+    assert retrieval.get_collection().get()["ids"] == ["template_nda.txt_0"]
+    assert lexical_ids() == {"template_nda.txt_0"}
+    assert set(retrieval._load_manifest()["files"]) == {"nda.txt"}
+
+
+def test_corpus_change_drops_cached_contracts(corpus):
+    write, index, _, cache, _ = corpus
+    write("nda.txt", "Confidential information stays secret.")
+    index()
+    cache.put("contracts", "key", {"text": "old"})
+
+    index()  # unchanged corpus keeps the cache
+    assert cache.get("contracts", "key") == {"text": "old"}
+    write("nda.txt", "Confidential information is shared freely.")
+    index()
+    assert cache.get("contracts", "key") is None
+
+
+def test_wiped_collection_forces_a_full_reindex(corpus):
+    write, index, _, _, _ = corpus
+    write("nda.txt", "Confidential information stays secret.", "Term of two years.")
+    index()
+    retrieval.get_collection().reset()
+
+    assert index()["embedded"] == 2
+    assert retrieval.get_collection().count() == 2
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    vector = ["a", "b", "c"]
+    lexical = ["c", "d", "a"]
+    # a: 1/61 + 1/63, c: 1/63 + 1/61 (tie, broken by ID), b: 1/62, d: 1/62
+    assert retrieval._fuse(vector, lexical) == ["a", "c", "b", "d"]
+    assert retrieval._fuse(["x", "y"]) == ["x", "y"]
+
+
+def test_bm25_ranks_exact_terms_and_skips_unrelated_chunks():
+    docs = ["non-solicitation of employees", "governing law of New York", "employees and contractors"]
+    bm25 = BM25([dict(Counter(tokenize(doc))) for doc in docs])
+    ranked = [doc for doc, _ in bm25.top_k(tokenize("non-solicitation employees"), 3)]
+    assert ranked == [0, 2]
+
+
+def test_hybrid_retrieval_surfaces_lexical_matches(corpus):
+    write, index, embeddings, _, _ = corpus
+    write("nda.txt", "Confidential information stays secret.", "Term of two years.")
+    write("privacy_law.txt", "Personal data must be protected.", "Arbitration in Singapore.")
+    index()
+
+    # The query's vector equals one chunk's; BM25 adds the chunk naming Singapore
+    query = "Term of two years."
+    vector_hits, _ = retrieval._search_many([query], [embeddings.vector(query)], 1, None, "vector")
+    assert [uid for uid, _ in vector_hits[0]] == ["template_nda.txt_1"]
+
+    hybrid, chunks = retrieval._search_many(
+        ["Term of two years in Singapore"], [embeddings.vector(query)], 2, None, "hybrid")
+    ids = [uid for uid, _ in hybrid[0]]
+    assert ids[0] == "template_nda.txt_1" and "law_privacy_law.txt_1" in ids
+    assert chunks["law_privacy_law.txt_1"][0] == "Arbitration in Singapore."
+    assert all(0.0 <= distance <= 2.0 for _, distance in hybrid[0])
+
+
+def test_numpy_backend_embeds_without_chromadb(monkeypatch):
+    calls = []
+
+    class FakeEmbeddingsAPI:
+        def create(self, model, input):
+            calls.append((model, list(input)))
+            data = [type("Item", (), {"embedding": [1.0, 0.0]})() for _ in input]
+            return type("Response", (), {"data": data, "usage": None})()
+
+    fake_client = type("Client", (), {"embeddings": FakeEmbeddingsAPI()})()
+    monkeypatch.setattr(retrieval, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(retrieval, "EMBEDDING_BACKEND", "openai")
+    monkeypatch.setattr(retrieval, "get_sync_client", lambda: fake_client)
+    monkeypatch.setitem(sys.modules, "chromadb", None)  # any import of it fails
+
+    assert retrieval._plain_embedding_function()(["alpha"]) == [[1.0, 0.0]]
+    assert calls == [(retrieval.EMBEDDING_MODEL, ["alpha"])]
@@ -1,3 +1,4 @@
+import asyncio
 import json
 from contract_scanner import scan_contract
 from risk_assessment import assess_risk
@@ -23,7 +24,7 @@ print("\n" + "=" * 80)
 print(">>> Running LLM risk assessment...\n")
 
 # Step 2: Risk assessment (now returns a dict, not a generator)
-report = assess_risk(extracted)
+report = asyncio.run(assess_risk(extracted))
 
 # Validate structure
 assert isinstance(report, dict), "Report should be a dict"
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+import pytest
+
+from stage_dag import StageDAG
+
+
+def test_dependencies_receive_results_and_independent_stages_overlap():
+    started = []
+
+    async def branch(name, both_started):
+        started.append(name)
+        if len(started) == 2:
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), timeout=1)  # times out if run in sequence
+        return name
+
+    async def combine(left, right):
+        return f"{left}+{right}"
+
+    async def main():
+        both_started = asyncio.Event()
+
+        async def left():
+            return await branch("left", both_started)
+
+        async def right():
+            return await branch("right", both_started)
+
+        dag = StageDAG().add("left", left).add("right", right)
+        return await dag.add("both", combine, deps=("left", "right")).run()
+
+    results, timings = asyncio.run(main())
+    assert results == {"left": "left", "right": "right", "both": "left+right"}
+    assert set(timings) == {"left", "right", "both"}
+    assert all(set(t) == {"start_ms", "duration_ms"} for t in timings.values())
+
+
+def test_plain_functions_run_in_a_worker_thread():
+    loop_thread = threading.get_ident()
+
+    def blocking(value):
+        return value * 2, threading.get_ident()
+
+    async def main():
+        return await StageDAG().add("value", lambda: 21).add("double", blocking, deps=("value",)).run()
+
+    results, _ = asyncio.run(main())
+    doubled, thread = results["double"]
+    assert doubled == 42 and thread != loop_thread
+
+
+def test_first_failure_cancels_running_stages_and_reraises():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+
+    async def boom():
+        raise RuntimeError("stage failed")
+
+    async def main():
+        dag = StageDAG().add("slow", slow).add("boom", boom)
+        with pytest.raises(RuntimeError, match="stage failed"):
+            await dag.run()
+        await asyncio.sleep(0)  # let the cancellation be delivered
+
+    asyncio.run(main())
+    assert cancelled == ["slow"]
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError, match="unknown stages"):
+        StageDAG().add("prompt", lambda retrieval: retrieval, deps=("retrieval",))
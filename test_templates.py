@@ -0,0 +1,79 @@
+import os
+
+from templates import TemplateRegistry, fill_template, placeholder_inventory, signature_block_line
+
+ENTITIES = {
+    "party_1_name": "Acme Corp",
+    "party_2_name": "Beta LLC",
+    "governing_state": "Delaware",
+    "fee_amount": "$5,000",
+}
+TODAY = "October 17, 2026"
+
+
+def test_bracketed_fill_ins_and_dates():
+    text = (
+        "This Agreement is made on [Today's Date] between [company name] and [company name].\n"
+        "It is governed by the laws of [fill in state]."
+    )
+    assert fill_template(text, ENTITIES, TODAY) == (
+        "This Agreement is made on October 17, 2026 between Acme Corp and Beta LLC.\n"
+        "It is governed by the laws of Delaware."
+    )
+    dated = fill_template("Effective [Effective Date].", {**ENTITIES, "effective_date": "2026-01-01"}, TODAY)
+    assert dated == "Effective 2026-01-01."
+
+
+def test_checkboxes_are_ticked_only_when_filled_and_unknown_blanks_stay():
+    text = (
+        "[ ] The Partner will pay [____] per month.\n"
+        "[ ] Within the [geographic area].\n"
+        "Signed on [____]."
+    )
+    assert fill_template(text, ENTITIES, TODAY) == (
+        "[ x ] The Partner will pay $5,000 per month.\n"
+        "[ ] Within the [geographic area].\n"
+        "Signed on [____]."
+    )
+
+
+def test_party_headings_and_print_name_lines():
+    text = "PARTY 1\nPrint Name\nPARTY 2\nPrint Name:\n\nPrint Name\t\t\t"
+    assert fill_template(text, ENTITIES, TODAY).split("\n") == [
+        "Acme Corp",
+        "Print Name: Acme Corp",
+        "Beta LLC",
+        "Print Name: Beta LLC",
+        "",
+        "Print Name\tAcme Corp\t\tBeta LLC",
+    ]
+    assert fill_template(text, {}, TODAY) == text  # nothing to fill
+
+
+def test_signature_block_line():
+    assert signature_block_line("Terms.\nPARTY 1\n\nSignature\nPARTY 2") == 1
+    columns = "Terms.\n\tPROVIDER: [official company name]\t\tPARTNER: [official company name]\nSignature\t\t\t"
+    assert signature_block_line(columns) == 1
+    assert signature_block_line("Terms.\n\nSignature\nPrint Name") == 2
+    assert signature_block_line("7.12. Signature.  May be signed in counterparts.") is None
+
+
+def test_placeholder_inventory_and_registry_reload(tmp_path):
+    inventory = placeholder_inventory("[ ] Pay [$____] to [company name].\nPARTY 1\nPrint Name")
+    assert inventory == {
+        "blanks": 1,
+        "checkboxes": 1,
+        "fill_ins": ["company name"],
+        "party_headings": ["PARTY 1"],
+        "print_name_lines": 1,
+    }
+
+    (tmp_path / "nda.txt").write_text("v1", encoding="utf-8")
+    registry = TemplateRegistry(str(tmp_path))
+    assert registry.load_all() == 1
+    first = registry.get("nda.txt")
+    assert registry.get("nda.txt") is first and first.tokens > 0
+    (tmp_path / "nda.txt").write_text("version two", encoding="utf-8")
+    os.utime(tmp_path / "nda.txt", (first.mtime + 10, first.mtime + 10))
+    assert registry.get("nda.txt").text == "version two"
+    assert registry.get("../nda.txt") is None